@@ -10,6 +10,8 @@ from endpoints import (
     transcription,
     analyze,
     server_info,
+    jobs,
+    search,
 )
 
 
@@ -36,6 +38,12 @@ app.register_blueprint(analyze)  # run on index route
 # Server Blueprint (server information, healthcheck, and configuration)
 app.register_blueprint(server_info)  # run on index route
 
+# Jobs Blueprint (status and live progress events of queued jobs)
+app.register_blueprint(jobs)
+
+# Search Blueprint (full-text search of the finished transcripts)
+app.register_blueprint(search)
+
 
 def create_app():
     return app
@@ -0,0 +1,124 @@
+"""
+Benchmark question categorization against the stand-in LLAMA server.
+
+Compares the previous approach (a process pool making one new connection per
+question) with the thread pool sharing keep-alive connections, one request per
+question and batched, and reports questions per second and latency percentiles
+(per request). Run from the src folder:
+    python -m benchmarks.bench_categorization --questions 500 --latency 0.05
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool
+import argparse
+import os
+import statistics
+import time
+
+import requests
+
+from benchmarks.fake_llama_server import FakeLlamaServer
+from config.config import CATEGORIZATION_CONCURRENCY
+
+
+def make_questions(count: int) -> list:
+    from utils.categorize.extract_questions import Question
+
+    return [
+        Question(f"Why does example {i} behave this way?", "SPEAKER_00", i, i + 1)
+        for i in range(count)
+    ]
+
+
+def percentile(values: list, percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def report(name: str, duration: float, latencies: list, count: int = None) -> None:
+    print(
+        f"{name:<30} {(count or len(latencies)) / duration:8.1f} q/s"
+        f"   p50 {percentile(latencies, 50) * 1000:7.1f} ms"
+        f"   p95 {percentile(latencies, 95) * 1000:7.1f} ms"
+        f"   p99 {percentile(latencies, 99) * 1000:7.1f} ms"
+        f"   mean {statistics.mean(latencies) * 1000:7.1f} ms"
+    )
+
+
+def post_without_session(text: str) -> float:
+    start = time.perf_counter()
+    response = requests.post(
+        f"{os.getenv('LLAMA_API_URL')}/categorize", json={"question": text}
+    )
+    int(response.json().get("response"))
+    return time.perf_counter() - start
+
+
+def bench_process_pool(questions: list) -> None:
+    texts = [question.question for question in questions]
+    start = time.perf_counter()
+    with Pool() as pool:
+        latencies = pool.map(post_without_session, texts)
+    report("process pool (before)", time.perf_counter() - start, latencies)
+
+
+def bench_thread_pool(questions: list) -> None:
+    from utils.categorize import categorize_transcript
+
+    latencies = []
+    categorize_question = categorize_transcript.categorize_question
+
+    def timed(text):
+        start = time.perf_counter()
+        level = categorize_question(text)
+        latencies.append(time.perf_counter() - start)
+        return level
+
+    categorize_transcript.categorize_question = timed
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=CATEGORIZATION_CONCURRENCY) as executor:
+            list(executor.map(categorize_transcript.process_question, questions))
+        report("pooled thread client", time.perf_counter() - start, latencies)
+    finally:
+        categorize_transcript.categorize_question = categorize_question
+
+
+def bench_batched(questions: list) -> None:
+    from utils.categorize import categorize_transcript
+
+    latencies = []
+    categorize_question_batch = categorize_transcript.categorize_question_batch
+
+    def timed(texts, **kwargs):
+        start = time.perf_counter()
+        levels = categorize_question_batch(texts, **kwargs)
+        latencies.append(time.perf_counter() - start)
+        return levels
+
+    categorize_transcript.categorize_question_batch = timed
+    try:
+        start = time.perf_counter()
+        categorize_transcript.categorize_questions_in_batches(questions)
+        duration = time.perf_counter() - start
+        print(f"{len(latencies)} batched requests")
+        report("pooled thread client, batched", duration, latencies, len(questions))
+    finally:
+        categorize_transcript.categorize_question_batch = categorize_question_batch
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark question categorization")
+    parser.add_argument("--questions", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    server = FakeLlamaServer(latency=args.latency).start()
+    os.environ["LLAMA_API_URL"] = server.url
+    questions = make_questions(args.questions)
+
+    print(f"{args.questions} questions, {args.latency * 1000:.0f} ms server latency")
+    bench_process_pool(questions)
+    bench_thread_pool(questions)
+    bench_batched(make_questions(args.questions))
+    server.shutdown()
@@ -0,0 +1,53 @@
+"""
+Benchmark the local question classifier on CPU.
+
+Trains it on synthetic questions (the cache is not touched) and reports how many
+questions per second it categorizes in batches. Run from the src folder:
+    python -m benchmarks.bench_local_classifier --questions 20000 --batch-size 256
+"""
+
+import argparse
+import random
+import time
+
+from utils.categorize.categorize_local import build_local_classifier
+
+# A few question stems per level, combined with random topics
+STEMS = {
+    0: ["What is {}?", "Who discovered {}?", "When did we cover {}?"],
+    1: ["How would you compare {} and {}?", "Why does {} lead to {}?"],
+    2: ["What would happen if {} changed?", "How could we apply {} to {}?"],
+    3: ["Does that make sense?", "Any questions about {}?"],
+}
+TOPICS = ["photosynthesis", "gravity", "the war", "fractions", "the cell", "energy"]
+
+
+def make_examples(count: int):
+    texts, levels = [], []
+    for _ in range(count):
+        level = random.choice(list(STEMS))
+        stem = random.choice(STEMS[level])
+        texts.append(stem.format(*random.sample(TOPICS, stem.count("{}"))))
+        levels.append(level)
+    return texts, levels
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the local classifier")
+    parser.add_argument("--questions", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    classifier, metrics = build_local_classifier(*make_examples(2000))
+    print(f"Trained in {time.perf_counter() - start:.2f}s: {metrics}")
+
+    texts, _ = make_examples(args.questions)
+    start = time.perf_counter()
+    for i in range(0, len(texts), args.batch_size):
+        classifier.predict_proba(texts[i : i + args.batch_size])
+    duration = time.perf_counter() - start
+    print(
+        f"Classified {len(texts)} questions in {duration:.2f}s "
+        f"({len(texts) / duration:.0f} q/s, batches of {args.batch_size})"
+    )
@@ -0,0 +1,74 @@
+"""
+Benchmark the extractive condensation before summarization, against the stand-in
+LLAMA server (whose summarization time grows with the length of the text).
+
+Reports the compression ratio, the tokens sent to the summarizer and the end-to-end
+latency, with and without condensation. Run from the src folder:
+    python -m benchmarks.bench_summarization --sentences 3000 --budget 6000
+"""
+
+import argparse
+import os
+import random
+import time
+
+from benchmarks.fake_llama_server import FakeLlamaServer
+
+TOPICS = ["photosynthesis", "chlorophyll", "the light reactions", "the Calvin cycle"]
+FILLER = ["Okay.", "So, um, yeah.", "Right, right.", "Let me see here.", "Alright."]
+
+
+def make_lecture(count: int) -> list:
+    """Sentences of a long lecture, with filler and repetition."""
+    transcript = []
+    for i in range(count):
+        if random.random() < 0.4:
+            text = random.choice(FILLER)
+        else:
+            a, b = random.sample(TOPICS, 2)
+            text = f"Remember that {a} depends on {b} in sentence {i % 50}."
+        transcript.append(
+            {
+                "speaker": "Speaker 0",
+                "start_time": i * 3000,
+                "end_time": i * 3000 + 2500,
+                "text": text,
+            }
+        )
+    return transcript
+
+
+def run(name: str, text: str) -> None:
+    from utils.summarize.summarize_transcript import summarize_transcript
+    from utils.tokenization import count_tokens
+
+    start = time.perf_counter()
+    summarize_transcript(text)
+    duration = time.perf_counter() - start
+    print(f"{name:<24} {count_tokens(text):8d} tokens sent   {duration:7.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark extractive condensation")
+    parser.add_argument("--sentences", type=int, default=3000)
+    parser.add_argument("--budget", type=int, default=6000)
+    args = parser.parse_args()
+
+    server = FakeLlamaServer(latency=0.2).start()
+    os.environ["LLAMA_API_URL"] = server.url
+
+    from config import config
+
+    config.SUMMARY_CACHE = False  # Measure every request
+    from utils.analyze.extraction_utils import get_raw_transcript
+    from utils.summarize.extractive import condense_transcript
+
+    transcript = make_lecture(args.sentences)
+
+    start = time.perf_counter()
+    condensed = condense_transcript(transcript, args.budget)
+    print(f"Condensation took {time.perf_counter() - start:.2f}s")
+
+    run("full transcript", get_raw_transcript(transcript))
+    run("condensed transcript", condensed)
+    server.shutdown()
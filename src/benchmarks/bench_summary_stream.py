@@ -0,0 +1,72 @@
+"""
+Check the streaming summarization against the stand-in LLAMA server, which streams
+its summary one token at a time.
+
+Sends the same transcript to POST /summarize and POST /summarize/stream of the
+Flask app (in-process test client), and reports the time to the first token and
+to the whole summary. Run from the src folder:
+    python -m benchmarks.bench_summary_stream --words 2000
+"""
+
+import argparse
+import json
+import os
+import time
+
+from benchmarks.fake_llama_server import FakeLlamaServer
+
+
+def read_events(response):
+    """Parse the Server-Sent Events of a streamed response, as they arrive."""
+    event = None
+    for line in response.response:
+        for row in line.decode().splitlines():
+            if row.startswith("event: "):
+                event = row[len("event: ") :]
+            elif row.startswith("data: "):
+                yield event, json.loads(row[len("data: ") :])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark summary streaming")
+    parser.add_argument("--words", type=int, default=2000)
+    args = parser.parse_args()
+
+    server = FakeLlamaServer(latency=0.2).start()
+    os.environ["LLAMA_API_URL"] = server.url
+
+    from config import config
+
+    config.SUMMARY_CACHE = False  # Measure every request
+    from flask import Flask
+    from endpoints.summarize import summarize
+
+    app = Flask(__name__)
+    app.register_blueprint(summarize)
+    client = app.test_client()
+    text = " ".join(f"word{i}" for i in range(args.words))
+
+    start = time.perf_counter()
+    client.post("/summarize", json={"text": text})
+    print(f"/summarize         whole summary after {time.perf_counter() - start:.2f}s")
+
+    start = time.perf_counter()
+    response = client.post("/summarize/stream", json={"text": text}, buffered=False)
+    first_token, tokens, summary = None, 0, ""
+    for event, data in read_events(response):
+        if event == "token":
+            tokens += 1
+            if first_token is None:
+                first_token = time.perf_counter() - start
+        elif event == "done":
+            summary = data["summary"]
+        elif event == "error":
+            raise SystemExit(f"Stream failed: {data['error']}")
+    total = time.perf_counter() - start
+
+    print(
+        f"/summarize/stream  first token after {first_token:.2f}s, "
+        f"{tokens} tokens, whole summary after {total:.2f}s"
+    )
+    assert summary.split() == text.split()[:50], "Streamed summary does not match"
+    server.shutdown()
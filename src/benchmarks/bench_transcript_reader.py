@@ -0,0 +1,93 @@
+"""
+Benchmark the streaming transcript reader on a large transcript archive.
+
+Writes a synthetic transcript JSON file of the given size, then extracts its
+questions and text with json.load and with the streaming reader, reporting the
+time and the peak memory (tracemalloc) of each. Run from the src folder:
+    python -m benchmarks.bench_transcript_reader --megabytes 100
+"""
+
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from utils.transcript_reader import iter_segments, iter_questions, iter_text_chunks
+
+SENTENCES = [
+    "Today we are going to talk about photosynthesis.",
+    "Plants turn light into chemical energy.",
+    "Why do you think the leaves are green?",
+    "Does that make sense to everyone?",
+    "The chlorophyll absorbs red and blue light.",
+    "What would happen if there was no light at all?",
+]
+
+
+def write_transcript(path: str, megabytes: int) -> int:
+    """Write a transcript of about that many megabytes. Returns its segment count."""
+    target = megabytes * 1024 * 1024
+    count = 0
+    with open(path, "w") as f:
+        f.write("[")
+        while f.tell() < target:
+            segment = {
+                "speaker": f"SPEAKER_0{random.randint(0, 2)}",
+                "start_time": count * 3000,
+                "end_time": count * 3000 + 2500,
+                "text": random.choice(SENTENCES),
+            }
+            f.write(("," if count else "") + json.dumps(segment))
+            count += 1
+        f.write("]")
+    return count
+
+
+def load_whole(path: str):
+    with open(path, "rb") as f:
+        transcript = json.load(f)
+    questions = list(iter_questions(transcript))
+    text = " ".join(segment["text"] for segment in transcript)
+    return len(questions), len(text)
+
+
+def load_streaming(path: str):
+    with open(path, "rb") as f:
+        questions = list(iter_questions(iter_segments(f)))
+    with open(path, "rb") as f:
+        text = " ".join(iter_text_chunks(iter_segments(f)))
+    return len(questions), len(text)
+
+
+def measure(name: str, func, path: str) -> None:
+    start = time.perf_counter()
+    questions, characters = func(path)
+    duration = time.perf_counter() - start
+
+    tracemalloc.start()
+    func(path)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    size = os.path.getsize(path) / 1024 / 1024
+    print(
+        f"{name}: {questions} questions, {characters} characters in {duration:.2f}s "
+        f"({size / duration:.1f} MB/s), peak memory {peak / 1024 / 1024:.1f} MB"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the transcript reader")
+    parser.add_argument("--megabytes", type=int, default=100)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "transcript.json")
+        segments = write_transcript(path, args.megabytes)
+        print(f"Wrote {segments} segments ({args.megabytes} MB)")
+
+        measure("json.load", load_whole, path)
+        measure("streaming", load_streaming, path)
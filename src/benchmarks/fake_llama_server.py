@@ -0,0 +1,143 @@
+"""
+Local stand-in for the LLAMA API, used by the benchmarks.
+
+It answers like the real server, after a configurable delay, so the client side of
+the pipeline can be measured without a GPU. Run it on its own with:
+    python -m benchmarks.fake_llama_server --port 8001 --latency 0.2
+"""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import hashlib
+import json
+import random
+import threading
+import time
+
+
+class FakeLlamaHandler(BaseHTTPRequestHandler):
+    """Answers the LLAMA API routes after the server's latency."""
+
+    protocol_version = "HTTP/1.1"  # Keep-alive, like the real server
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        self.server.simulate_latency(len(body.get("questions", ())) or 1)
+
+        if self.path == "/categorize":
+            self.send_json({"response": str(self.server.categorize(body["question"]))})
+        elif self.path == "/categorize_batch":
+            levels = [
+                self.server.categorize(question) for question in body["questions"]
+            ]
+            self.send_json({"response": levels})
+        elif self.path == "/summarize/stream" and self.server.streaming:
+            words = str(body.get("text", "")).split()
+            time.sleep(self.server.word_latency * len(words))
+            self.stream_tokens(words[:50])
+        elif self.path == "/summarize":
+            words = str(body.get("text", "")).split()
+            # Reading the prompt costs time too
+            time.sleep(self.server.word_latency * len(words))
+            self.send_json({"response": " ".join(words[:50])})
+        else:
+            self.send_json({"error": "Not found"}, 404)
+
+    def stream_tokens(self, tokens: list):
+        """Send one {"token": ...} JSON line per token, as chunks, like a generating model."""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i == self.server.drop_after:
+                # Go away mid-stream, without ending the chunked response
+                self.close_connection = True
+                return
+            time.sleep(self.server.token_interval)
+            line = json.dumps({"token": " " + token}).encode() + b"\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def send_json(self, data: dict, code: int = 200):
+        payload = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeLlamaServer(ThreadingHTTPServer):
+    """
+    Stand-in LLAMA server.
+
+    Args:
+        port (int): Port to listen on (0 picks a free one).
+        latency (float): Mean seconds spent on every request.
+        jitter (float): Relative random variation of the latency (default: 0.25).
+        item_latency (float): Extra seconds for every additional question in a batch.
+        word_latency (float): Extra seconds for every word of a text to summarize.
+        token_interval (float): Seconds between two streamed summary tokens.
+        drop_after (int, optional): Close the connection after streaming this many
+            tokens, like a crashing backend (default: stream every token).
+        streaming (bool): Answer POST /summarize/stream, which older LLAMA servers
+            do not implement (default: True).
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.1,
+        jitter: float = 0.25,
+        item_latency: float = 0.005,
+        word_latency: float = 0.0002,
+        token_interval: float = 0.02,
+        drop_after: int = None,
+        streaming: bool = True,
+    ):
+        super().__init__(("127.0.0.1", port), FakeLlamaHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.item_latency = item_latency
+        self.word_latency = word_latency
+        self.token_interval = token_interval
+        self.drop_after = drop_after
+        self.streaming = streaming
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def simulate_latency(self, items: int = 1):
+        latency = self.latency + self.item_latency * (items - 1)
+        time.sleep(latency * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    @staticmethod
+    def categorize(question: str) -> int:
+        # Deterministic level, so repeated questions get the same answer
+        return hashlib.sha1(question.encode()).digest()[0] % 4
+
+    def start(self) -> "FakeLlamaServer":
+        """Serve in a background thread."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stand-in LLAMA API server")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.25)
+    args = parser.parse_args()
+
+    server = FakeLlamaServer(args.port, args.latency, args.jitter)
+    print(f"Fake LLAMA server listening on {server.url}")
+    server.serve_forever()
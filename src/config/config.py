@@ -9,9 +9,69 @@ VERSION = "4.4.5"
 
 # Model settings
 TRANSCRIPTION_MODEL = "large-v3"
-CATEGORIZATION_MODEL = "llama"  # or gpt
+CATEGORIZATION_MODEL = "llama"  # or gpt # or local (see LOCAL_CLASSIFIER_PATH)
 SUMMARIZATION_MODEL = "llama"  # or gpt # or huggingface
 
+# LLM backend settings (LLAMA_API_URL, and optionally LLAMA_HEDGE_API_URL, are set in .env)
+LLM_CONNECT_TIMEOUT = 3.05  # Seconds to wait for a connection to the LLM server
+LLM_READ_TIMEOUT = 60  # Seconds to wait for the LLM server to answer a request
+LLM_SUMMARIZE_READ_TIMEOUT = 300  # Summaries of long transcripts take longer
+LLM_POOL_SIZE = 32  # Keep-alive connections per process
+LLM_MAX_RETRIES = 2  # Retries of a failed request, with jittered exponential backoff
+LLM_RETRY_BACKOFF = 0.5  # Seconds, doubled on every retry
+LLM_BREAKER_FAILURES = 5  # Consecutive failures after which requests fail fast
+LLM_BREAKER_RESET_TIMEOUT = 30  # Seconds before a request is tried again
+# A request is also sent to LLAMA_HEDGE_API_URL once it takes longer than this share
+# of the earlier requests to the same route, e.g. p95 of /categorize
+LLM_HEDGE_PERCENTILE = 0.95
+LLM_HEDGE_MIN_SAMPLES = 50  # Requests to a route observed before it is hedged
+LLM_STATS_INTERVAL = 10  # Seconds between publications of the client stats to Redis
+CATEGORIZATION_CONCURRENCY = 16  # Questions categorized at the same time
+# Send several questions per request (POST /categorize_batch, which the LLAMA server
+# must implement, see benchmarks/fake_llama_server.py)
+CATEGORIZATION_BATCHING = False
+CATEGORIZATION_BATCH_TOKEN_BUDGET = 1500  # Max tokens of question text in one request
+COALESCE_MAX_BATCH_SIZE = 32  # Max /categorize/question calls combined into one request
+COALESCE_MAX_WAIT_MS = 10  # Max milliseconds a call waits for others to join its batch
+# Bump when the prompt changes, to invalidate the cache
+CATEGORIZATION_PROMPT_VERSION = "1"
+
+# Local question classifier, trained on the LLM levels in the categorization cache:
+#    python -m utils.categorize.categorize_local
+# Used when the LLM fails, and for questions it is confident about (None: never)
+LOCAL_CLASSIFIER_PATH = "models/question_classifier.joblib"
+LOCAL_CLASSIFIER_MIN_CONFIDENCE = 0.9
+
+# Long transcripts are summarized in chunks (map-reduce), see summarize/chain_summary.py
+# Streamed summaries need POST /summarize/stream on the LLAMA server (see
+# benchmarks/fake_llama_server.py), else the summary is sent in one piece
+SUMMARY_CHUNK_TOKENS = 3000  # Max transcript tokens sent in one summarization request
+SUMMARY_CONCURRENCY = 8  # Chunks summarized at the same time
+SUMMARY_PROMPT_VERSION = "1"  # Bump when the prompt changes, to invalidate the cache
+# Before summarizing, keep only the most informative sentences (TextRank, on the CPU)
+EXTRACTIVE_CONDENSATION = False
+EXTRACTIVE_TOKEN_BUDGET = 6000  # Max transcript tokens kept for the summarization
+
+# Cache settings
+CACHE_BACKEND = "sqlite"  # or "redis"
+CACHE_SQLITE_PATH = "temp_outputs/cache.sqlite3"
+CATEGORIZATION_CACHE = True  # Reuse the levels of questions categorized before
+CATEGORIZATION_CACHE_TTL = 60 * 60 * 24 * 90  # Seconds (90 days)
+CATEGORIZATION_CACHE_MAX_ENTRIES = 200000
+SUMMARY_CACHE = True  # Reuse the summaries of unchanged transcript chunks
+SUMMARY_CACHE_TTL = 60 * 60 * 24 * 30  # Seconds (30 days)
+SUMMARY_CACHE_MAX_ENTRIES = 50000
+
+# Full-text search of the finished transcripts (GET /search)
+SEARCH_INDEX = True  # Index the transcripts of finished jobs
+SEARCH_INDEX_PATH = "temp_outputs/search.sqlite3"
+
+# Parquet export of the finished jobs (python -m utils.export.parquet_export)
+EXPORT_FOLDER = "temp_outputs/exports/"
+EXPORT_BATCH_SIZE = 50  # Jobs read and written at a time
+EXPORT_COMPRESSION = "zstd"
+EXPORT_JOB_TIMEOUT = 60 * 60 * 6  # Seconds an export job may run (others: 5 minutes)
+
 # Audio file upload settings
 UPLOAD_FOLDER = "raw_audio/"
 TEMP_FOLDER = "temp_outputs/"  # Includes vocal separation outputs and rttm files
@@ -29,6 +89,36 @@ ALLOWED_EXTENSIONS = {
     "mov",
 }  # Others are (probably) supported as well but not tested.
 
+# Larger inputs to /summarize and /categorize/transcript are processed as queued jobs
+INLINE_SUMMARY_MAX_TOKENS = 3000  # Transcript tokens summarized in the web process
+INLINE_CATEGORIZATION_MAX_QUESTIONS = 20  # Questions categorized in the web process
+
+# Job result responses (see utils/response_encoding.py)
+RESPONSE_COMPRESSION_MIN_BYTES = 1024  # Smaller responses are sent uncompressed
+RESPONSE_GZIP_LEVEL = 6
+RESPONSE_ZSTD_LEVEL = 3  # Used when the client accepts zstd
+RESULT_CACHE_TTL = 60 * 60 * 24  # Seconds the encoded result of a finished job is kept
+# Seconds the time index of a finished transcript is kept (rebuilt when used again)
+TRANSCRIPT_INDEX_TTL = 60 * 60 * 24 * 30
+
+# Job settings
+# Categorize questions while the audio is still transcribed. Off by default: the batched
+# Whisper pipeline (batch_size > 0, the default) only returns segments once the whole
+# file is decoded, so the categorization would only overlap alignment and punctuation.
+# Enable it for jobs transcribed with batch_size=0, which streams its segments.
+INCREMENTAL_ANALYSIS = False
+EARLY_CATEGORIZATION_BATCH_SIZE = 8  # Questions transcribed early are sent in batches
+EARLY_CATEGORIZATION_MAX_WAIT = 5  # Max seconds a question waits for its batch to fill
+JOB_MAX_RETRIES = 1  # Failed jobs are retried, resuming from their checkpoints
+# Per-job outputs of each transcription stage
+CHECKPOINT_FOLDER = "temp_outputs/checkpoints/"
+# Keep the checkpoints after a job has succeeded (for debugging)
+KEEP_CHECKPOINTS = False
+# Identical submissions (same URL or file, same settings) share one job
+DEDUPLICATE_JOBS = True
+DEDUP_TTL = 60 * 60 * 24  # Seconds a submission is matched to its job
+BATCH_TTL = 60 * 60 * 24 * 30  # Seconds a batch (POST /jobs/batch) can be tracked
+
 # Environment settings
 
 ENV_TYPE = "dev"
@@ -14,3 +14,22 @@ QUEUES = ["jobs"]
 
 # To start a worker up from the terminal:
 # rq worker -c config.worker_config
+
+
+# Worker class started by the worker supervisor. The pre-warmed worker loads the
+# models once at boot and runs jobs in-process instead of forking for each job.
+# When starting a worker by hand, pass it with:
+#    rq worker -c config.worker_config -w utils.queueing.prewarmed_worker.PrewarmedWorker
+WORKER_CLASS = "utils.queueing.prewarmed_worker.PrewarmedWorker"
+
+# Alignment models loaded at boot by the pre-warmed worker
+WARM_ALIGN_LANGUAGES = ["en"]
+
+
+# Worker supervisor settings (see utils/queueing/worker_supervisor.py)
+MIN_WORKERS = 1  # Workers kept running even when the queue is empty
+MAX_WORKERS = 2  # Upper bound, e.g. how many pipelines fit on the GPU at once
+JOBS_PER_WORKER = 2  # Start one more worker for every this many queued jobs
+WORKER_MEMORY_MB = 8000  # Free memory needed before starting another worker
+SCALE_DOWN_DELAY = 300  # Seconds the queue must stay empty before draining idle workers
+SUPERVISOR_POLL_INTERVAL = 5  # Seconds between supervision rounds
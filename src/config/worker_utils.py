@@ -1,25 +1,30 @@
 # Command line options:
-#    --kill: Kill all workers
-#    --restart: Kill all workers and restart them
+#    --kill: Stop all workers once their current job is done
+#    --restart: Stop all workers once their current job is done, and restart them
 
 
 import os
 from redis import Redis
 from rq import Worker, Queue
+from rq.command import send_shutdown_command
 from dotenv import load_dotenv
+import subprocess
+import json
 import sys
 import argparse
 
 
 # This file is intended to tell information about all the workers that are running in the system.
-# It can also kill workers, and restart them.
+# It can also stop workers, and restart them through the worker supervisor.
 
 
 load_dotenv()
 REDIS_PORT = os.getenv("REDIS_PORT")
 
 # add the src directory to the path
-sys.path.append(os.path.join(os.path.dirname(__file__), "src"))
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from utils.queueing.worker_supervisor import get_supervisor_metrics  # noqa: E402
 
 
 # Returns all workers registered in this connection
@@ -43,51 +48,49 @@ for worker in workers:
     print(f"Total working time: {worker.total_working_time}")  # In seconds
     print("")
 
-print("To restart all workers, run: sudo python3 src/worker_utils.py --restart")
+print("Supervisor metrics:")
+print(json.dumps(get_supervisor_metrics(redis), indent=2))
+print("To restart all workers, run: python3 config/worker_utils.py --restart")
 
 
-# if sys argument kill=True, kill all workers in the system
+# if sys argument kill=True, stop all workers in the system
 
 # use argparse to parse the arguments
 if len(sys.argv) > 1:
     parser = argparse.ArgumentParser()
-    parser.add_argument("--kill", action="store_true", help="Kill all workers")
     parser.add_argument(
-        "--restart", action="store_true", help="Kill all workers and restart them"
+        "--kill", action="store_true", help="Stop all workers after their current job"
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Stop all workers after their current job and let the supervisor restart them",
     )
     args = parser.parse_args()
 
-    if args.kill:
+    if args.kill or args.restart:
+        # Warm shutdown: each worker finishes its current job before exiting
         for worker in workers:
-            worker_name = worker.name
-            pid = worker.pid
-            os.system(f"kill {pid}")  # send SIGTERM to the worker
-            os.system(
-                f"kill {pid}"
-            )  # Send twice to not let the worker finish the current job
-            print(f"Worker {worker_name} with PID {pid} killed")
+            send_shutdown_command(redis, worker.name)
+            print(f"Worker {worker.name} with PID {worker.pid} asked to stop")
 
-    print("All workers killed")
+        print("All workers will stop after their current job")
+        if args.kill and get_supervisor_metrics(redis):
+            print(
+                "A worker supervisor is running and will start new workers. "
+                "Stop it to keep them stopped."
+            )
 
-    # if sys argument restart=True, kill all workers in the system, and restart them\
+    # if sys argument restart=True, the supervisor starts new workers in their place
     if args.restart:
-        print("Restarting workers...")
-        for worker in workers:
-            worker_name = worker.name
-            pid = worker.pid
-            os.system(f"kill {pid}")
-            os.system(f"kill {pid}")
-            print(f"Worker {worker_name} with PID {pid} killed")
-
-        print("All workers killed. Restarting workers...")
-        # Create one worker according to worker_config.py
-
-        # ensure we're in the right directory
-        os.chdir("/home/classgpu/classifAI-engine")
-        # Change the virtual environment
-        os.system("source /home/classgpu/classifAI-engine/venv-3.10/bin/activate")
-
-        # Run the worker in background
-        os.system("rq worker --config worker_config &")
+        if get_supervisor_metrics(redis):
+            print("The worker supervisor will start new workers")
+        else:
+            print("No worker supervisor is running. Starting one...")
+            subprocess.Popen(
+                [sys.executable, "-m", "utils.queueing.worker_supervisor"],
+                cwd=os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."),
+                start_new_session=True,  # Keep running after this script exits
+            )
 
         print("Workers restarted")
@@ -3,5 +3,7 @@ from .summarize import summarize
 from .transcription import transcription
 from .analyze import analyze
 from .server_info import server_info
+from .jobs import jobs
+from .search import search
 
-__all__ = ['categorize', 'summarize', 'transcription', 'analyze', 'server_info']
+__all__ = ['categorize', 'summarize', 'transcription', 'analyze', 'server_info', 'jobs', 'search']
@@ -2,8 +2,14 @@ from flask import Blueprint, request, make_response
 from dotenv import load_dotenv
 
 # from utils.analyze_audio import analyze_audio
-from utils.queueing.queue_manager import enqueue, get_job_status
+from utils.queueing.queue_manager import (
+    deduplicated_response,
+    enqueue,
+    find_duplicate_job,
+    get_job_status,
+)
 from utils.queueing.jobs import Job
+from utils.queueing.deduplication import get_dedup_key, normalize_url, stream_checksum
 import uuid
 
 from config import config as settings
@@ -34,12 +40,23 @@ def analyze_endpoint():
             "No file uploaded. Please provide either a YouTube URL or a file", 400
         )
 
+    # Identical submissions (same file or URL, same model) share one job
+    model_name = settings.TRANSCRIPTION_MODEL
+    dedup_settings = {"model_type": model_name}
+
     file = request.files.get("file")  # Audio or video file
     if file:
         title = file.filename
         publish_date = None
         url = None
 
+        dedup_key = get_dedup_key(
+            "analyze", "sha256:" + stream_checksum(file.stream), dedup_settings
+        )
+        existing = find_duplicate_job(dedup_key)
+        if existing is not None:
+            return deduplicated_response(existing)
+
         # Write the file to a temporary file - convert to mp3, if necessary, later
 
         file_suffix = title.split(".")[-1]
@@ -60,8 +77,8 @@ def analyze_endpoint():
         if not url:
             return make_response("No URL or Audio File provided", 400)
         title = url
+        dedup_key = get_dedup_key("analyze", normalize_url(url), dedup_settings)
 
-    model_name = settings.TRANSCRIPTION_MODEL
     try:
         job = Job.initialize_analysis_job(
             Job(job_id=str(uuid.uuid4()), type="analyze"),
@@ -72,7 +89,7 @@ def analyze_endpoint():
             url=url,
         )
 
-        job_queue = enqueue("analyze", job.job_id, job.job_info)
+        job_queue = enqueue("analyze", job.job_id, job.job_info, dedup_key=dedup_key)
 
         return job_queue
     except Exception as e:
@@ -85,4 +102,4 @@ def analyze_status():
     if not job_id:
         return jsonify({"error": "job_id parameter is required"}), 400
 
-    return get_job_status(job_id)
+    return get_job_status(job_id, request.accept_encodings)
@@ -1,13 +1,32 @@
 from flask import Blueprint, request, make_response
 from dotenv import load_dotenv
 import json
-from utils.categorize.categorize_gemma import categorize_question
-from utils.categorize.categorize_transcript import categorize_transcript
+from utils.categorize.categorize_transcript import (
+    categorize_transcript,
+    categorize_list_of_questions,
+    categorize_question,
+    categorize_question_batch,
+    fallback_level,
+)
+from utils.categorize.categorization_cache import get_cached_level, cache_level
+from utils.categorize.question_coalescer import QuestionCoalescer
+from utils.queueing.queue_manager import enqueue
+from utils.queueing.jobs import Job
+from utils.transcript_reader import iter_segments, iter_questions
+from config.config import CATEGORIZATION_BATCHING, INLINE_CATEGORIZATION_MAX_QUESTIONS
+import uuid
 
 # Set up the blueprint
 load_dotenv()
 categorize = Blueprint("categorize", __name__)
 
+# Concurrent /categorize/question calls share batched requests to the LLM server
+question_coalescer = (
+    QuestionCoalescer(categorize_question_batch)
+    if CATEGORIZATION_BATCHING and categorize_question_batch
+    else None
+)
+
 
 @categorize.route("/categorize/question", methods=["POST"])
 def categorize_question_endpoint():
@@ -23,7 +42,16 @@ def categorize_question_endpoint():
     if not question:
         return make_response("No question provided", 400)
 
-    category = categorize_question(question)
+    category = get_cached_level(question)
+    if category is None:
+        if question_coalescer is not None:
+            category = question_coalescer.categorize(question)
+        else:
+            category = categorize_question(question)
+        cache_level(question, "", category)
+
+    if category is None:
+        category = fallback_level(question)
 
     return make_response(json.dumps({"category": category}), 200)
 
@@ -34,7 +62,9 @@ def categorize_transcript_endpoint():
     Args:
         transcript: the transcript to categorize (JSON format or file upload)
     Returns:
-        Response object with the status code.
+        Response object with the status code. Transcripts with more than
+        INLINE_CATEGORIZATION_MAX_QUESTIONS questions are queued instead, and the
+        response holds the job_id to follow (see /jobs/status).
     """
 
     # Handle file upload
@@ -43,14 +73,40 @@ def categorize_transcript_endpoint():
 
     file = request.files.get("file")
     if file:
-        transcript = file.read()
-        transcript = json.loads(transcript)
+        # Parse the upload as it is read, keeping only its questions in memory
+        try:
+            questions = list(iter_questions(iter_segments(file.stream)))
+        except ValueError as e:
+            return make_response(f"Invalid transcript format: {str(e)}", 400)
+
+        if len(questions) > INLINE_CATEGORIZATION_MAX_QUESTIONS:
+            job = Job(
+                job_id=str(uuid.uuid4()), type="categorization"
+            ).initialize_categorization_job(
+                questions=[question.to_dict() for question in questions]
+            )
+            return enqueue("categorization", job.job_id, job.job_info)
+
+        category_list = categorize_list_of_questions(questions)
     else:
         transcript = request.json
 
-    category_list = categorize_transcript(transcript)
+        # Categorize a long transcript in a worker instead of holding up the web process
+        try:
+            question_count = sum("?" in segment["text"] for segment in transcript)
+        except (TypeError, KeyError):
+            return make_response("Invalid transcript format", 400)
+        if question_count > INLINE_CATEGORIZATION_MAX_QUESTIONS:
+            job = Job(
+                job_id=str(uuid.uuid4()), type="categorization"
+            ).initialize_categorization_job(transcript)
+            return enqueue("categorization", job.job_id, job.job_info)
+
+        category_list = categorize_transcript(transcript)
+
+    categories = [question.to_dict() for question in category_list]
 
-    return make_response(json.dumps({"categories": category_list}), 200)
+    return make_response(json.dumps({"categories": categories}), 200)
 
 
 @categorize.route("/categorize")
@@ -0,0 +1,237 @@
+from flask import Blueprint, request, jsonify, url_for
+from werkzeug.utils import secure_filename
+from dotenv import load_dotenv
+import logging
+import uuid
+import os
+
+from config import config
+from utils.auth import api_key_required
+from utils.cache_store import PROJECT_ROOT
+from utils.queueing.jobs import Job
+from utils.queueing.deduplication import stream_checksum
+from utils.queueing.queue_manager import (
+    MAX_BATCH_JOBS,
+    enqueue,
+    enqueue_batch,
+    find_duplicate_job,
+    get_batch_status,
+    get_submission_key,
+    get_job_status,
+    get_job_events,
+    get_bulk_job_status,
+    get_transcript_slice,
+)
+from utils.transcription.download_utils import get_playlist_video_urls
+
+load_dotenv()
+
+jobs = Blueprint("jobs", __name__)
+
+
+@jobs.route("/jobs/status", methods=["GET"])
+def job_status():
+    """Get the status of any job (transcription, analysis, etc.)
+
+    Args:
+        job_id: ID of the job.
+
+    Returns:
+        Response object with the status, meta and, if finished, the result.
+    """
+    job_id = request.args.get("job_id")
+    if not job_id:
+        return jsonify({"error": "job_id parameter is required"}), 400
+
+    return get_job_status(job_id, request.accept_encodings)
+
+
+@jobs.route("/jobs/status", methods=["POST"])
+def bulk_job_status():
+    """Get the status of many jobs at once, e.g. every lecture of a course dashboard.
+
+    Args:
+        job_ids: list of job IDs. JSON body.
+        include_result: also return the results of finished jobs (default: false).
+        etags: {job_id: etag} from a previous response. Unchanged jobs are not resent.
+
+    Returns:
+        Response object with {"jobs": {job_id: status}}, or 304 if If-None-Match matches.
+    """
+    data = request.get_json(silent=True) or {}
+    job_ids = data.get("job_ids")
+    if not job_ids:
+        return jsonify({"error": "job_ids is required"}), 400
+
+    return get_bulk_job_status(
+        job_ids,
+        include_result=bool(data.get("include_result", False)),
+        known_etags=data.get("etags"),
+        if_none_match=request.if_none_match,
+        accept_encodings=request.accept_encodings,
+    )
+
+
+@jobs.route("/jobs/transcript", methods=["GET"])
+def job_transcript():
+    """Get part of the transcript of a finished transcription or analysis job.
+
+    Args:
+        job_id: ID of the job.
+        start_ms, end_ms: time window [start_ms, end_ms), in milliseconds.
+        OR offset: position of the first sentence (default: 0).
+        limit: max number of sentences (default: 100).
+
+    Returns:
+        Response object with {"job_id", "total", "sentences"}.
+    """
+    job_id = request.args.get("job_id")
+    if not job_id:
+        return jsonify({"error": "job_id parameter is required"}), 400
+
+    start_ms = request.args.get("start_ms", type=int)
+    end_ms = request.args.get("end_ms", type=int)
+    offset = request.args.get("offset", 0, type=int)
+    limit = request.args.get("limit", 100, type=int)
+    if (start_ms is None) != (end_ms is None):
+        return jsonify({"error": "start_ms and end_ms must be given together"}), 400
+    if offset < 0:
+        return jsonify({"error": "offset must be positive"}), 400
+
+    return get_transcript_slice(
+        job_id,
+        start_ms=start_ms,
+        end_ms=end_ms,
+        offset=offset,
+        limit=limit,
+        accept_encodings=request.accept_encodings,
+    )
+
+
+@jobs.route("/jobs/export", methods=["POST"])
+@api_key_required
+def export_jobs():
+    """Export the results of finished transcription and analysis jobs to Parquet files
+    in EXPORT_FOLDER. Jobs exported before are skipped.
+
+    Args:
+        job_ids: list of job IDs to export (default: every finished job). JSON body.
+
+    Returns:
+        Response object with the job_id of the queued export. Its result lists the
+        files written (see /jobs/status).
+    """
+    data = request.get_json(silent=True) or {}
+    job_ids = data.get("job_ids")
+    if job_ids is not None and not isinstance(job_ids, list):
+        return jsonify({"error": "job_ids must be a list"}), 400
+
+    job = Job(job_id=str(uuid.uuid4()), type="export").initialize_export_job(
+        [str(job_id) for job_id in job_ids] if job_ids else None
+    )
+    return enqueue("export", job.job_id, job.job_info)
+
+
+@jobs.route("/jobs/batch", methods=["POST"])
+def submit_batch():
+    """Transcribe or analyze many videos or files at once, e.g. a course playlist.
+
+    Args:
+        urls: list of video URLs. JSON body.
+        OR playlist_url: URL of a YouTube playlist. JSON body.
+        OR files: audio or video files. Multipart form.
+        job_type: "analyze" (default) or "transcription".
+        model_name: name of the model for transcription jobs.
+
+    Returns:
+        Response object with the batch_id and the job_id of every URL or file. Track
+        them with GET /jobs/batch?batch_id=...
+    """
+    data = request.get_json(silent=True) or request.form
+    job_type = data.get("job_type", "analyze")
+    model_name = data.get("model_name")
+    files = request.files.getlist("files")
+    urls = data.get("urls") or []
+    playlist_url = data.get("playlist_url")
+
+    if not isinstance(urls, list):
+        return jsonify({"error": "urls must be a list"}), 400
+    if not (urls or playlist_url or files):
+        return jsonify({"error": "Provide urls, a playlist_url, or files"}), 400
+    if job_type not in ("transcription", "analyze"):
+        return jsonify({"error": "job_type must be transcription or analyze"}), 400
+
+    if playlist_url:
+        try:
+            urls = urls + get_playlist_video_urls(playlist_url)
+        except Exception as e:
+            logging.error(f"Could not read playlist {playlist_url}: {str(e)}")
+            return jsonify({"error": "Could not read the playlist"}), 400
+
+    # Checked once the playlist is expanded, and before any upload is written
+    if len(urls) + len(files) > MAX_BATCH_JOBS:
+        return jsonify({"error": f"At most {MAX_BATCH_JOBS} jobs per batch"}), 400
+
+    submissions = [{"source": str(url), "url": str(url)} for url in urls]
+
+    upload_folder = os.path.join(PROJECT_ROOT, config.UPLOAD_FOLDER)
+    for file in files:
+        dedup_key = get_submission_key(
+            job_type, f"sha256:{stream_checksum(file.stream)}", model_name
+        )
+        # Uploads of files already submitted are not written again
+        existing = find_duplicate_job(dedup_key)
+        if existing is not None:
+            submissions.append({"source": file.filename, "job_id": existing})
+            continue
+
+        # Only the extension of the client's file name is kept, sanitized
+        file_suffix = os.path.splitext(secure_filename(file.filename))[1]
+        audio_path = os.path.join(upload_folder, f"{uuid.uuid4()}{file_suffix}")
+        os.makedirs(upload_folder, exist_ok=True)
+        try:
+            file.save(audio_path)
+        except Exception as e:
+            return jsonify({"error": f"Could not save {file.filename}: {str(e)}"}), 500
+        submissions.append(
+            {"source": file.filename, "audio_path": audio_path, "dedup_key": dedup_key}
+        )
+
+    return enqueue_batch(job_type, submissions, model_name=model_name)
+
+
+@jobs.route("/jobs/batch", methods=["GET"])
+def batch_status():
+    """Get the progress of a batch submitted to POST /jobs/batch.
+
+    Args:
+        batch_id: ID of the batch.
+
+    Returns:
+        Response object with the status, title and progress of every job, and the
+        number of jobs in each status.
+    """
+    batch_id = request.args.get("batch_id")
+    if not batch_id:
+        return jsonify({"error": "batch_id parameter is required"}), 400
+
+    return get_batch_status(batch_id, request.accept_encodings)
+
+
+@jobs.route("/jobs/events", methods=["GET"])
+def job_events():
+    """Follow the progress of a job as Server-Sent Events.
+
+    Args:
+        job_id: ID of the job.
+
+    Returns:
+        text/event-stream response. "progress" events carry the job's progress, and a
+        final "result" event gives the URL to fetch the result from.
+    """
+    job_id = request.args.get("job_id")
+    if not job_id:
+        return jsonify({"error": "job_id parameter is required"}), 400
+
+    result_url = url_for("jobs.job_status", job_id=job_id)
+    return get_job_events(job_id, result_url)
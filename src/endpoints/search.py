@@ -0,0 +1,50 @@
+from flask import Blueprint, request, jsonify
+from dotenv import load_dotenv
+
+from utils.search_index import get_search_index, MAX_SEARCH_RESULTS
+from utils.response_encoding import json_response
+
+load_dotenv()
+
+search = Blueprint("search", __name__)
+
+
+@search.route("/search", methods=["GET"])
+def search_transcripts():
+    """Search the transcripts of every finished transcription and analysis job.
+
+    Args:
+        q: terms and "quoted phrases" that must all appear.
+        speaker: only sentences of this speaker (optional).
+        level: only questions of this level (optional).
+        job_id: only sentences of this job (optional).
+        limit: max number of hits (default: 20, at most MAX_SEARCH_RESULTS).
+        offset: number of hits to skip (default: 0).
+
+    Returns:
+        Response object with {"total", "hits", "facets"}, best hits first. Times are
+        in milliseconds.
+    """
+    query = request.args.get("q", "").strip()
+    if not query:
+        return jsonify({"error": "q parameter is required"}), 400
+
+    limit = request.args.get("limit", 20, type=int)
+    offset = request.args.get("offset", 0, type=int)
+    if not 0 < limit <= MAX_SEARCH_RESULTS:
+        return (
+            jsonify({"error": f"limit must be between 1 and {MAX_SEARCH_RESULTS}"}),
+            400,
+        )
+    if offset < 0:
+        return jsonify({"error": "offset must be positive"}), 400
+
+    results = get_search_index().search(
+        query,
+        speaker=request.args.get("speaker"),
+        level=request.args.get("level", type=int),
+        job_id=request.args.get("job_id"),
+        limit=limit,
+        offset=offset,
+    )
+    return json_response({"query": query, **results}, request.accept_encodings)
@@ -1,6 +1,8 @@
 from flask import Blueprint, make_response, jsonify
 from dotenv import load_dotenv
 from utils.auth import api_key_required
+from utils.llm_client import get_llm_client, get_published_stats
+from utils.queueing.queue_manager import r
 from config import config as settings
 
 load_dotenv()
@@ -63,3 +65,21 @@ def config():
 @api_key_required
 def secure():
     return make_response("OK", 200)
+
+
+@server_info.route("/llm/stats", methods=["GET"])
+def llm_stats():
+    """Get the circuit breaker state, counters and latency histograms of the LLM clients
+
+    Returns: JSON object with the stats of this process' client, and the stats
+    published by every API and worker process
+    """
+    try:
+        published = get_published_stats(r)
+    except Exception as e:
+        published = {"error": "Could not read published stats: " + str(e)}
+
+    return make_response(
+        jsonify({"local": get_llm_client("llama").stats(), "processes": published}),
+        200,
+    )
@@ -1,7 +1,24 @@
-from flask import Blueprint, request, make_response, Flask, Response
+from flask import (
+    Blueprint,
+    request,
+    make_response,
+    Flask,
+    Response,
+    stream_with_context,
+)
 from dotenv import load_dotenv
-from utils.summarize.summarize_transcript import summarize_transcript
+from utils.summarize.summarize_transcript import (
+    summarize_transcript,
+    stream_transcript_summary,
+)
+from utils.queueing.job_events import format_sse
+from utils.queueing.queue_manager import enqueue
+from utils.queueing.jobs import Job
+from utils.tokenization import count_tokens
+from utils.transcript_reader import iter_segments, iter_text_chunks
+from config.config import INLINE_SUMMARY_MAX_TOKENS
 import logging
+import uuid
 
 load_dotenv()
 
@@ -10,12 +27,20 @@ summarize = Blueprint("summarize", __name__)
 
 def get_transcript_from_request():
     """
-    Extract the transcript from the request. Handles both text and transcript JSON formats.
+    Extract the transcript from the request. Handles both text and transcript JSON formats,
+    and transcript JSON file uploads (parsed as they are read).
 
     Returns:
         str: The extracted transcript.
         tuple: Error response if no transcript is provided.
     """
+    file = request.files.get("file")
+    if file:
+        try:
+            return " ".join(iter_text_chunks(iter_segments(file.stream))).strip()
+        except ValueError as e:
+            return make_response(f"Invalid transcript format: {str(e)}", 400)
+
     # Extract the transcript data from the request
     data = request.get_json()
     transcript = data.get("text")
@@ -28,12 +53,9 @@ def get_transcript_from_request():
         if not transcript_json:
             return make_response("No transcript provided", 400)
 
-        # Concatenate text entries from transcript details
-        transcript = ""
-
+        # Join the text entries of the transcript details
         try:
-            for line in transcript_json:
-                transcript += line["text"] + " "
+            transcript = " ".join(iter_text_chunks(transcript_json))
         except Exception as e:
             logging.error(f"Error Occured while extracting transcript: {str(e)}")
             return make_response("Invalid transcript format", 400)
@@ -47,8 +69,11 @@ def summarize_endpoint():
     Args:
         text: the transcript to summarize. json={"text": raw_text}
         OR json = {"transcript": [{"text": "line1"}, {"text": "line2"}]} (gets concatenated)
+        OR file: a transcript JSON file upload (gets concatenated)
     Returns:
-        Response object with the status code.
+        Response object with the status code. Transcripts longer than
+        INLINE_SUMMARY_MAX_TOKENS tokens are queued instead, and the response holds
+        the job_id to follow (see /jobs/status).
     """
 
     transcript = (
@@ -58,11 +83,55 @@ def summarize_endpoint():
     if isinstance(transcript, Response):  # Check for error response
         return transcript
 
+    # Summarize a long transcript in a worker instead of holding up the web process
+    if count_tokens(transcript) > INLINE_SUMMARY_MAX_TOKENS:
+        job = Job(
+            job_id=str(uuid.uuid4()), type="summarization"
+        ).initialize_summarization_job(transcript)
+        return enqueue("summarization", job.job_id, job.job_info)
+
     summary = summarize_transcript(transcript)
 
     return summary
 
 
+@summarize.route("/summarize/stream", methods=["POST"])
+def summarize_stream_endpoint():
+    """Summarize the transcript, streaming the summary as Server-Sent Events while it is generated
+    Args:
+        text: the transcript to summarize. json={"text": raw_text}
+        OR json = {"transcript": [{"text": "line1"}, {"text": "line2"}]} (gets concatenated)
+        OR file: a transcript JSON file upload (gets concatenated)
+    Returns:
+        text/event-stream response: "token" events with the next piece of the summary,
+        then a "done" event with the whole summary, or an "error" event.
+    """
+
+    transcript = get_transcript_from_request()
+
+    if isinstance(transcript, Response):  # Check for error response
+        return transcript
+
+    def generate():
+        yield format_sse("start", {"message": "Summarizing transcript"})
+        pieces = []
+        try:
+            for piece in stream_transcript_summary(transcript):
+                pieces.append(piece)
+                yield format_sse("token", {"text": piece})
+        except Exception as e:
+            logging.error(f"Error Occured while streaming summary: {str(e)}")
+            yield format_sse("error", {"error": str(e)})
+            return
+        yield format_sse("done", {"summary": "".join(pieces)})
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":  # do not use this in production
     app = Flask(__name__)
     app.register_blueprint(summarize)
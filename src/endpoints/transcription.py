@@ -8,8 +8,11 @@ import os
 from utils.queueing.queue_manager import (
     enqueue_yt_transcription,
     enqueue as enqueue_transcription,
+    deduplicated_response,
+    find_duplicate_job,
     get_job_status as get_transcription_status,
 )
+from utils.queueing.deduplication import get_dedup_key, stream_checksum
 
 
 # Manually add FFMPEG to the PATH
@@ -76,6 +79,15 @@ def start_transcription():
     )
     job_id = str(uuid.uuid4())  # Generate a job ID using uuid
 
+    # An identical upload with the same model reuses its job, before any conversion
+    checksum = stream_checksum(file.stream)
+    dedup_key = get_dedup_key(
+        "transcription", f"sha256:{checksum}", {"model_id": model_name}
+    )
+    existing = find_duplicate_job(dedup_key)
+    if existing is not None:
+        return deduplicated_response(existing)
+
     try:
         audio = AudioSegment.from_file(file)
         # save the file to the disk as mp3
@@ -90,7 +102,7 @@ def start_transcription():
 
     job_info = {"audio_path": file_path, "model_id": model_name}
 
-    return enqueue_transcription("transcription", job_id, job_info)
+    return enqueue_transcription("transcription", job_id, job_info, dedup_key=dedup_key)
 
 
 @transcription.route("/get_transcription_status")
@@ -99,7 +111,7 @@ def get_status():
     if not job_id:
         return jsonify({"error": "job_id parameter is required"}), 400
 
-    return get_transcription_status(job_id)
+    return get_transcription_status(job_id, request.accept_encodings)
 
 
 if __name__ == "__main__":  # do not use this in production
@@ -0,0 +1,13 @@
+import os
+
+# Gunicorn picks this file up when started from the src directory, e.g.:
+#    gunicorn wsgi:app
+# Command line options (like -w or -b) override the settings below.
+
+# Threaded workers, so long-lived responses (job event streams) only hold a
+# thread instead of a whole worker process.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 32))
+
+# Event streams send a keep-alive at least every 15 seconds
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 60))
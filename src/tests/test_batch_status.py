@@ -0,0 +1,50 @@
+import json
+
+import pytest
+from flask import Flask
+from rq import Queue
+from rq.job import Job as RQJob
+
+from utils.queueing import queue_manager
+from utils.queueing.queue_manager import enqueue_batch, get_batch_status
+from utils.queueing.update_rq import job_context, update_job_meta
+
+fakeredis = pytest.importorskip("fakeredis")
+
+URL = "https://youtu.be/dQw4w9WgXcQ"
+
+
+@pytest.fixture
+def connection(monkeypatch):
+    connection = fakeredis.FakeRedis()
+    monkeypatch.setattr(queue_manager, "r", connection)
+    monkeypatch.setattr(queue_manager, "q", Queue("jobs", connection=connection))
+    with Flask(__name__).app_context():
+        yield connection
+
+
+def enqueue(job_type, submissions):
+    response, status = enqueue_batch(job_type, submissions)
+    assert status == 200
+    return response.get_json()
+
+
+def batch_status(batch_id):
+    response, status = get_batch_status(batch_id)
+    assert status == 200
+    return json.loads(response.get_data())
+
+
+@pytest.mark.parametrize("job_type", ["transcription", "analyze"])
+def test_title_of_a_url_is_shown_once_downloaded(connection, job_type):
+    batch = enqueue(job_type, [{"source": URL, "url": URL}])
+    job_id = batch["jobs"][0]["job_id"]
+    assert batch_status(batch["batch_id"])["jobs"][0]["title"] is None
+
+    # The worker saves the title of the downloaded video
+    with job_context(RQJob.fetch(job_id, connection=connection)):
+        update_job_meta(title="Lecture 1")
+
+    status = batch_status(batch["batch_id"])
+    assert status["jobs"][0]["title"] == "Lecture 1"
+    assert status["counts"] == {"queued": 1}
@@ -0,0 +1,155 @@
+import io
+
+import pytest
+
+from config import config
+from utils.queueing import deduplication
+from utils.queueing.deduplication import (
+    DEDUP_KEY_PREFIX,
+    ENQUEUE_GRACE_SECONDS,
+    claim_submission,
+    claim_submissions,
+    find_submission,
+    get_dedup_key,
+    normalize_url,
+    release_submission,
+    stream_checksum,
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        "https://youtube.com/watch?feature=share&v=dQw4w9WgXcQ&t=42",
+        "http://m.youtube.com/watch?v=dQw4w9WgXcQ",
+        " https://WWW.YouTube.com/watch?v=dQw4w9WgXcQ#comments ",
+        "https://youtu.be/dQw4w9WgXcQ",
+        "https://youtu.be/dQw4w9WgXcQ?si=AbCdEf123",
+        "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+        "https://www.youtube.com/embed/dQw4w9WgXcQ?autoplay=1",
+        "https://www.youtube.com/live/dQw4w9WgXcQ?feature=shared",
+    ],
+)
+def test_youtube_urls(url):
+    assert normalize_url(url) == "youtube:dQw4w9WgXcQ"
+
+
+def test_tracking_parameters_are_dropped():
+    assert normalize_url(
+        "HTTPS://Example.com/talk?utm_source=mail&b=2&fbclid=x&a=1&gclid=y#t=10"
+    ) == normalize_url("https://example.com/talk?a=1&b=2")
+    assert normalize_url("https://example.com") == "https://example.com/"
+
+
+def test_other_parameters_are_kept():
+    assert normalize_url("https://example.com/talk?id=1") != normalize_url(
+        "https://example.com/talk?id=2"
+    )
+    assert normalize_url("https://www.youtube.com/playlist?list=PL1").startswith(
+        "https://youtube.com/playlist"
+    )
+
+
+def test_dedup_key():
+    source = "youtube:dQw4w9WgXcQ"
+    key = get_dedup_key("analyze", source, {"model_name": "large-v3"})
+    assert key == get_dedup_key("analyze", source, {"model_name": "large-v3"})
+    assert key != get_dedup_key("analyze", source, {"model_name": "base"})
+    assert key != get_dedup_key("transcription", source, {"model_name": "large-v3"})
+
+
+def test_stream_checksum_rewinds():
+    stream = io.BytesIO(b"audio" * 1000)
+    assert stream_checksum(stream) == stream_checksum(io.BytesIO(b"audio" * 1000))
+    assert stream.read(5) == b"audio"
+
+
+@pytest.fixture
+def connection():
+    return fakeredis.FakeRedis()
+
+
+def set_status(connection, job_id, status):
+    connection.hset(f"rq:job:{job_id}", "status", status)
+
+
+def claimed_seconds_ago(connection, job_id, seconds):
+    connection.set(DEDUP_KEY_PREFIX + "key", job_id, ex=config.DEDUP_TTL - seconds)
+
+
+def test_first_submission_is_claimed(connection):
+    assert claim_submission(connection, "key", "job-1") is None
+    assert connection.get(DEDUP_KEY_PREFIX + "key") == b"job-1"
+
+
+def test_job_being_enqueued_is_reused(connection):
+    claim_submission(connection, "key", "job-1")
+    assert claim_submission(connection, "key", "job-2") == "job-1"
+
+
+@pytest.mark.parametrize("status", ["queued", "started", "finished"])
+def test_live_job_is_reused(connection, status):
+    claimed_seconds_ago(connection, "job-1", 3600)
+    set_status(connection, "job-1", status)
+    assert claim_submission(connection, "key", "job-2") == "job-1"
+    assert find_submission(connection, "key") == "job-1"
+
+
+@pytest.mark.parametrize("status", ["failed", "stopped", "canceled"])
+def test_dead_job_is_replaced(connection, status):
+    claim_submission(connection, "key", "job-1")
+    set_status(connection, "job-1", status)
+
+    assert find_submission(connection, "key") is None
+    assert claim_submission(connection, "key", "job-2") is None
+    assert connection.get(DEDUP_KEY_PREFIX + "key") == b"job-2"
+    assert connection.ttl(DEDUP_KEY_PREFIX + "key") > config.DEDUP_TTL - 5
+
+
+def test_deleted_job_is_replaced_after_the_grace_period(connection):
+    claimed_seconds_ago(connection, "job-1", ENQUEUE_GRACE_SECONDS + 10)
+    assert claim_submission(connection, "key", "job-2") is None
+    assert connection.get(DEDUP_KEY_PREFIX + "key") == b"job-2"
+
+
+def test_concurrent_reclaim_is_not_overwritten(connection, monkeypatch):
+    claim_submission(connection, "key", "job-1")
+    set_status(connection, "job-1", "failed")
+    find = deduplication.find_submission
+
+    def find_then_lose_the_race(pipeline, dedup_key):
+        existing = find(pipeline, dedup_key)
+        # Another submission replaces the dead job between the check and the SET
+        if connection.get(DEDUP_KEY_PREFIX + "key") == b"job-1":
+            connection.set(DEDUP_KEY_PREFIX + "key", "job-3", ex=config.DEDUP_TTL)
+        return existing
+
+    monkeypatch.setattr(deduplication, "find_submission", find_then_lose_the_race)
+
+    assert claim_submission(connection, "key", "job-2") == "job-3"
+    assert connection.get(DEDUP_KEY_PREFIX + "key") == b"job-3"
+
+
+def test_claim_submissions(connection):
+    claim_submission(connection, "live", "job-1")
+    claim_submission(connection, "dead", "job-2")
+    set_status(connection, "job-2", "failed")
+
+    existing = claim_submissions(
+        connection, {"live": "job-3", "dead": "job-4", "new": "job-5"}
+    )
+
+    assert existing == {"live": "job-1"}
+    assert connection.get(DEDUP_KEY_PREFIX + "dead") == b"job-4"
+    assert connection.get(DEDUP_KEY_PREFIX + "new") == b"job-5"
+
+
+def test_release_only_removes_its_own_claim(connection):
+    claim_submission(connection, "key", "job-1")
+    release_submission(connection, "key", "job-2")
+    assert connection.get(DEDUP_KEY_PREFIX + "key") == b"job-1"
+    release_submission(connection, "key", "job-1")
+    assert connection.get(DEDUP_KEY_PREFIX + "key") is None
@@ -0,0 +1,152 @@
+import threading
+
+import pytest
+
+from utils.categorize import incremental
+from utils.categorize.extract_questions import Question
+from utils.categorize.incremental import EarlyCategorizer
+from utils.queueing.update_rq import get_job
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Replace the categorization with one that records its batches."""
+    calls = []
+    lock = threading.Lock()
+
+    def categorize_list_of_questions(questions, stats=None):
+        with lock:
+            calls.append(
+                {
+                    "questions": [question.question for question in questions],
+                    "job": get_job(),
+                    "thread": threading.current_thread().name,
+                }
+            )
+        for question in questions:
+            question.set_level(len(question.question) % 4)
+        for key, count in {"hits": 1, "misses": len(questions) - 1, "local": 0}.items():
+            stats[key] = stats.get(key, 0) + count
+        return questions
+
+    monkeypatch.setattr(
+        incremental, "categorize_list_of_questions", categorize_list_of_questions
+    )
+    monkeypatch.setattr(incremental, "update_job_meta", lambda **meta: None)
+    return calls
+
+
+@pytest.fixture
+def recorded_stats(monkeypatch):
+    recorded = []
+    monkeypatch.setattr(incremental, "record_categorization_stats", recorded.append)
+    return recorded
+
+
+FIRST_KEY = EarlyCategorizer.get_key(Question("Is this the first?"))
+
+
+def segment(text, start=0.0):
+    return {"start": start, "end": start + 1, "text": text}
+
+
+def test_questions_are_categorized_in_batches(calls, recorded_stats):
+    with EarlyCategorizer(batch_size=2, max_wait=60) as early_categorizer:
+        early_categorizer.add_segment(segment("Hello there. Is this the first?"))
+        early_categorizer.add_segment(segment("What about a second one?"))
+        early_categorizer.add_segment(segment("And a third one?"))
+        questions = early_categorizer.categorize(
+            [
+                Question("Is this the first?", previous_sentence="Hello there."),
+                Question(
+                    "What about a second one?",
+                    previous_sentence="Is this the first?",
+                    two_previous_sentence="Hello there.",
+                ),
+                Question(
+                    "And a third one?",
+                    previous_sentence="What about a second one?",
+                    two_previous_sentence="Is this the first?",
+                ),
+                Question("Only in the final transcript?"),
+            ]
+        )
+
+    # One call for the full batch, the waiting question is categorized with the late one
+    assert [call["questions"] for call in calls] == [
+        ["Is this the first?", "What about a second one?"],
+        ["And a third one?", "Only in the final transcript?"],
+    ]
+    assert [question.level for question in questions] == [
+        len(question.question) % 4 for question in questions
+    ]
+
+
+def test_early_levels_are_matched_by_normalized_text(calls, recorded_stats):
+    with EarlyCategorizer(batch_size=1, max_wait=60) as early_categorizer:
+        early_categorizer.add_segment(segment("so, is this the first?"))
+        early_categorizer.categorize([Question("So is this the first?")])
+
+    assert len(calls) == 1
+    assert calls[0]["thread"].startswith("early-categorizer")
+
+
+def test_repeated_questions_are_categorized_with_their_context(calls, recorded_stats):
+    with EarlyCategorizer(batch_size=1, max_wait=60) as early_categorizer:
+        early_categorizer.add_segment(segment("Cells. Any questions?"))
+        early_categorizer.add_segment(segment("The heart. Any questions?"))
+        questions = early_categorizer.categorize(
+            [
+                Question("Any questions?", previous_sentence="Cells."),
+                Question(
+                    "Any questions?",
+                    previous_sentence="The heart.",
+                    two_previous_sentence="Any questions?",
+                ),
+            ]
+        )
+
+    assert [call["questions"] for call in calls] == [["Any questions?"]] * 2
+    assert all(question.level is not None for question in questions)
+
+
+def test_batch_is_sent_after_max_wait(calls, recorded_stats):
+    with EarlyCategorizer(batch_size=8, max_wait=0) as early_categorizer:
+        early_categorizer.add_segment(segment("Is this the first?"))
+        early_categorizer.futures[FIRST_KEY].result()
+
+    assert [call["questions"] for call in calls] == [["Is this the first?"]]
+
+
+def test_stats_of_early_and_late_batches_are_merged(calls, recorded_stats):
+    with EarlyCategorizer(batch_size=2, max_wait=60) as early_categorizer:
+        early_categorizer.add_segment(segment("Is this the first? And the second?"))
+        early_categorizer.categorize(
+            [
+                Question("Is this the first?"),
+                Question("And the second?", previous_sentence="Is this the first?"),
+                Question("A late one?"),
+            ]
+        )
+
+    assert recorded_stats == [{"hits": 2, "misses": 1, "local": 0}]
+
+
+def test_pool_threads_see_the_job(monkeypatch, calls, recorded_stats):
+    rq_job = object()
+    monkeypatch.setattr(incremental, "get_job", lambda: rq_job)
+
+    with EarlyCategorizer(batch_size=1, max_wait=60) as early_categorizer:
+        early_categorizer.add_segment(segment("Is this the first?"))
+        early_categorizer.futures[FIRST_KEY].result()
+
+    assert calls[0]["job"] is rq_job
+
+
+def test_threads_are_stopped_when_the_analysis_fails(calls, recorded_stats):
+    with pytest.raises(RuntimeError):
+        with EarlyCategorizer() as early_categorizer:
+            raise RuntimeError("transcription failed")
+
+    with pytest.raises(RuntimeError):
+        early_categorizer.executor.submit(print)
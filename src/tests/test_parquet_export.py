@@ -0,0 +1,95 @@
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("pyarrow")
+
+from rq.job import Job as RQJob, JobStatus  # noqa: E402
+from rq.results import Result  # noqa: E402
+
+from utils.export import parquet_export  # noqa: E402
+from utils.export.parquet_export import ParquetExport, export_jobs  # noqa: E402
+
+TRANSCRIPT = [{"text": "Is it?", "speaker": "SPEAKER_00", "start_time": 0}]
+
+
+def make_job(connection, job_id, job_type, status, result=None):
+    rqjob = RQJob.create(
+        print, id=job_id, connection=connection, meta={"job_type": job_type}
+    )
+    rqjob.set_status(status)
+    rqjob.save()
+    if status == JobStatus.FINISHED:
+        Result.create(rqjob, Result.Type.SUCCESSFUL, None, return_value=result)
+    return rqjob
+
+
+@pytest.fixture
+def connection():
+    connection = fakeredis.FakeRedis()
+    result = {"transcript": TRANSCRIPT}
+    make_job(connection, "analyzed", "analyze", JobStatus.FINISHED, result)
+    make_job(connection, "summarized", "summarization", JobStatus.FINISHED, "A summary")
+    make_job(connection, "failed", "transcription", JobStatus.FAILED)
+    make_job(connection, "queued", "transcription", JobStatus.QUEUED)
+    return connection
+
+
+@pytest.fixture
+def fetched(monkeypatch):
+    """IDs of the jobs fetched from Redis by the exports."""
+    fetched = []
+    fetch_many = RQJob.fetch_many
+
+    def record(job_ids, connection, **kwargs):
+        fetched.extend(job_ids)
+        return fetch_many(job_ids, connection, **kwargs)
+
+    monkeypatch.setattr(RQJob, "fetch_many", record)
+    monkeypatch.setattr(parquet_export, "update_job_meta", lambda **meta: None)
+    return fetched
+
+
+JOB_IDS = ["analyzed", "summarized", "failed", "queued", "missing"]
+
+
+def test_skipped_jobs_are_recorded(connection, fetched, tmp_path):
+    summary = export_jobs(connection, JOB_IDS, str(tmp_path))
+
+    assert summary["exported"] == 1
+    assert summary["skipped"] == 4
+    manifest = ParquetExport(str(tmp_path)).load_manifest()
+    assert list(manifest["jobs"]) == ["analyzed"]
+    assert manifest["skipped"] == {
+        "summarized": "job_type",
+        "failed": "failed",
+        "queued": "unfinished",
+        "missing": "missing",
+    }
+
+
+def test_later_exports_only_fetch_unfinished_jobs(connection, fetched, tmp_path):
+    export_jobs(connection, JOB_IDS, str(tmp_path))
+    fetched.clear()
+
+    summary = export_jobs(connection, JOB_IDS, str(tmp_path))
+
+    assert fetched == ["queued"]
+    assert summary == {
+        "export_id": summary["export_id"],
+        "exported": 0,
+        "already_exported": 1,
+        "skipped": 4,
+        "files": [],
+    }
+
+
+def test_unfinished_jobs_are_exported_once_finished(connection, fetched, tmp_path):
+    export_jobs(connection, JOB_IDS, str(tmp_path))
+    make_job(connection, "queued", "transcription", JobStatus.FINISHED, TRANSCRIPT)
+
+    summary = export_jobs(connection, JOB_IDS, str(tmp_path))
+
+    assert summary["exported"] == 1
+    manifest = ParquetExport(str(tmp_path)).load_manifest()
+    assert set(manifest["jobs"]) == {"analyzed", "queued"}
+    assert "queued" not in manifest["skipped"]
@@ -0,0 +1,83 @@
+import json
+
+import pytest
+from flask import Flask
+
+from benchmarks.fake_llama_server import FakeLlamaServer
+from endpoints.summarize import summarize
+from utils.summarize import chain_summary
+
+TEXT = " ".join(f"word{i}" for i in range(20))
+
+
+def read_events(response):
+    """Parse the Server-Sent Events of a streamed response."""
+    events = []
+    for message in response.get_data(as_text=True).split("\n\n"):
+        fields = dict(
+            line.split(": ", 1) for line in message.splitlines() if ": " in line
+        )
+        if "event" in fields:
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+@pytest.fixture
+def start_server(monkeypatch):
+    """Start a stand-in LLAMA server and point the LLM client at it."""
+    monkeypatch.setattr(chain_summary, "summary_cache", None)
+    servers = []
+
+    def start(**options):
+        server = FakeLlamaServer(latency=0, token_interval=0, **options).start()
+        servers.append(server)
+        monkeypatch.setenv("LLAMA_API_URL", server.url)
+        monkeypatch.delenv("LLAMA_HEDGE_API_URL", raising=False)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    app.register_blueprint(summarize)
+    return app.test_client()
+
+
+def test_summary_is_streamed(start_server, client):
+    start_server()
+
+    response = client.post("/summarize/stream", json={"text": TEXT})
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = read_events(response)
+    assert events[0][0] == "start"
+    tokens = [data["text"] for event, data in events if event == "token"]
+    assert [token.strip() for token in tokens] == TEXT.split()
+    assert events[-1] == ("done", {"summary": "".join(tokens)})
+
+
+def test_error_event_when_the_backend_drops(start_server, client):
+    start_server(drop_after=5)
+
+    response = client.post("/summarize/stream", json={"text": TEXT})
+
+    assert response.status_code == 200
+    events = read_events(response)
+    assert [event for event, _ in events] == ["start"] + ["token"] * 5 + ["error"]
+    assert events[-1][1]["error"]
+
+
+def test_whole_summary_without_a_streaming_backend(start_server, client):
+    start_server(streaming=False)
+
+    response = client.post("/summarize/stream", json={"text": TEXT})
+
+    events = read_events(response)
+    assert [event for event, _ in events] == ["start", "token", "done"]
+    assert events[1][1]["text"] == events[2][1]["summary"] == TEXT
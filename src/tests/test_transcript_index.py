@@ -0,0 +1,91 @@
+import pytest
+
+from config import config
+from utils.queueing.transcript_index import (
+    INDEX_KEY,
+    build_transcript_index,
+    get_index_info,
+    get_sentence_page,
+    get_sentences_in_range,
+)
+
+fakeredis = pytest.importorskip("fakeredis")
+
+TRANSCRIPT = [
+    {"text": "Welcome.", "start_time": 0, "end_time": 1000},
+    {"text": "A long introduction.", "start_time": 1000, "end_time": 9000},
+    {"text": "Short one.", "start_time": 2000, "end_time": 2500},
+    {"text": "Same start.", "start_time": 5000, "end_time": 6000},
+    {"text": "Same start too?", "start_time": 5000, "end_time": 5500},
+    {"text": "The end.", "start_time": 10000, "end_time": 11000},
+]
+
+
+@pytest.fixture
+def connection():
+    connection = fakeredis.FakeRedis()
+    build_transcript_index(connection, "job", TRANSCRIPT)
+    return connection
+
+
+def texts(sentences):
+    return [(position, sentence["text"]) for position, sentence in sentences]
+
+
+def test_index_info(connection):
+    assert get_index_info(connection, "job") == {"count": 6, "max_duration": 8000}
+    assert get_index_info(connection, "other") is None
+    ttl = connection.ttl(INDEX_KEY.format(job_id="job"))
+    assert 0 < ttl <= config.TRANSCRIPT_INDEX_TTL
+
+
+def test_range_includes_sentences_running_into_the_window(connection):
+    info = get_index_info(connection, "job")
+    sentences = get_sentences_in_range(connection, "job", info, 4000, 10000, 10)
+    assert texts(sentences) == [
+        (1, "A long introduction."),
+        (3, "Same start."),
+        (4, "Same start too?"),
+    ]
+
+
+def test_range_end_is_excluded_and_limited(connection):
+    info = get_index_info(connection, "job")
+    sentences = get_sentences_in_range(connection, "job", info, 0, 5000, 10)
+    assert texts(sentences) == [
+        (0, "Welcome."),
+        (1, "A long introduction."),
+        (2, "Short one."),
+    ]
+    sentences = get_sentences_in_range(connection, "job", info, 1500, 12000, 2)
+    assert texts(sentences) == [(1, "A long introduction."), (2, "Short one.")]
+
+
+def test_page(connection):
+    assert texts(get_sentence_page(connection, "job", 0, 2)) == [
+        (0, "Welcome."),
+        (1, "A long introduction."),
+    ]
+    assert texts(get_sentence_page(connection, "job", 4, 10)) == [
+        (4, "Same start too?"),
+        (5, "The end."),
+    ]
+    assert get_sentence_page(connection, "job", 6, 10) == []
+
+
+def test_rebuild_replaces_the_index(connection):
+    build_transcript_index(connection, "job", TRANSCRIPT[:2])
+
+    assert get_index_info(connection, "job")["count"] == 2
+    assert texts(get_sentence_page(connection, "job", 0, 10)) == [
+        (0, "Welcome."),
+        (1, "A long introduction."),
+    ]
+    assert connection.keys("*:building*") == []
+
+
+def test_empty_transcript(connection):
+    build_transcript_index(connection, "job", [])
+
+    assert get_index_info(connection, "job") == {"count": 0, "max_duration": 0}
+    assert get_sentence_page(connection, "job", 0, 10) == []
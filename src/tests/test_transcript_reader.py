@@ -0,0 +1,104 @@
+import io
+import json
+
+import pytest
+
+from utils.transcript_reader import iter_segments, iter_text_chunks
+
+SEGMENTS = [
+    {"text": "Hello there.", "speaker": "SPEAKER_00", "start_time": 0},
+    {"text": "Is this é working?", "speaker": "SPEAKER_01", "start_time": 1250},
+    {"text": "Yes [it is].", "speaker": "SPEAKER_00", "start_time": 12345678},
+]
+
+
+def read(document, read_size):
+    stream = io.BytesIO(document.encode() if isinstance(document, str) else document)
+    return list(iter_segments(stream, read_size=read_size))
+
+
+@pytest.fixture(params=[1, 3, 64 * 1024])
+def read_size(request):
+    return request.param
+
+
+def test_array(read_size):
+    assert read(json.dumps(SEGMENTS), read_size) == SEGMENTS
+    assert read(json.dumps(SEGMENTS, indent=2), read_size) == SEGMENTS
+
+
+def test_empty_array(read_size):
+    assert read(" [ ] ", read_size) == []
+
+
+@pytest.mark.parametrize("key", ["transcript", "result", "segments"])
+def test_wrapped_array(read_size, key):
+    document = {
+        "job_id": "123",
+        "questions": [{"question": "Is it?", "segments": "not this one"}],
+        "summary": {"transcript": [{"text": "nested"}]},
+        key: SEGMENTS,
+        "duration": 12.5,
+    }
+    assert read(json.dumps(document), read_size) == SEGMENTS
+
+
+def test_nested_keys_are_ignored(read_size):
+    document = {"job": {"transcript": SEGMENTS}, "title": '"transcript": ['}
+    with pytest.raises(ValueError, match="none of the keys"):
+        read(json.dumps(document), read_size)
+
+
+def test_wrapped_key_must_hold_an_array(read_size):
+    with pytest.raises(ValueError, match="must be a JSON array"):
+        read(json.dumps({"transcript": "Hello there."}), read_size)
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        '[{"text": "a"}] [{"text": "b"}]',
+        '[{"text": "a"}], "tail"',
+        '{"transcript": [{"text": "a"}]} {}',
+        '{"transcript": [{"text": "a"}], "tail": 1} x',
+    ],
+)
+def test_trailing_data_is_rejected(read_size, document):
+    with pytest.raises(ValueError, match="unexpected data"):
+        read(document, read_size)
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        '[{"text": "a"},, {"text": "b"}]',
+        '[, {"text": "a"}]',
+        '[{"text": "a"},]',
+        '[{"text": "a"} {"text": "b"}]',
+        '{"title": "x",, "transcript": [{"text": "a"}]}',
+        '{"transcript": [{"text": "a"}],}',
+    ],
+)
+def test_invalid_separators_are_rejected(read_size, document):
+    with pytest.raises(ValueError):
+        read(document, read_size)
+
+
+@pytest.mark.parametrize(
+    "document, message",
+    [
+        ('[{"text": "a"}, ', "ended before"),
+        ('[{"text": "a"', "not valid JSON"),
+        ('[{"text": "a"}, "b"]', "must be JSON objects"),
+        ('"text"', "must be a JSON array"),
+    ],
+)
+def test_malformed_documents(read_size, document, message):
+    with pytest.raises(ValueError, match=message):
+        read(document, read_size)
+
+
+def test_text_chunks():
+    chunks = list(iter_text_chunks(SEGMENTS, chunk_chars=20))
+    assert " ".join(chunks) == " ".join(segment["text"] for segment in SEGMENTS)
+    assert len(chunks) == 2
@@ -1,3 +1,5 @@
+from contextlib import nullcontext
+
 from utils.queueing.jobs import Job
 from utils.analyze.extraction_utils import (
     get_audio_path_from_url_or_file,
@@ -5,10 +7,14 @@ from utils.analyze.extraction_utils import (
     combine_results,
 )
 from utils.queueing.update_rq import update_job_status
+from utils.analyze.task_graph import TaskGraph
 from utils.transcription.transcribe_full import transcribe_and_diarize
 from utils.categorize.extract_questions import extract_questions
 from utils.categorize.categorize_transcript import categorize_list_of_questions
+from utils.categorize.incremental import EarlyCategorizer
 from utils.summarize.summarize_transcript import summarize_transcript
+from utils.summarize.extractive import condense_transcript
+from config.config import INCREMENTAL_ANALYSIS, EXTRACTIVE_CONDENSATION
 
 
 def analyze_audio(job: Job) -> dict:
@@ -24,34 +30,70 @@ def analyze_audio(job: Job) -> dict:
         result (dict): Result
     """
 
-    try:
-        # 1. Extract the file audio path. If it's URL, download and convert to mp3.
-        job = get_audio_path_from_url_or_file(job)
-    except Exception as e:
-        return "Error: Unable to download and convert the audio file: " + str(e)
+    # 1. Extract the file audio path. If it's URL, download and convert to mp3.
+    #    A failed download raises, so RQ marks the job failed and the same submission
+    #    is not deduplicated to it.
+    job = get_audio_path_from_url_or_file(job)
 
-    # 2. Transcribe the audio file.
+    # 2. Transcribe the audio file. In incremental mode, questions are categorized
+    #    as soon as Whisper transcribes them, while the GPU work goes on.
     update_job_status("start_transcribing", "Transcribing audio")
-    transcription = transcribe_and_diarize(job)
-
-    # 3. Extract the transcription questions from the transcription.
-    update_job_status("extracting_questions", "Extracting questions from transcription")
-    questions_with_context = extract_questions(transcription)
-
-    # 4. Categorize the transcription questions by Costa's level.
-    update_job_status("categorizing_questions", "Categorizing questions")
-    categorized_questions = categorize_list_of_questions(questions_with_context)
+    early_categorizer = EarlyCategorizer() if INCREMENTAL_ANALYSIS else None
+    # Stops the early categorization threads even if the analysis fails
+    with early_categorizer or nullcontext():
+        transcription = transcribe_and_diarize(
+            job, on_segment=early_categorizer.add_segment if early_categorizer else None
+        )
 
-    # 5. Summarize the transcription.
-    update_job_status("summarizing", "Summarizing transcription")
-    raw_transcript = get_raw_transcript(transcription)
-    summary = summarize_transcript(raw_transcript)
+        # 3. Extract the questions, categorize them by Costa's level, and summarize the
+        #    transcription. Categorization and summarization only depend on the
+        #    transcription, so they run at the same time.
+        graph = TaskGraph()
+        graph.add(
+            "extract_questions",
+            extract_questions,
+            args=(transcription,),
+            status=("extracting_questions", "Extracting questions from transcription"),
+        )
+        graph.add(
+            "categorize_questions",
+            (
+                early_categorizer.categorize
+                if early_categorizer
+                else categorize_list_of_questions
+            ),
+            after=("extract_questions",),
+            status=("categorizing_questions", "Categorizing questions"),
+        )
+        if EXTRACTIVE_CONDENSATION:
+            graph.add(
+                "condense_transcript",
+                condense_transcript,
+                args=(transcription,),
+                status=("condensing", "Selecting the key sentences to summarize"),
+            )
+            graph.add(
+                "summarize",
+                summarize_transcript,
+                after=("condense_transcript",),
+                status=("summarizing", "Summarizing transcription"),
+            )
+        else:
+            graph.add(
+                "summarize",
+                summarize_transcript,
+                args=(get_raw_transcript(transcription),),
+                status=("summarizing", "Summarizing transcription"),
+            )
+        results = graph.run()
+    categorized_questions = results["categorize_questions"]
+    summary = results["summarize"]
 
-    # 5. Combine the results into a single dictionary.
+    # 4. Combine the results into a single dictionary.
     update_job_status("combining_results", "Combining results")
     combined_result = combine_results(transcription, categorized_questions, summary)
 
     update_job_status("completed", "Analysis completed")
 
-    # 6. Return the result.
+    # 5. Return the result.
     return combined_result
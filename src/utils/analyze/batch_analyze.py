@@ -0,0 +1,280 @@
+"""
+Analyze a folder of recordings in local processes, without Redis, RQ or Flask.
+
+Every worker process loads and warms up the models once, then runs analyze_audio
+on one file after the other. Results are written to <output>/results/<file id>.json,
+and every finished file is recorded in <output>/manifest.jsonl, so an interrupted
+batch picks up where it stopped when it is run again (failed files are retried).
+
+Run from the src folder:
+    python -m utils.analyze.batch_analyze /path/to/recordings --output /path/to/results
+    python -m utils.analyze.batch_analyze files.txt --output results --devices 0,1
+
+The input is a folder (searched recursively for audio files) or a text file with
+one path per line. LLAMA_API_URL must still point to the LLM server.
+"""
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import List
+import multiprocessing
+import argparse
+import hashlib
+import logging
+import json
+import time
+import os
+
+from config import config, worker_config
+
+MANIFEST_FILE = "manifest.jsonl"
+RESULTS_FOLDER = "results"
+
+
+def find_audio_files(input_path: str) -> List[str]:
+    """
+    List the recordings to analyze.
+
+    Args:
+        input_path (str): A folder, searched recursively for files with one of
+            config.ALLOWED_EXTENSIONS, or a text file with one path per line.
+    Returns:
+        List[str]: Absolute paths of the recordings, sorted.
+    """
+    if os.path.isdir(input_path):
+        paths = [
+            os.path.join(folder, name)
+            for folder, _, names in os.walk(input_path)
+            for name in names
+            if name.rsplit(".", 1)[-1].lower() in config.ALLOWED_EXTENSIONS
+        ]
+    else:
+        base = os.path.dirname(os.path.abspath(input_path))
+        with open(input_path) as f:
+            paths = [
+                os.path.join(base, line.strip())
+                for line in f
+                if line.strip() and not line.startswith("#")
+            ]
+    return sorted(os.path.abspath(path) for path in paths)
+
+
+def get_file_id(path: str) -> str:
+    """
+    Stable ID of a recording, from its path, size and modification time. Used as the
+    job ID, so an interrupted file resumes from its transcription checkpoints.
+    """
+    stat = os.stat(path)
+    key = f"{path}|{stat.st_size}|{int(stat.st_mtime)}"
+    return hashlib.sha1(key.encode()).hexdigest()[:16]
+
+
+def get_audio_seconds(path: str) -> float:
+    """Duration of a recording in seconds (0 if ffprobe cannot read it)."""
+    from pydub.utils import mediainfo
+
+    try:
+        return float(mediainfo(path).get("duration") or 0)
+    except Exception as e:
+        logging.warning(f"Could not read the duration of {path}: {str(e)}")
+        return 0.0
+
+
+class BatchManifest:
+    """
+    Append-only record of the processed files of a batch, one JSON line per file.
+
+    Args:
+        output_folder (str): The output folder of the batch.
+    """
+
+    def __init__(self, output_folder: str):
+        self.path = os.path.join(output_folder, MANIFEST_FILE)
+
+    def completed(self) -> set:
+        """IDs of the files that were analyzed successfully."""
+        completed = set()
+        if not os.path.exists(self.path):
+            return completed
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Last line of an interrupted write
+                if entry.get("status") == "completed":
+                    completed.add(entry["id"])
+        return completed
+
+    def add(self, entry: dict) -> None:
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def init_worker(devices) -> None:
+    """
+    Pool initializer: pin the process to a GPU, then load and warm up the models,
+    which stay loaded for every file the process analyzes.
+
+    Args:
+        devices (multiprocessing.Queue, optional): GPU ids, one taken per process.
+    """
+    if devices is not None:
+        os.environ["CUDA_VISIBLE_DEVICES"] = str(devices.get())
+
+    logging.basicConfig(level=logging.INFO)
+
+    # Imported here, so CUDA_VISIBLE_DEVICES is set before torch is loaded
+    from utils.transcription import model_cache
+
+    model_cache.keep_models_loaded()
+    duration = model_cache.warm_up(
+        config.TRANSCRIPTION_MODEL, worker_config.WARM_ALIGN_LANGUAGES
+    )
+    logging.info(f"Worker {os.getpid()} is ready after {duration:.2f}s warm-up")
+
+
+def analyze_file(path: str, file_id: str, output_folder: str) -> dict:
+    """
+    Analyze one recording and write its result (runs in a pool process).
+
+    Returns:
+        dict: {"result", "audio_seconds", "seconds"}
+    """
+    from utils.analyze.analyze_audio import analyze_audio
+    from utils.queueing.jobs import Job
+    from utils.queueing.prewarmed_worker import isolated_job_state
+    from utils.transcription.transcribe_full import clear_checkpoints
+
+    start = time.time()
+    with isolated_job_state(file_id):
+        job = Job(job_id=file_id, type="analyze").initialize_analysis_job(
+            audio_path=path,
+            model_type=config.TRANSCRIPTION_MODEL,
+            title=os.path.basename(path),
+        )
+        result = analyze_audio(job)
+    if isinstance(result, str):  # analyze_audio reports some errors as text
+        raise RuntimeError(result)
+    seconds = time.time() - start
+
+    result_path = os.path.join(output_folder, RESULTS_FOLDER, f"{file_id}.json")
+    with open(result_path + ".tmp", "w") as f:
+        json.dump(result, f)
+    os.replace(result_path + ".tmp", result_path)
+
+    if not config.KEEP_CHECKPOINTS:
+        clear_checkpoints(file_id)
+
+    return {
+        "result": os.path.relpath(result_path, output_folder),
+        "audio_seconds": get_audio_seconds(path),
+        "seconds": round(seconds, 2),
+    }
+
+
+def run_batch(
+    input_path: str, output_folder: str, workers: int = 1, devices: List[str] = None
+) -> dict:
+    """
+    Analyze every recording of the input that is not in the manifest yet.
+
+    Args:
+        input_path (str): Folder or list of recordings (see find_audio_files).
+        output_folder (str): Folder of the results and the manifest.
+        workers (int): Processes analyzing files at the same time (default: 1).
+            Each one loads its own models, so use one per GPU.
+        devices (List[str], optional): GPU ids handed to the processes in turn.
+    Returns:
+        dict: {"completed", "failed", "skipped", "files_per_hour", "real_time_factor",
+            "wall_seconds"}
+    """
+    output_folder = os.path.abspath(output_folder)
+    os.makedirs(os.path.join(output_folder, RESULTS_FOLDER), exist_ok=True)
+    manifest = BatchManifest(output_folder)
+    completed = manifest.completed()
+
+    files = find_audio_files(input_path)
+    pending = [(path, get_file_id(path)) for path in files]
+    pending = [(path, file_id) for path, file_id in pending if file_id not in completed]
+    logging.info(
+        f"{len(files)} recordings, {len(files) - len(pending)} already analyzed, "
+        f"{len(pending)} to go with {workers} workers"
+    )
+
+    # CUDA cannot be used in forked processes
+    context = multiprocessing.get_context("spawn")
+    device_queue = None
+    if devices:
+        device_queue = context.Queue()
+        for i in range(workers):
+            device_queue.put(devices[i % len(devices)])
+
+    stats = {"completed": 0, "failed": 0, "seconds": 0.0, "audio_seconds": 0.0}
+    start = time.time()
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=context,
+        initializer=init_worker,
+        initargs=(device_queue,),
+    ) as executor:
+        futures = {
+            executor.submit(analyze_file, path, file_id, output_folder): (path, file_id)
+            for path, file_id in pending
+        }
+        for future in as_completed(futures):
+            path, file_id = futures[future]
+            entry = {"id": file_id, "file": path, "finished": time.time()}
+            try:
+                entry.update(future.result(), status="completed")
+                stats["completed"] += 1
+                stats["seconds"] += entry["seconds"]
+                stats["audio_seconds"] += entry["audio_seconds"]
+            except Exception as e:
+                logging.error(f"Could not analyze {path}: {str(e)}")
+                entry.update(status="failed", error=str(e))
+                stats["failed"] += 1
+            manifest.add(entry)
+
+            elapsed = time.time() - start
+            done = stats["completed"] + stats["failed"]
+            logging.info(
+                f"[{done}/{len(pending)}] {entry['status']}: {path} "
+                f"({stats['completed'] / elapsed * 3600:.1f} files/hour)"
+            )
+
+    elapsed = time.time() - start
+    files_per_hour = stats["completed"] / elapsed * 3600 if elapsed else 0.0
+    # Processing time per second of audio, for one worker (lower is faster)
+    real_time_factor = None
+    if stats["audio_seconds"]:
+        real_time_factor = round(stats["seconds"] / stats["audio_seconds"], 3)
+    return {
+        "completed": stats["completed"],
+        "failed": stats["failed"],
+        "skipped": len(files) - len(pending),
+        "files_per_hour": round(files_per_hour, 2),
+        "real_time_factor": real_time_factor,
+        "wall_seconds": round(elapsed, 1),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Analyze a folder of recordings without Redis or Flask"
+    )
+    parser.add_argument("input", help="Folder of recordings, or file listing them")
+    parser.add_argument("--output", required=True, help="Folder of the results")
+    parser.add_argument("--workers", type=int, default=1, help="Files analyzed at once")
+    parser.add_argument("--devices", help="GPU ids for the workers, e.g. 0,1")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    summary = run_batch(
+        args.input,
+        args.output,
+        workers=args.workers,
+        devices=args.devices.split(",") if args.devices else None,
+    )
+    print(json.dumps(summary, indent=2))
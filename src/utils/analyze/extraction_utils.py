@@ -1,4 +1,3 @@
-from rq import get_current_job
 from utils.queueing.jobs import Job
 from utils.transcription.download_utils import download_and_convert_to_mp3
 from typing import List
@@ -6,7 +5,7 @@ from utils.categorize.extract_questions import Question
 from collections import OrderedDict
 from pytube.exceptions import AgeRestrictedError, VideoRegionBlocked, VideoUnavailable
 from config import config
-from utils.queueing.update_rq import update_job_status
+from utils.queueing.update_rq import update_job_meta, update_job_status
 import os
 
 
@@ -65,9 +64,8 @@ def get_audio_path_from_url_or_file(job: Job):
         job_info["title"] = title
         job_info["date"] = date
 
-        rq_job = get_current_job()
-        if rq_job:
-            rq_job.meta["title"] = title
+        # Enqueued without a title, shown by the job and batch statuses
+        update_job_meta(title=title)
         update_job_status("start_transcribing", "Starting transcription")
 
         job.job_info = job_info
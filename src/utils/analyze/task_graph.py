@@ -0,0 +1,115 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Tuple
+import logging
+import time
+
+from utils.queueing.update_rq import (
+    get_job,
+    job_context,
+    update_job_status,
+    update_job_meta,
+)
+
+
+class TaskGraph:
+    """
+    Runs the steps of a job as a small dependency graph: every step starts as soon as
+    the steps it depends on have finished, so independent steps run concurrently.
+
+    Steps run on threads, so they should be bound by I/O or remote calls (like the
+    LLM requests of the categorization and summarization). The job stays bound to
+    every thread, so steps can update its status and meta. The time each step took
+    is saved in the job meta under "step_timings".
+
+    Example:
+        graph = TaskGraph()
+        graph.add("questions", extract_questions, args=(transcript,))
+        graph.add("categorized", categorize_list_of_questions, after=("questions",))
+        graph.add("summary", summarize_transcript, args=(text,))
+        results = graph.run()  # {"questions": ..., "categorized": ..., "summary": ...}
+    """
+
+    def __init__(self):
+        self.steps = {}
+
+    def add(
+        self,
+        name: str,
+        func: Callable,
+        after: Iterable[str] = (),
+        args: tuple = (),
+        status: Tuple[str, str] = None,
+    ) -> "TaskGraph":
+        """
+        Add a step to the graph.
+
+        Args:
+            name (str): Name of the step, used for its result and timing.
+            func (Callable): Runs the step. It is called with args, followed by the
+                results of the steps in after.
+            after (Iterable[str], optional): Steps that must finish first.
+            args (tuple, optional): Arguments passed before the results of after.
+            status (Tuple[str, str], optional): Job progress and message set when the step starts.
+        Returns:
+            TaskGraph: The graph, to chain calls.
+        """
+        after = tuple(after)
+        for dependency in after:
+            if dependency not in self.steps:
+                raise ValueError(f"Step {name} depends on unknown step {dependency}")
+        self.steps[name] = {
+            "func": func,
+            "after": after,
+            "args": args,
+            "status": status,
+        }
+        return self
+
+    def run(self) -> Dict[str, object]:
+        """
+        Run every step. If a step fails, no new steps are started and its exception
+        is raised once the running steps have finished.
+
+        Returns:
+            dict: The result of every step, by name.
+        """
+        rq_job = get_job()
+        results, timings = {}, {}
+        waiting = dict(self.steps)
+        running = {}  # future -> (name, start time)
+
+        with ThreadPoolExecutor(max_workers=max(1, len(self.steps))) as executor:
+            while waiting or running:
+                for name, step in list(waiting.items()):
+                    if all(dependency in results for dependency in step["after"]):
+                        del waiting[name]
+                        if step["status"]:
+                            update_job_status(*step["status"])
+                        inputs = step["args"] + tuple(results[d] for d in step["after"])
+                        future = executor.submit(
+                            self._run_step, rq_job, step["func"], inputs
+                        )
+                        running[future] = (name, time.monotonic())
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, start = running.pop(future)
+                    timings[name] = round(time.monotonic() - start, 3)
+                    try:
+                        results[name] = future.result()
+                    except Exception:
+                        logging.error(f"Step {name} failed after {timings[name]}s")
+                        waiting.clear()  # Let the running steps finish, start no more
+                        wait(running)
+                        update_job_meta(step_timings=timings)
+                        raise
+
+                update_job_meta(step_timings=timings)
+
+        logging.info(f"Step timings: {timings}")
+        return results
+
+    @staticmethod
+    def _run_step(rq_job, func: Callable, inputs: tuple):
+        with job_context(rq_job):
+            return func(*inputs)
@@ -0,0 +1,269 @@
+from typing import Iterator, Tuple
+import threading
+import logging
+import sqlite3
+import json
+import time
+import os
+
+from config import config
+
+# Folder the relative paths in config are resolved against (the project root)
+PROJECT_ROOT = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+REDIS_KEY_PREFIX = "classifai:cache:"
+
+
+class CacheStore:
+    """
+    Persistent key-value cache for JSON serializable values, shared by every process
+    of the engine.
+
+    Entries live in a namespace, expire after ttl seconds and, once the namespace holds
+    more than max_entries, the least recently used entries are evicted.
+    Cache errors are logged and treated as misses, so they never fail a job.
+
+    Args:
+        namespace (str): Name of the namespace (e.g. "categorization").
+        ttl (int, optional): Seconds an entry stays valid (None: forever).
+        max_entries (int, optional): Max entries kept in the namespace (None: no limit).
+    """
+
+    def __init__(self, namespace: str, ttl: int = None, max_entries: int = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str):
+        """
+        Get a value from the cache.
+
+        Args:
+            key (str): Key of the entry.
+        Returns:
+            The cached value, or None if there is no valid entry.
+        """
+        try:
+            value = self._get(key)
+        except Exception as e:
+            logging.warning(f"Cache {self.namespace} read failed: {str(e)}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key: str, value) -> None:
+        """
+        Store a value in the cache.
+
+        Args:
+            key (str): Key of the entry.
+            value: JSON serializable value.
+        Returns:
+            None
+        """
+        try:
+            self._set(key, json.dumps(value))
+        except Exception as e:
+            logging.warning(f"Cache {self.namespace} write failed: {str(e)}")
+
+    def items(self) -> Iterator[Tuple[str, object]]:
+        """Iterate over the valid (key, value) entries of the namespace."""
+        try:
+            yield from self._items()
+        except Exception as e:
+            logging.warning(f"Cache {self.namespace} scan failed: {str(e)}")
+
+    def stats(self) -> dict:
+        """Hits and misses of this cache object since it was created."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+    def _get(self, key: str):
+        raise NotImplementedError
+
+    def _set(self, key: str, payload: str) -> None:
+        raise NotImplementedError
+
+    def _items(self):
+        raise NotImplementedError
+
+
+class SQLiteCacheStore(CacheStore):
+    """
+    Cache stored in a local SQLite file. Every thread gets its own connection.
+
+    Args:
+        path (str): Path of the SQLite file.
+        (see CacheStore for the other arguments)
+    """
+
+    # Evict once every so many writes instead of on every write
+    EVICT_EVERY = 100
+
+    def __init__(
+        self, path: str, namespace: str, ttl: int = None, max_entries: int = None
+    ):
+        super().__init__(namespace, ttl, max_entries)
+        self.path = path
+        self._local = threading.local()
+        self._writes = 0
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections cannot be shared across threads or forked processes
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=10)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries ("
+                "namespace TEXT, key TEXT, value TEXT, created REAL, accessed REAL, "
+                "PRIMARY KEY (namespace, key))"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS cache_entries_accessed "
+                "ON cache_entries (namespace, accessed)"
+            )
+            connection.commit()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def _oldest_valid(self) -> float:
+        return time.time() - self.ttl if self.ttl else 0
+
+    def _get(self, key: str):
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT value FROM cache_entries "
+            "WHERE namespace = ? AND key = ? AND created >= ?",
+            (self.namespace, key, self._oldest_valid()),
+        ).fetchone()
+        if row is None:
+            return None
+
+        with connection:
+            connection.execute(
+                "UPDATE cache_entries SET accessed = ? WHERE namespace = ? AND key = ?",
+                (time.time(), self.namespace, key),
+            )
+        return json.loads(row[0])
+
+    def _set(self, key: str, payload: str) -> None:
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO cache_entries VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, payload, now, now),
+            )
+
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 1:
+            self._evict(connection)
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        with connection:
+            connection.execute(
+                "DELETE FROM cache_entries WHERE namespace = ? AND created < ?",
+                (self.namespace, self._oldest_valid()),
+            )
+            if self.max_entries:
+                connection.execute(
+                    "DELETE FROM cache_entries WHERE namespace = ? AND key IN ("
+                    "SELECT key FROM cache_entries WHERE namespace = ? "
+                    "ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                    (self.namespace, self.namespace, self.max_entries),
+                )
+
+    def _items(self):
+        rows = self._connection().execute(
+            "SELECT key, value FROM cache_entries WHERE namespace = ? AND created >= ?",
+            (self.namespace, self._oldest_valid()),
+        )
+        for key, value in rows:
+            yield key, json.loads(value)
+
+
+class RedisCacheStore(CacheStore):
+    """
+    Cache stored in Redis. Entries expire through Redis TTLs, and a sorted set of
+    last access times per namespace is used to evict the least recently used ones.
+
+    Args:
+        connection (Redis): Redis connection.
+        (see CacheStore for the other arguments)
+    """
+
+    def __init__(
+        self, connection, namespace: str, ttl: int = None, max_entries: int = None
+    ):
+        super().__init__(namespace, ttl, max_entries)
+        self.connection = connection
+        self.prefix = f"{REDIS_KEY_PREFIX}{namespace}:"
+        self.index_key = f"{REDIS_KEY_PREFIX}{namespace}"
+
+    def _get(self, key: str):
+        payload = self.connection.get(self.prefix + key)
+        if payload is None:
+            return None
+        self.connection.zadd(self.index_key, {key: time.time()})
+        return json.loads(payload)
+
+    def _set(self, key: str, payload: str) -> None:
+        pipeline = self.connection.pipeline()
+        pipeline.set(self.prefix + key, payload, ex=self.ttl)
+        pipeline.zadd(self.index_key, {key: time.time()})
+        pipeline.zcard(self.index_key)
+        size = pipeline.execute()[-1]
+
+        if self.max_entries and size > self.max_entries:
+            evicted = self.connection.zpopmin(self.index_key, size - self.max_entries)
+            if evicted:
+                self.connection.delete(
+                    *[self.prefix + member.decode() for member, _ in evicted]
+                )
+
+    def _items(self):
+        for member in self.connection.zscan_iter(self.index_key):
+            key = member[0].decode()
+            payload = self.connection.get(self.prefix + key)
+            if payload is None:  # Expired, drop it from the index too
+                self.connection.zrem(self.index_key, key)
+                continue
+            yield key, json.loads(payload)
+
+
+def get_cache_store(
+    namespace: str, ttl: int = None, max_entries: int = None
+) -> CacheStore:
+    """
+    Get a cache for a namespace, using the backend set in config.CACHE_BACKEND.
+
+    Args:
+        namespace (str): Name of the namespace.
+        ttl (int, optional): Seconds an entry stays valid (None: forever).
+        max_entries (int, optional): Max entries kept in the namespace (None: no limit).
+    Returns:
+        CacheStore: The cache.
+    """
+    if config.CACHE_BACKEND == "redis":
+        import redis
+
+        connection = redis.Redis(host="localhost", port=os.getenv("REDIS_PORT"), db=0)
+        return RedisCacheStore(connection, namespace, ttl, max_entries)
+    if config.CACHE_BACKEND == "sqlite":
+        path = os.path.join(PROJECT_ROOT, config.CACHE_SQLITE_PATH)
+        return SQLiteCacheStore(path, namespace, ttl, max_entries)
+    raise ValueError("Invalid cache backend selected, please check config.py")
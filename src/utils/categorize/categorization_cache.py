@@ -0,0 +1,90 @@
+import hashlib
+import re
+
+from utils.cache_store import get_cache_store
+from config.config import (
+    CATEGORIZATION_MODEL,
+    CATEGORIZATION_PROMPT_VERSION,
+    CATEGORIZATION_CACHE,
+    CATEGORIZATION_CACHE_TTL,
+    CATEGORIZATION_CACHE_MAX_ENTRIES,
+)
+
+# Levels of previously categorized questions. Teachers repeat the same questions
+# ("Any questions?", "Does that make sense?") in every lecture.
+cache = (
+    get_cache_store(
+        "categorization", CATEGORIZATION_CACHE_TTL, CATEGORIZATION_CACHE_MAX_ENTRIES
+    )
+    if CATEGORIZATION_CACHE
+    else None
+)
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase the text and drop punctuation and repeated whitespace."""
+    text = re.sub(r"[^\w\s?]", " ", (text or "").lower())
+    return " ".join(text.split())
+
+
+def get_cache_key(question: str, context: str = "") -> str:
+    """
+    Get the cache key of a question. Questions that only differ in case, punctuation
+    or whitespace share a key; a different context, model or prompt version does not.
+
+    Args:
+        question (str): The question.
+        context (str, optional): The sentences before the question.
+    Returns:
+        str: SHA-256 hex digest.
+    """
+    key = "|".join(
+        (
+            CATEGORIZATION_MODEL,
+            CATEGORIZATION_PROMPT_VERSION,
+            normalize_text(context),
+            normalize_text(question),
+        )
+    )
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def get_cached_level(question: str, context: str = ""):
+    """
+    Get the level of a question if it was categorized before.
+
+    Args:
+        question (str): The question.
+        context (str, optional): The sentences before the question.
+    Returns:
+        int: The cached level, or None.
+    """
+    if cache is None:
+        return None
+    entry = cache.get(get_cache_key(question, context))
+    return entry["level"] if entry else None
+
+
+def cache_level(question: str, context: str, level: int) -> None:
+    """
+    Remember the level of a question. The texts are stored with it, so the cache can
+    also serve as training data.
+
+    Args:
+        question (str): The question.
+        context (str): The sentences before the question.
+        level (int): The level returned by the categorization model.
+    Returns:
+        None
+    """
+    if cache is None or level is None:
+        return
+    cache.set(
+        get_cache_key(question, context),
+        {
+            "question": question,
+            "context": context,
+            "level": level,
+            "model": CATEGORIZATION_MODEL,
+        },
+    )
@@ -1,30 +1,103 @@
-import requests
+from typing import List, Optional
 from dotenv import load_dotenv
-import os
-import random as rand
+import re
 import logging
 
+from utils.llm_client import get_llm_client, CircuitOpenError
+
 
 load_dotenv()
 
+# Shared with the summarization, so both see the same circuit breaker
+client = get_llm_client("llama")
+
 
 def categorize_question(question: str) -> int:
     """
-    Categorize the question using LLAMA
+    Categorize the question using LLAMA.
+    Returns None if LLAMA could not be reached (see categorize_transcript.fallback_level).
     """
     # call GEMMA API
 
     try:
-        response = requests.post(
-            f"{os.getenv('LLAMA_API_URL')}/categorize", json={"question": question}
-        )
+        response = client.post("/categorize", {"question": question})
 
     except Exception as e:
         logging.error(f"Error Occured while accessing LLAMA API: {str(e)}")
-        # return random category
-        return rand.randint(0, 3)
+        return None
 
     print(f"Response for question: {question} is {response.json().get('response')}")
 
     # return the category
     return int(response.json().get("response"))
+
+
+def categorize_question_batch(
+    questions: List[str], one_by_one: bool = True
+) -> Optional[List[int]]:
+    """
+    Categorize several questions with one request to LLAMA.
+
+    If the batched request fails or its response cannot be matched to the questions,
+    every question is sent on its own instead.
+
+    Args:
+        questions (List[str]): Question texts, with their context.
+        one_by_one (bool): Send the questions of a failed batch one by one here. If
+            False, None is returned instead, so the caller can send them concurrently.
+    Returns:
+        List[int]: The level of each question, in the same order (None where LLAMA failed),
+            or None if the batch failed and one_by_one is False.
+    """
+    if len(questions) == 1:
+        return [categorize_question(questions[0])]
+
+    try:
+        response = client.post("/categorize_batch", {"questions": questions})
+        response.raise_for_status()
+        levels = parse_batch_levels(response.json().get("response"), len(questions))
+    except CircuitOpenError as e:
+        # Sending the questions one by one would fail just as fast
+        logging.error(f"Error Occured while accessing LLAMA API: {str(e)}")
+        return [None] * len(questions)
+    except Exception as e:
+        logging.error(f"Error Occured while accessing LLAMA API: {str(e)}")
+        levels = None
+
+    if levels is None:
+        logging.warning(
+            f"Malformed batch response, categorizing {len(questions)} questions "
+            "one by one"
+        )
+        if not one_by_one:
+            return None
+        return [categorize_question(question) for question in questions]
+
+    return levels
+
+
+def parse_batch_levels(response, count: int):
+    """
+    Parse the levels out of a batched categorization response.
+
+    Accepts a list of levels (e.g. [1, "2", 0]) or text with one level per line,
+    optionally numbered (e.g. "1. 2" on the first line and "2. 0" on the second).
+
+    Args:
+        response: The "response" field returned by the LLAMA server.
+        count (int): Number of questions that were sent.
+    Returns:
+        List[int]: The levels, or None if the response does not hold exactly one per question.
+    """
+    if isinstance(response, str):
+        lines = [line for line in response.splitlines() if line.strip()]
+        # Take the last number of each line, so "3) level 2" is read as 2
+        response = [(re.findall(r"\d+", line) or [None])[-1] for line in lines]
+
+    if not isinstance(response, list) or len(response) != count:
+        return None
+
+    try:
+        return [int(level) for level in response]
+    except (TypeError, ValueError):
+        return None
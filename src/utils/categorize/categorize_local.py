@@ -0,0 +1,187 @@
+from typing import List, Tuple
+import argparse
+import threading
+import logging
+import os
+
+from utils.cache_store import PROJECT_ROOT
+from config.config import LOCAL_CLASSIFIER_PATH
+
+# Trained classifier, loaded on first use and reloaded when the file changes
+_classifier = None
+_classifier_mtime = None
+_lock = threading.Lock()
+
+
+def get_classifier_path() -> str:
+    return os.path.join(PROJECT_ROOT, LOCAL_CLASSIFIER_PATH)
+
+
+def load_local_classifier():
+    """
+    Load the trained question classifier.
+
+    Returns:
+        Pipeline: The scikit-learn pipeline, or None if no classifier was trained yet.
+    """
+    global _classifier, _classifier_mtime
+    path = get_classifier_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+
+    with _lock:
+        if _classifier is None or mtime != _classifier_mtime:
+            import joblib
+
+            try:
+                _classifier = joblib.load(path)
+                _classifier_mtime = mtime
+                logging.info(f"Loaded local question classifier from {path}")
+            except Exception as e:
+                logging.error(f"Could not load local question classifier: {str(e)}")
+                return None
+        return _classifier
+
+
+def classify_questions(questions: List[str]) -> List[Tuple[int, float]]:
+    """
+    Categorize questions with the local classifier, in one batch.
+
+    Args:
+        questions (List[str]): Question texts, with their context.
+    Returns:
+        List[Tuple[int, float]]: The level of each question and the classifier's
+            confidence in it, or None if no classifier was trained yet.
+    """
+    classifier = load_local_classifier()
+    if classifier is None:
+        return None
+    if not questions:
+        return []
+
+    probabilities = classifier.predict_proba(questions)
+    best = probabilities.argmax(axis=1)
+    return [
+        (int(classifier.classes_[index]), float(row[index]))
+        for index, row in zip(best, probabilities)
+    ]
+
+
+def categorize_question(question: str) -> int:
+    """
+    Categorize the question using the local classifier.
+    Returns None if no classifier was trained yet.
+    """
+    levels = categorize_question_batch([question])
+    return levels[0]
+
+
+def categorize_question_batch(
+    questions: List[str], one_by_one: bool = True
+) -> List[int]:
+    """
+    Categorize several questions using the local classifier.
+
+    Args:
+        questions (List[str]): Question texts, with their context.
+        one_by_one (bool): Unused, the classifier answers every question of a batch
+            (see categorize_llama.categorize_question_batch).
+    Returns:
+        List[int]: The level of each question, in the same order (None if no
+            classifier was trained yet).
+    """
+    predictions = classify_questions(questions)
+    if predictions is None:
+        return [None] * len(questions)
+    return [level for level, _ in predictions]
+
+
+def get_training_examples() -> Tuple[List[str], List[int]]:
+    """
+    Get the questions labelled by an LLM from the categorization cache.
+
+    Returns:
+        Tuple[List[str], List[int]]: The question texts (with context) and their levels.
+    """
+    from utils.categorize.categorization_cache import cache
+
+    texts, levels = [], []
+    if cache is None:
+        return texts, levels
+
+    for _, entry in cache.items():
+        # Levels guessed by this classifier are not training data
+        if entry.get("model") == "local" or entry.get("level") is None:
+            continue
+        parts = (entry.get("context"), entry.get("question"))
+        texts.append(" ".join(part for part in parts if part))
+        levels.append(int(entry["level"]))
+    return texts, levels
+
+
+def build_local_classifier(texts: List[str], levels: List[int]):
+    """
+    Train a classifier with TF-IDF features and a logistic regression head.
+
+    Args:
+        texts (List[str]): Question texts, with their context.
+        levels (List[int]): Level of each question.
+    Returns:
+        Tuple[Pipeline, dict]: The classifier, trained on every example, and the
+            number of examples and accuracy on a held-out fifth of them.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+    from sklearn.pipeline import make_pipeline
+
+    if len(set(levels)) < 2:
+        raise ValueError("At least two different levels are needed to train")
+
+    def make_classifier():
+        return make_pipeline(
+            TfidfVectorizer(ngram_range=(1, 2), sublinear_tf=True, lowercase=True),
+            LogisticRegression(max_iter=1000, class_weight="balanced"),
+        )
+
+    metrics = {"examples": len(texts)}
+    if len(texts) >= 50:
+        train_texts, test_texts, train_levels, test_levels = train_test_split(
+            texts, levels, test_size=0.2, random_state=0
+        )
+        classifier = make_classifier().fit(train_texts, train_levels)
+        metrics["accuracy"] = round(classifier.score(test_texts, test_levels), 3)
+
+    return make_classifier().fit(texts, levels), metrics
+
+
+def train_local_classifier() -> dict:
+    """
+    Train the local classifier on the categorization cache and save it to
+    config.LOCAL_CLASSIFIER_PATH, where running workers pick it up.
+
+    Returns:
+        dict: Number of examples and held-out accuracy.
+    """
+    import joblib
+
+    texts, levels = get_training_examples()
+    classifier, metrics = build_local_classifier(texts, levels)
+
+    path = get_classifier_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = path + ".tmp"
+    joblib.dump(classifier, temp_path)
+    os.replace(temp_path, path)
+    logging.info(f"Trained local question classifier: {metrics}")
+    return metrics
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Train the local question classifier on the categorization cache"
+    )
+    parser.parse_args()
+    print(train_local_classifier())
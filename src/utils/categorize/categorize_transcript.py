@@ -1,14 +1,34 @@
 from typing import List
 from utils.categorize.extract_questions import extract_questions, Question
-import multiprocessing
+from utils.categorize.categorization_cache import get_cached_level, cache_level
+from utils.categorize.categorize_local import classify_questions
+from utils.queueing.update_rq import update_job_meta
+from concurrent.futures import ThreadPoolExecutor
 import logging
 
-from config.config import CATEGORIZATION_MODEL
+from utils.tokenization import count_tokens
+from config.config import (
+    CATEGORIZATION_MODEL,
+    CATEGORIZATION_CONCURRENCY,
+    CATEGORIZATION_BATCHING,
+    CATEGORIZATION_BATCH_TOKEN_BUDGET,
+    LOCAL_CLASSIFIER_MIN_CONFIDENCE,
+)
 
 if CATEGORIZATION_MODEL == "gemma":
     from utils.categorize.categorize_gemma import categorize_question
+
+    categorize_question_batch = None
 elif CATEGORIZATION_MODEL == "llama":
-    from utils.categorize.categorize_llama import categorize_question
+    from utils.categorize.categorize_llama import (
+        categorize_question,
+        categorize_question_batch,
+    )
+elif CATEGORIZATION_MODEL == "local":
+    from utils.categorize.categorize_local import (
+        categorize_question,
+        categorize_question_batch,
+    )
 else:
     raise ValueError("Invalid categorization model selected, please check config.py")
 
@@ -19,21 +39,206 @@ def process_question(question: Question) -> Question:
     print("Question text: ", question_text)
     level = categorize_question(question_text)
     print(level)
+    cache_level(question.question, build_context_text(question), level)
+    if level is None:
+        level = fallback_level(question_text)
     question = question.set_level(level)
     question = question.clear_previous_sentences()
     return question
 
 
-def categorize_list_of_questions(questions: List[Question]) -> List[Question]:
+def categorize_list_of_questions(
+    questions: List[Question], stats: dict = None
+) -> List[Question]:
+    """
+    Categorize the questions concurrently. The work is network-bound, so threads
+    sharing the LLM client's keep-alive connections are used instead of processes.
+
+    Args:
+        questions (List[Question]): Questions to categorize.
+        stats (dict, optional): If given, the cache hits, misses and local classifier
+            answers are added to it ({"hits", "misses", "local"}) instead of being
+            saved in the job meta, for callers that categorize in several calls
+            (see record_categorization_stats).
+
+    Returns:
+        List[Question]: The questions with their level set, in the same order.
+    """
     try:
-        with multiprocessing.Pool() as pool:  # Create a process pool
-            results = pool.map(
-                process_question, questions
-            )  # Map the function to the list of questions
+        # Questions categorized before are answered from the cache
+        uncached = [
+            question for question in questions if not apply_cached_level(question)
+        ]
+        hits = len(questions) - len(uncached)
+        logging.info(f"Categorization cache: {hits} of {len(questions)} questions")
+
+        # Questions the local classifier is confident about skip the LLM
+        misses = len(uncached)
+        if CATEGORIZATION_MODEL != "local" and LOCAL_CLASSIFIER_MIN_CONFIDENCE:
+            uncached = apply_confident_local_levels(uncached)
+
+        counts = {"hits": hits, "misses": misses, "local": misses - len(uncached)}
+        if stats is None:
+            record_categorization_stats(counts)
+        else:
+            for key, count in counts.items():
+                stats[key] = stats.get(key, 0) + count
+
+        if not uncached:
+            return questions
+
+        if CATEGORIZATION_BATCHING and categorize_question_batch is not None:
+            categorize_questions_in_batches(uncached)
+            return questions
+
+        with ThreadPoolExecutor(max_workers=CATEGORIZATION_CONCURRENCY) as executor:
+            results = list(executor.map(process_question, uncached))
             print(results)
-        return results
+        return questions
     except Exception as e:
-        raise "Could not categorize questions. Error: " + str(e)
+        raise Exception("Could not categorize questions. Error: " + str(e))
+
+
+def record_categorization_stats(stats: dict) -> None:
+    """
+    Save the cache and local classifier statistics of a job in its meta.
+
+    Args:
+        stats (dict): {"hits", "misses", "local"}, see categorize_list_of_questions.
+    """
+    hits, misses = stats.get("hits", 0), stats.get("misses", 0)
+    update_job_meta(
+        categorization_cache={
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+        },
+        categorization_local=stats.get("local", 0),
+    )
+
+
+def categorize_questions_in_batches(questions: List[Question]) -> List[Question]:
+    """
+    Categorize the questions with as few requests as the token budget allows.
+    Batches are sent concurrently.
+
+    Args:
+        questions (List[Question]): Questions to categorize.
+
+    Returns:
+        List[Question]: The questions with their level set, in the same order.
+    """
+    texts = [build_question_text(question) for question in questions]
+    batches = make_batches(texts, CATEGORIZATION_BATCH_TOKEN_BUDGET)
+    logging.info(f"Categorizing {len(texts)} questions in {len(batches)} requests")
+
+    with ThreadPoolExecutor(max_workers=CATEGORIZATION_CONCURRENCY) as executor:
+        batch_levels = list(
+            executor.map(
+                lambda batch: categorize_question_batch(batch, one_by_one=False),
+                batches,
+            )
+        )
+
+        # Questions of failed batches are sent one by one, on the same pool
+        retried = []
+        start = 0
+        for batch, levels in zip(batches, batch_levels):
+            batch_questions = questions[start : start + len(batch)]
+            start += len(batch)
+            if levels is None:
+                retried.extend(batch_questions)
+                continue
+            for question, level in zip(batch_questions, levels):
+                cache_level(question.question, build_context_text(question), level)
+                if level is None:
+                    level = fallback_level(build_question_text(question))
+                question.set_level(level)
+                question.clear_previous_sentences()
+
+        list(executor.map(process_question, retried))
+    return questions
+
+
+def apply_cached_level(question: Question) -> bool:
+    """
+    Set the level of a question from the categorization cache.
+
+    Args:
+        question (Question): The question.
+
+    Returns:
+        bool: Whether the question was found in the cache.
+    """
+    level = get_cached_level(question.question, build_context_text(question))
+    if level is None:
+        return False
+    question.set_level(level)
+    question.clear_previous_sentences()
+    return True
+
+
+def apply_confident_local_levels(questions: List[Question]) -> List[Question]:
+    """
+    Set the level of the questions the local classifier is confident about.
+
+    Args:
+        questions (List[Question]): Questions to categorize.
+
+    Returns:
+        List[Question]: The questions that still need the categorization model.
+    """
+    predictions = classify_questions([build_question_text(q) for q in questions])
+    if predictions is None:  # No classifier trained yet
+        return questions
+
+    uncertain = []
+    for question, (level, confidence) in zip(questions, predictions):
+        if confidence < LOCAL_CLASSIFIER_MIN_CONFIDENCE:
+            uncertain.append(question)
+            continue
+        question.set_level(level)
+        question.clear_previous_sentences()
+    return uncertain
+
+
+def fallback_level(question_text: str):
+    """
+    Level given to a question that the categorization model failed on: the guess of
+    the local classifier, or None (uncategorized) if no classifier was trained yet.
+    """
+    predictions = classify_questions([question_text])
+    if not predictions:
+        logging.warning("No local classifier to fall back on, question not categorized")
+        return None
+    return predictions[0][0]
+
+
+def make_batches(texts: List[str], token_budget: int) -> List[List[str]]:
+    """
+    Group consecutive texts into batches of at most token_budget tokens.
+    A text longer than the budget gets a batch of its own.
+
+    Args:
+        texts (List[str]): Texts to group.
+        token_budget (int): Max tokens in one batch.
+
+    Returns:
+        List[List[str]]: The batches, in order.
+    """
+    batches = []
+    batch, batch_tokens = [], 0
+    for text in texts:
+        tokens = count_tokens(text)
+        if batch and batch_tokens + tokens > token_budget:
+            batches.append(batch)
+            batch, batch_tokens = [], 0
+        batch.append(text)
+        batch_tokens += tokens
+
+    if batch:
+        batches.append(batch)
+    return batches
 
 
 def categorize_transcript(transcript: dict) -> List[int]:
@@ -43,10 +248,7 @@ def categorize_transcript(transcript: dict) -> List[int]:
 
     # Extract all questions from the transcript
     questions = extract_questions(transcript)
-    with multiprocessing.Pool() as pool:  # Create a process pool
-        results = pool.map(
-            process_question, questions
-        )  # Map the function to the list of questions
+    results = categorize_list_of_questions(questions)
 
     logging.info(f"Response for questions: {results}")
     # for question in questions:
@@ -59,7 +261,7 @@ def categorize_transcript(transcript: dict) -> List[int]:
     #     # convert the question to a dictionary
     #     question = question.to_dict()
 
-    return questions
+    return results
 
 
 def build_question_text(question: Question) -> str:
@@ -74,3 +276,16 @@ def build_question_text(question: Question) -> str:
         if part
     ]
     return " ".join(parts)
+
+
+def build_context_text(question: Question) -> str:
+    """Builds the text of the sentences before a question, omitting empty or None values."""
+    parts = [
+        part
+        for part in (
+            question.get("two_previous_sentence"),
+            question.get("previous_sentence"),
+        )
+        if part
+    ]
+    return " ".join(parts)
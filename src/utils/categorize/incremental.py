@@ -0,0 +1,230 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+import threading
+import logging
+import time
+import re
+
+from utils.categorize.extract_questions import Question
+from utils.categorize.categorize_transcript import (
+    build_context_text,
+    categorize_list_of_questions,
+    record_categorization_stats,
+)
+from utils.categorize.categorization_cache import get_cache_key
+from utils.queueing.update_rq import get_job, job_context, update_job_meta
+from config.config import (
+    CATEGORIZATION_CONCURRENCY,
+    EARLY_CATEGORIZATION_BATCH_SIZE,
+    EARLY_CATEGORIZATION_MAX_WAIT,
+)
+
+
+class IncrementalQuestionExtractor:
+    """
+    extract_questions for sentences that arrive one at a time.
+
+    Keeps the same two-sentence context window: a sentence containing "?" is a
+    question, with the two sentences before it as its context.
+    """
+
+    def __init__(self):
+        self.previous_text = ""
+        self.two_previous_text = ""
+
+    def add_sentence(self, sentence: dict):
+        """
+        Add the next sentence of the transcript.
+
+        Args:
+            sentence (dict): {"text", "speaker", "start_time", "end_time"}.
+        Returns:
+            Question: The question, if the sentence is one, else None.
+        """
+        question = None
+        if "?" in sentence["text"]:
+            question = Question(
+                question=sentence["text"],
+                speaker=sentence.get("speaker"),
+                start_time=sentence.get("start_time"),
+                end_time=sentence.get("end_time"),
+                previous_sentence=self.previous_text or None,
+                two_previous_sentence=self.two_previous_text or None,
+            )
+
+        self.two_previous_text = self.previous_text
+        self.previous_text = sentence["text"]
+        return question
+
+
+class EarlyCategorizer:
+    """
+    Categorizes questions while the audio is still being processed.
+
+    Whisper segments are fed in as soon as the transcription produces them. They are
+    split into sentences, and questions are extracted with their context. Questions
+    are sent for categorization in batches of batch_size, or after max_wait seconds,
+    so the LLM works during the GPU phase and the batches go through the same cache,
+    local classifier and request batching as the final ones.
+
+    The final sentences (after alignment, diarization and punctuation restoration)
+    can differ slightly, so once they are known, the final questions are matched to
+    the early ones by their normalized text and context, like in the categorization
+    cache. Matches reuse the early level; the rest are categorized then.
+
+    Use it as a context manager, so its threads are stopped even if the analysis
+    fails:
+
+        with EarlyCategorizer() as early_categorizer:
+            transcription = transcribe_and_diarize(job, early_categorizer.add_segment)
+            questions = early_categorizer.categorize(extract_questions(transcription))
+
+    Args:
+        batch_size (int, optional): Questions per batch (default:
+            config.EARLY_CATEGORIZATION_BATCH_SIZE).
+        max_wait (float, optional): Max seconds a question waits for its batch to
+            fill (default: config.EARLY_CATEGORIZATION_MAX_WAIT).
+    """
+
+    def __init__(
+        self,
+        batch_size: int = EARLY_CATEGORIZATION_BATCH_SIZE,
+        max_wait: float = EARLY_CATEGORIZATION_MAX_WAIT,
+    ):
+        self.extractor = IncrementalQuestionExtractor()
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max_wait
+        # Each batch is categorized concurrently by categorize_list_of_questions, so
+        # a few batches at a time keep the LLM busy
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, CATEGORIZATION_CONCURRENCY // self.batch_size),
+            thread_name_prefix="early-categorizer",
+        )
+        # The pool threads update the meta of the job that created the categorizer
+        self.rq_job = get_job()
+        self.futures = {}  # Key of a question (get_key) -> future of its batch's levels
+        self.stats = {}  # Cache and local classifier counts of every batch
+        self._pending = {}  # Key -> question, of the next batch
+        self._pending_since = None
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """Stop the threads; batches not started yet are canceled."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def add_segment(self, segment: dict) -> None:
+        """
+        Add a transcribed Whisper segment ({"start", "end", "text"}, in seconds).
+        Safe to call from the transcription; errors are logged, never raised.
+        """
+        try:
+            for text in re.split(r"(?<=[.?!])\s+", segment.get("text", "").strip()):
+                if not text:
+                    continue
+                question = self.extractor.add_sentence(
+                    {
+                        "text": text,
+                        "start_time": int(segment.get("start", 0) * 1000),
+                        "end_time": int(segment.get("end", 0) * 1000),
+                    }
+                )
+                if question is not None:
+                    self._add(question)
+            self._flush(force=False)
+        except Exception as e:
+            logging.warning(f"Could not categorize segment early: {str(e)}")
+
+    @staticmethod
+    def get_key(question: Question) -> str:
+        """Key of a question: repeated questions only match with the same context."""
+        return get_cache_key(question.question, build_context_text(question))
+
+    def _add(self, question: Question) -> None:
+        key = self.get_key(question)
+        with self._lock:
+            if key in self.futures or key in self._pending:
+                return
+            if not self._pending:
+                self._pending_since = time.monotonic()
+            self._pending[key] = question
+
+    def _flush(self, force: bool) -> None:
+        # Checked as segments arrive, so no timer thread is needed
+        with self._lock:
+            if not self._pending:
+                return
+            waited = time.monotonic() - self._pending_since
+            if not force and len(self._pending) < self.batch_size:
+                if waited < self.max_wait:
+                    return
+            pending = list(self._pending.items())
+            self._pending = {}
+            for start in range(0, len(pending), self.batch_size):
+                batch = dict(pending[start : start + self.batch_size])
+                future = self.executor.submit(self._categorize, batch)
+                for key in batch:
+                    self.futures[key] = future
+
+    def _categorize(self, batch: dict) -> dict:
+        stats = {}
+        with job_context(self.rq_job):
+            # Clears the context of the questions, so the keys are computed before
+            categorize_list_of_questions(list(batch.values()), stats=stats)
+        with self._lock:
+            for name, count in stats.items():
+                self.stats[name] = self.stats.get(name, 0) + count
+        return {key: question.level for key, question in batch.items()}
+
+    def categorize(self, questions: List[Question]) -> List[Question]:
+        """
+        Categorize the final questions, reusing the levels of the early ones.
+
+        Args:
+            questions (List[Question]): Questions extracted from the final transcript.
+        Returns:
+            List[Question]: The questions with their level set, in the same order.
+        """
+        # Questions still waiting for their batch are categorized with the late ones
+        with self._lock:
+            self._pending = {}
+
+        late = []
+        for question in questions:
+            key = self.get_key(question)
+            future = self.futures.get(key)
+            level = None
+            if future is not None:
+                try:
+                    level = future.result().get(key)
+                except Exception as e:
+                    logging.warning(f"Early categorization failed: {str(e)}")
+            if level is None:
+                late.append(question)
+            else:
+                question.set_level(level)
+                question.clear_previous_sentences()
+
+        stats = {}
+        if late:
+            categorize_list_of_questions(late, stats=stats)
+        with self._lock:
+            for key, count in self.stats.items():
+                stats[key] = stats.get(key, 0) + count
+        record_categorization_stats(stats)
+
+        reused = len(questions) - len(late)
+        logging.info(f"Reused {reused} early levels, categorized {len(late)} questions")
+        update_job_meta(
+            incremental_categorization={
+                "early": len(self.futures),
+                "reused": reused,
+                "late": len(late),
+            }
+        )
+        return questions
@@ -0,0 +1,118 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List
+import threading
+import logging
+import time
+import os
+
+from config.config import (
+    CATEGORIZATION_CONCURRENCY,
+    COALESCE_MAX_BATCH_SIZE,
+    COALESCE_MAX_WAIT_MS,
+)
+
+
+class QuestionCoalescer:
+    """
+    Collects single-question categorization calls made at the same time by different
+    request threads, and sends them to the LLM server as one batched call.
+
+    The first call to arrive opens a batch. The batch is sent once it holds
+    max_batch_size questions, or max_wait seconds after it was opened, whichever comes
+    first. Every caller blocks until its own level is known. Batches are sent on a
+    thread pool, so a new batch can be collected while the previous one is answered.
+
+    The dispatcher thread is started lazily, which keeps it working after gunicorn forks.
+
+    Args:
+        categorize_batch (Callable): Categorizes a list of question texts, returning
+            one level per question in the same order.
+        max_batch_size (int, optional): Max questions in one batch (default: config.COALESCE_MAX_BATCH_SIZE).
+        max_wait (float, optional): Max seconds a batch is held open (default: config.COALESCE_MAX_WAIT_MS / 1000).
+    """
+
+    def __init__(
+        self,
+        categorize_batch: Callable[[List[str]], List[int]],
+        max_batch_size: int = COALESCE_MAX_BATCH_SIZE,
+        max_wait: float = COALESCE_MAX_WAIT_MS / 1000,
+    ):
+        self.categorize_batch = categorize_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._pending = []  # (question, future, arrival time)
+        self._condition = threading.Condition()
+        self._thread = None
+        self._executor = None
+        self._pid = None
+
+    def categorize(self, question: str) -> int:
+        """
+        Categorize a question as part of the next batch.
+
+        Args:
+            question (str): The question text.
+        Returns:
+            int: The level of the question.
+        """
+        future = Future()
+        with self._condition:
+            self._ensure_dispatcher()
+            self._pending.append((question, future, time.monotonic()))
+            if len(self._pending) in (1, self.max_batch_size):
+                self._condition.notify()
+        return future.result()
+
+    def _ensure_dispatcher(self) -> None:
+        # Called with the condition held
+        if (
+            self._thread is not None
+            and self._thread.is_alive()
+            and self._pid == os.getpid()
+        ):
+            return
+        self._pid = os.getpid()
+        self._executor = ThreadPoolExecutor(
+            max_workers=CATEGORIZATION_CONCURRENCY,
+            thread_name_prefix="question-coalescer",
+        )
+        self._thread = threading.Thread(
+            target=self._collect, name="question-coalescer", daemon=True
+        )
+        self._thread.start()
+
+    def _collect(self) -> None:
+        while True:
+            with self._condition:
+                while not self._pending:
+                    self._condition.wait()
+
+                deadline = self._pending[0][2] + self.max_wait
+                while len(self._pending) < self.max_batch_size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+
+                batch = self._pending[: self.max_batch_size]
+                del self._pending[: self.max_batch_size]
+
+            self._executor.submit(self._send, batch)
+
+    def _send(self, batch: list) -> None:
+        questions = [question for question, _, _ in batch]
+        try:
+            levels = self.categorize_batch(questions)
+            if len(levels) != len(batch):
+                raise ValueError(
+                    f"Got {len(levels)} levels for a batch of {len(batch)} questions"
+                )
+        except Exception as e:
+            logging.error(f"Could not categorize batch of questions: {str(e)}")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return
+
+        logging.info(f"Categorized a batch of {len(batch)} coalesced questions")
+        for (_, future, _), level in zip(batch, levels):
+            future.set_result(level)
@@ -0,0 +1,338 @@
+"""
+Export the results of finished jobs to Parquet, for analysis outside of the engine.
+
+Three tables are written under the export folder, partitioned by export date:
+
+    sentences/export_date=2024-06-10/part-<export_id>-00000.parquet
+    questions/...
+    summaries/...   (one row per job, with its title and summary)
+
+Jobs are read from Redis and written in batches, so memory use does not depend on
+the number of jobs. The manifest (manifest.json) lists every exported job, and the
+jobs that can never be exported (missing, failed, or without a transcript). Later
+exports skip both, so running an export again only fetches the new jobs.
+
+Run from the src folder:
+    python -m utils.export.parquet_export [--job-ids ID ...] [--folder PATH]
+"""
+
+from datetime import datetime, timezone
+from typing import Iterable, List
+import argparse
+import logging
+import fcntl
+import json
+import uuid
+import os
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from config import config
+from utils.cache_store import PROJECT_ROOT
+from utils.queueing.transcript_index import get_result_transcript
+from utils.queueing.update_rq import update_job_meta
+
+MANIFEST_FILE = "manifest.json"
+
+# Reasons a job is not exported. Unfinished jobs are fetched again by later exports,
+# the others never
+SKIP_MISSING = "missing"
+SKIP_JOB_TYPE = "job_type"
+SKIP_FAILED = "failed"
+SKIP_UNFINISHED = "unfinished"
+
+SCHEMAS = {
+    "sentences": pa.schema(
+        [
+            ("job_id", pa.string()),
+            ("position", pa.int32()),
+            ("speaker", pa.string()),
+            ("start_time", pa.int64()),
+            ("end_time", pa.int64()),
+            ("text", pa.string()),
+        ]
+    ),
+    "questions": pa.schema(
+        [
+            ("job_id", pa.string()),
+            ("position", pa.int32()),
+            ("speaker", pa.string()),
+            ("start_time", pa.int64()),
+            ("end_time", pa.int64()),
+            ("level", pa.int32()),
+            ("question", pa.string()),
+            ("previous_sentence", pa.string()),
+            ("two_previous_sentence", pa.string()),
+        ]
+    ),
+    "summaries": pa.schema(
+        [
+            ("job_id", pa.string()),
+            ("job_type", pa.string()),
+            ("title", pa.string()),
+            ("summary", pa.string()),
+        ]
+    ),
+}
+
+
+def _milliseconds(value):
+    return int(value) if value is not None else None
+
+
+def _level(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def job_rows(job_id: str, job_type: str, meta: dict, result) -> dict:
+    """
+    Flatten the result of a job into rows of each table.
+
+    Args:
+        job_id (str): ID of the job.
+        job_type (str): "transcription" or "analyze".
+        meta (dict): RQ meta of the job (for its title).
+        result: Result of the job.
+    Returns:
+        dict: {table name: list of rows}
+    """
+    rows = {"sentences": [], "questions": [], "summaries": []}
+
+    for position, sentence in enumerate(get_result_transcript(job_type, result) or []):
+        rows["sentences"].append(
+            {
+                "job_id": job_id,
+                "position": position,
+                "speaker": sentence.get("speaker"),
+                "start_time": _milliseconds(sentence.get("start_time")),
+                "end_time": _milliseconds(sentence.get("end_time")),
+                "text": sentence.get("text"),
+            }
+        )
+
+    summary = None
+    if job_type == "analyze" and isinstance(result, dict):
+        for position, question in enumerate(result.get("questions") or []):
+            rows["questions"].append(
+                {
+                    "job_id": job_id,
+                    "position": position,
+                    "speaker": question.get("speaker"),
+                    "start_time": _milliseconds(question.get("start_time")),
+                    "end_time": _milliseconds(question.get("end_time")),
+                    "level": _level(question.get("level")),
+                    "question": question.get("question"),
+                    "previous_sentence": question.get("previous_sentence"),
+                    "two_previous_sentence": question.get("two_previous_sentence"),
+                }
+            )
+        summary = result.get("summary")
+        if summary is not None and not isinstance(summary, str):
+            summary = json.dumps(summary)
+
+    rows["summaries"].append(
+        {
+            "job_id": job_id,
+            "job_type": job_type,
+            "title": meta.get("title"),
+            "summary": summary,
+        }
+    )
+    return rows
+
+
+class ParquetExport:
+    """
+    An export folder and its manifest of exported jobs.
+
+    Args:
+        folder (str): The export folder.
+    """
+
+    def __init__(self, folder: str):
+        self.folder = folder
+        self.manifest_path = os.path.join(folder, MANIFEST_FILE)
+        os.makedirs(folder, exist_ok=True)
+
+    def load_manifest(self) -> dict:
+        """
+        Get the manifest: {"jobs": {job_id: export_id}, "skipped": {job_id: reason},
+        "exports": [...]}
+        """
+        if not os.path.exists(self.manifest_path):
+            return {"jobs": {}, "skipped": {}, "exports": []}
+        with open(self.manifest_path) as f:
+            manifest = json.load(f)
+        manifest.setdefault("skipped", {})  # Manifests of older exports
+        return manifest
+
+    def save_manifest(self, manifest: dict) -> None:
+        # Replace it at once, so an interrupted export never leaves half a manifest
+        temporary_path = self.manifest_path + ".tmp"
+        with open(temporary_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(temporary_path, self.manifest_path)
+
+    def write_batch(
+        self, rows: dict, export_id: str, export_date: str, batch: int
+    ) -> List[str]:
+        """
+        Write one batch of rows, as one file per table.
+
+        Returns:
+            List[str]: Paths of the files written, relative to the export folder.
+        """
+        paths = []
+        for table, schema in SCHEMAS.items():
+            if not rows[table]:
+                continue
+            path = os.path.join(
+                table,
+                f"export_date={export_date}",
+                f"part-{export_id}-{batch:05d}.parquet",
+            )
+            full_path = os.path.join(self.folder, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+            # Written aside and renamed, so readers never see a partial file
+            pq.write_table(
+                pa.Table.from_pylist(rows[table], schema=schema),
+                full_path + ".tmp",
+                compression=config.EXPORT_COMPRESSION,
+            )
+            os.replace(full_path + ".tmp", full_path)
+            paths.append(path)
+        return paths
+
+
+def get_skip_reason(rqjob) -> str:
+    """Why a job cannot be exported (see SKIP_MISSING etc.), or None if it can."""
+    if rqjob is None:
+        return SKIP_MISSING
+    if rqjob.meta.get("job_type") not in ("transcription", "analyze"):
+        return SKIP_JOB_TYPE
+    if rqjob.is_finished:
+        return None
+    if rqjob.is_failed or rqjob.is_stopped or rqjob.is_canceled:
+        return SKIP_FAILED
+    return SKIP_UNFINISHED
+
+
+def get_finished_job_ids(connection) -> List[str]:
+    """IDs of every finished job still in Redis."""
+    from rq import Queue
+
+    return Queue("jobs", connection=connection).finished_job_registry.get_job_ids()
+
+
+def export_jobs(
+    connection,
+    job_ids: Iterable[str] = None,
+    folder: str = None,
+    batch_size: int = None,
+) -> dict:
+    """
+    Export the results of finished transcription and analysis jobs to Parquet.
+
+    Jobs already in the manifest (exported, or skipped for good) are not fetched
+    again. The manifest is saved after every batch, so an interrupted export loses
+    at most one batch, and running it again carries on where it stopped.
+
+    Args:
+        connection (Redis): Redis connection.
+        job_ids (Iterable[str], optional): Jobs to export (default: every finished job).
+        folder (str, optional): The export folder (default: config.EXPORT_FOLDER).
+        batch_size (int, optional): Jobs per batch (default: config.EXPORT_BATCH_SIZE).
+    Returns:
+        dict: {"export_id", "exported", "already_exported", "skipped", "files"}.
+            Skipped jobs are missing, failed, unfinished, or have no transcript
+            (including the ones skipped by earlier exports).
+    """
+    from rq.job import Job as RQJob
+
+    export = ParquetExport(folder or os.path.join(PROJECT_ROOT, config.EXPORT_FOLDER))
+    batch_size = batch_size or config.EXPORT_BATCH_SIZE
+    export_id = uuid.uuid4().hex[:12]
+    export_date = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    # One export at a time per folder, since they share the manifest
+    with open(os.path.join(export.folder, ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+
+        manifest = export.load_manifest()
+        if job_ids is None:
+            job_ids = get_finished_job_ids(connection)
+        job_ids = list(dict.fromkeys(job_ids))
+        skipped_before = {
+            job_id
+            for job_id in job_ids
+            if manifest["skipped"].get(job_id, SKIP_UNFINISHED) != SKIP_UNFINISHED
+        }
+        pending = [
+            job_id
+            for job_id in job_ids
+            if job_id not in manifest["jobs"] and job_id not in skipped_before
+        ]
+        skipped = len(skipped_before)
+        exported = 0
+        files = []
+        manifest["exports"].append(
+            {"export_id": export_id, "date": export_date, "jobs": 0, "files": files}
+        )
+
+        for batch, start in enumerate(range(0, len(pending), batch_size)):
+            batch_ids = pending[start : start + batch_size]
+            rows = {table: [] for table in SCHEMAS}
+            rqjobs = RQJob.fetch_many(batch_ids, connection=connection)
+            for job_id, rqjob in zip(batch_ids, rqjobs):
+                reason = get_skip_reason(rqjob)
+                if reason is not None:
+                    manifest["skipped"][job_id] = reason
+                    skipped += 1
+                    continue
+                for table, table_rows in job_rows(
+                    job_id, rqjob.meta["job_type"], rqjob.meta, rqjob.result
+                ).items():
+                    rows[table].extend(table_rows)
+                manifest["skipped"].pop(job_id, None)
+                manifest["jobs"][job_id] = export_id
+                exported += 1
+
+            files += export.write_batch(rows, export_id, export_date, batch)
+            manifest["exports"][-1]["jobs"] = exported
+            export.save_manifest(manifest)
+            logging.info(f"Exported {exported} of {len(pending)} jobs")
+            update_job_meta(
+                export_progress={"exported": exported, "total": len(pending)}
+            )
+
+    return {
+        "export_id": export_id,
+        "exported": exported,
+        "already_exported": len(job_ids) - len(pending) - len(skipped_before),
+        "skipped": skipped,
+        "files": files,
+    }
+
+
+if __name__ == "__main__":
+    import redis
+
+    parser = argparse.ArgumentParser(description="Export finished jobs to Parquet")
+    parser.add_argument("--job-ids", nargs="*", help="Jobs to export (default: all)")
+    parser.add_argument("--folder", help="Export folder (default: EXPORT_FOLDER)")
+    parser.add_argument("--batch-size", type=int, help="Jobs per batch")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    connection = redis.Redis(host="localhost", port=os.getenv("REDIS_PORT"), db=0)
+    summary = export_jobs(connection, args.job_ids, args.folder, args.batch_size)
+    print(
+        f"Export {summary['export_id']}: {summary['exported']} jobs exported, "
+        f"{summary['already_exported']} already exported, {summary['skipped']} "
+        f"skipped, {len(summary['files'])} files written"
+    )
@@ -0,0 +1,414 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+import threading
+import requests
+import logging
+import random
+import socket
+import json
+import time
+import os
+
+from config import config
+
+# Redis hash the clients of every process publish their stats to
+STATS_KEY = "classifai:llm:stats"
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class LLMError(Exception):
+    """The LLM backend could not answer the request."""
+
+
+class CircuitOpenError(LLMError):
+    """The circuit breaker is open, so the request was not sent."""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a backend that keeps failing.
+
+    After failure_threshold consecutive failures the breaker opens and requests fail
+    immediately. After reset_timeout seconds it lets one trial request through
+    (half-open): if it succeeds the breaker closes, otherwise it opens again.
+
+    Args:
+        failure_threshold (int): Consecutive failures that open the breaker.
+        reset_timeout (float): Seconds the breaker stays open.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = None
+        self.times_opened = 0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """Whether a request may be sent now."""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = "half_open"
+            # Half-open: only one trial request at a time
+            if self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_running = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                if self.state != "open":
+                    self.times_opened += 1
+                    logging.error(
+                        f"LLM circuit breaker opened after {self.failures} failures"
+                    )
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.times_opened,
+            }
+
+
+class LatencyHistogram:
+    """Counts request latencies in fixed buckets (cumulative, like Prometheus)."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        index = next(
+            (i for i, bound in enumerate(LATENCY_BUCKETS) if seconds <= bound),
+            len(LATENCY_BUCKETS),
+        )
+        with self._lock:
+            self.counts[index] += 1
+            self.total += seconds
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = list(self.counts)
+            total = self.total
+        buckets, cumulative = {}, 0
+        for bound, count in zip(list(LATENCY_BUCKETS) + ["+Inf"], counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {"buckets": buckets, "count": cumulative, "sum": round(total, 3)}
+
+    def quantile(self, q: float, min_count: int = 1):
+        """
+        Estimate a latency percentile, interpolating inside its bucket.
+
+        Args:
+            q (float): The percentile, between 0 and 1 (e.g. 0.95).
+            min_count (int): Observations needed for an estimate.
+        Returns:
+            float: The latency in seconds, or None with fewer than min_count
+                observations.
+        """
+        with self._lock:
+            counts = list(self.counts)
+        total = sum(counts)
+        if total == 0 or total < min_count:
+            return None
+
+        rank = q * total
+        cumulative, lower = 0, 0.0
+        for bound, count in zip(LATENCY_BUCKETS, counts):
+            if count and cumulative + count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        return float(LATENCY_BUCKETS[-1])  # In the +Inf bucket
+
+
+class LLMClient:
+    """
+    Resilient HTTP client for an LLM backend, shared by every caller in the process.
+
+    - keep-alive connection pool, with connect and read timeouts on every request
+    - bounded retries with jittered exponential backoff, on connection errors,
+      timeouts and 429/5xx responses
+    - a circuit breaker that fails fast while the backend is unhealthy
+    - optional hedging: if the primary backend has not answered after the
+      LLM_HEDGE_PERCENTILE latency of the route, the same request is sent to the
+      hedge backend and the first answer wins
+    - latency histograms and counters, published to Redis for monitoring
+
+    Args:
+        name (str): Name of the backend (e.g. "llama").
+        url_env (str): Environment variable with the backend's base URL.
+        hedge_url_env (str, optional): Environment variable with a second backend's base URL.
+    """
+
+    def __init__(self, name: str, url_env: str, hedge_url_env: str = None):
+        self.name = name
+        self.url_env = url_env
+        self.hedge_url_env = hedge_url_env
+        self.breaker = CircuitBreaker(
+            config.LLM_BREAKER_FAILURES, config.LLM_BREAKER_RESET_TIMEOUT
+        )
+        self.latency = {"primary": LatencyHistogram(), "hedge": LatencyHistogram()}
+        self.route_latency = {}  # path: LatencyHistogram of the primary backend
+        self.counters = {
+            "requests": 0,
+            "failures": 0,
+            "retries": 0,
+            "rejected": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+        }
+        self._counter_lock = threading.Lock()
+        self._published_at = 0
+        self._redis = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=config.LLM_POOL_SIZE)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._hedge_executor = ThreadPoolExecutor(
+            max_workers=config.LLM_POOL_SIZE, thread_name_prefix=f"{name}-hedge"
+        )
+
+    def post(
+        self,
+        path: str,
+        payload: dict,
+        read_timeout: float = None,
+        stream: bool = False,
+        hedge: bool = True,
+        hedge_delay: float = None,
+    ):
+        """
+        Send a JSON request to the backend.
+
+        Args:
+            path (str): Path of the route (e.g. "/categorize").
+            payload (dict): JSON body.
+            read_timeout (float, optional): Seconds to wait for the answer (default: config.LLM_READ_TIMEOUT).
+                When streaming, max seconds between two pieces of the answer.
+            stream (bool, optional): Return as soon as the headers are received, so the
+                body can be read while it is generated. Streamed requests are not hedged.
+            hedge (bool, optional): Hedge the request, if LLAMA_HEDGE_API_URL is set.
+                Turn it off for long generations, which it would send twice.
+            hedge_delay (float, optional): Seconds before the request is hedged
+                (default: the LLM_HEDGE_PERCENTILE latency of the route; routes with
+                fewer than LLM_HEDGE_MIN_SAMPLES requests are not hedged).
+        Returns:
+            requests.Response: A successful response.
+        Raises:
+            CircuitOpenError: If the backend is considered unhealthy.
+            LLMError: If every attempt failed.
+        """
+        self._count("requests")
+        timeout = (config.LLM_CONNECT_TIMEOUT, read_timeout or config.LLM_READ_TIMEOUT)
+
+        try:
+            for attempt in range(config.LLM_MAX_RETRIES + 1):
+                if not self.breaker.allow_request():
+                    self._count("rejected")
+                    raise CircuitOpenError(f"{self.name} backend is unavailable")
+
+                try:
+                    response = self._send(
+                        path, payload, timeout, stream, hedge, hedge_delay
+                    )
+                    self.breaker.record_success()
+                    return response
+                except LLMError as e:
+                    self.breaker.record_failure()
+                    if attempt == config.LLM_MAX_RETRIES:
+                        raise
+                    # Full jitter, so retrying callers do not hit the backend in step
+                    delay = random.uniform(0, config.LLM_RETRY_BACKOFF * 2**attempt)
+                    logging.warning(
+                        f"{self.name} request to {path} failed ({e}), retrying"
+                    )
+                    self._count("retries")
+                    time.sleep(delay)
+        except LLMError:
+            self._count("failures")
+            raise
+        finally:
+            self._publish_stats()
+
+    def get_hedge_delay(self, path: str):
+        """Seconds after which requests to path are hedged (None: not hedged yet)."""
+        histogram = self.route_latency.get(path)
+        if histogram is None:
+            return None
+        return histogram.quantile(
+            config.LLM_HEDGE_PERCENTILE, min_count=config.LLM_HEDGE_MIN_SAMPLES
+        )
+
+    def _send(
+        self,
+        path: str,
+        payload: dict,
+        timeout: tuple,
+        stream: bool = False,
+        hedge: bool = True,
+        hedge_delay: float = None,
+    ):
+        hedge_url = os.getenv(self.hedge_url_env) if self.hedge_url_env else None
+        if hedge and hedge_url and not stream and hedge_delay is None:
+            hedge_delay = self.get_hedge_delay(path)
+        if not hedge or not hedge_url or stream or hedge_delay is None:
+            return self._request(
+                "primary", os.getenv(self.url_env), path, payload, timeout, stream
+            )
+
+        primary = self._hedge_executor.submit(
+            self._request, "primary", os.getenv(self.url_env), path, payload, timeout
+        )
+        done, _ = wait([primary], timeout=hedge_delay)
+        if done:
+            return primary.result()
+
+        self._count("hedged")
+        hedge = self._hedge_executor.submit(
+            self._request, "hedge", hedge_url, path, payload, timeout
+        )
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    response = future.result()
+                except LLMError as e:
+                    error = e
+                    continue
+                if future is hedge:
+                    self._count("hedge_wins")
+                return response
+        raise error
+
+    def _request(
+        self, label: str, base_url: str, path: str, payload: dict, timeout, stream=False
+    ):
+        start = time.monotonic()
+        try:
+            response = self.session.post(
+                f"{base_url}{path}", json=payload, timeout=timeout, stream=stream
+            )
+        except requests.RequestException as e:
+            raise LLMError(f"{label} request failed: {str(e)}") from e
+        finally:
+            duration = time.monotonic() - start
+            self.latency[label].observe(duration)
+            if label == "primary":
+                self._route_histogram(path).observe(duration)
+
+        if response.status_code == 429 or response.status_code >= 500:
+            response.close()
+            raise LLMError(f"{label} backend answered {response.status_code}")
+        return response
+
+    def _route_histogram(self, path: str) -> LatencyHistogram:
+        histogram = self.route_latency.get(path)
+        if histogram is None:
+            with self._counter_lock:
+                histogram = self.route_latency.setdefault(path, LatencyHistogram())
+        return histogram
+
+    def _count(self, counter: str) -> None:
+        with self._counter_lock:
+            self.counters[counter] += 1
+
+    def stats(self) -> dict:
+        """Breaker state, counters and latency histograms of this process' client."""
+        with self._counter_lock:
+            counters = dict(self.counters)
+        return {
+            "name": self.name,
+            "breaker": self.breaker.snapshot(),
+            "counters": counters,
+            "latency": {label: h.snapshot() for label, h in self.latency.items()},
+            "updated": round(time.time(), 2),
+        }
+
+    def _publish_stats(self) -> None:
+        # Throttled and best effort: monitoring must never slow down or fail a request
+        now = time.monotonic()
+        if now - self._published_at < config.LLM_STATS_INTERVAL:
+            return
+        self._published_at = now
+        try:
+            if self._redis is None:
+                import redis
+
+                self._redis = redis.Redis(
+                    host="localhost", port=os.getenv("REDIS_PORT"), db=0
+                )
+            field = f"{socket.gethostname()}:{os.getpid()}:{self.name}"
+            self._redis.hset(STATS_KEY, field, json.dumps(self.stats()))
+        except Exception as e:
+            logging.debug(f"Could not publish LLM client stats: {str(e)}")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(name: str = "llama") -> LLMClient:
+    """
+    Get the shared client of an LLM backend.
+
+    Args:
+        name (str): Name of the backend. Only "llama" is configured.
+    Returns:
+        LLMClient: The client.
+    """
+    with _clients_lock:
+        if name not in _clients:
+            if name != "llama":
+                raise ValueError(f"Unknown LLM backend: {name}")
+            _clients[name] = LLMClient(name, "LLAMA_API_URL", "LLAMA_HEDGE_API_URL")
+        return _clients[name]
+
+
+def get_published_stats(connection, max_age: int = 3600) -> list:
+    """
+    Read the stats published by the LLM clients of every API and worker process.
+    Stats not updated for max_age seconds (e.g. of stopped processes) are removed.
+
+    Args:
+        connection (Redis): Redis connection.
+        max_age (int, optional): Seconds after which stats are considered stale.
+    Returns:
+        list: The stats of each client, most recently updated first.
+    """
+    stats = []
+    for field, payload in connection.hgetall(STATS_KEY).items():
+        entry = json.loads(payload)
+        if time.time() - entry["updated"] > max_age:
+            connection.hdel(STATS_KEY, field)
+            continue
+        entry["process"] = field.decode()
+        stats.append(entry)
+    return sorted(stats, key=lambda entry: entry["updated"], reverse=True)
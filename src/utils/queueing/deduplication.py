@@ -0,0 +1,213 @@
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from typing import IO
+import hashlib
+import logging
+import json
+import re
+
+from redis.exceptions import WatchError
+from rq.job import Job as RQJob
+
+from config import config
+
+DEDUP_KEY_PREFIX = "classifai:dedup:"
+
+# Jobs in these states are not reused, a duplicate submission runs again
+DEAD_STATUSES = {b"failed", b"stopped", b"canceled"}
+
+YOUTUBE_HOSTS = {"youtube.com", "m.youtube.com", "music.youtube.com", "youtu.be"}
+YOUTUBE_PATH_ID = re.compile(r"^/(?:shorts|embed|live|v)/([\w-]{11})")
+
+# Query parameters that do not change what a URL points to
+IGNORED_QUERY_PARAMS = {"si", "feature", "fbclid", "gclid"}
+
+CHECKSUM_READ_SIZE = 1024 * 1024
+
+# Seconds a claimed submission may take to show up as a job in RQ
+ENQUEUE_GRACE_SECONDS = 30
+
+# Tries of claim_submission when other submissions change the key meanwhile
+CLAIM_ATTEMPTS = 3
+
+
+def normalize_url(url: str) -> str:
+    """
+    Normalize a URL, so every form of the same video gives the same string.
+
+    YouTube URLs become "youtube:<video id>" (watch, youtu.be, shorts, embed and live
+    links). Other URLs get a lowercase scheme and host, no fragment, no tracking
+    parameters, and sorted query parameters.
+
+    Args:
+        url (str): The URL.
+    Returns:
+        str: The normalized URL.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower().removeprefix("www.")
+
+    if host in YOUTUBE_HOSTS:
+        video_id = None
+        if host == "youtu.be":
+            video_id = parts.path.strip("/")[:11]
+        elif parts.path == "/watch":
+            video_id = dict(parse_qsl(parts.query)).get("v")
+        else:
+            match = YOUTUBE_PATH_ID.match(parts.path)
+            video_id = match.group(1) if match else None
+        if video_id:
+            return f"youtube:{video_id}"
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key not in IGNORED_QUERY_PARAMS and not key.startswith("utm_")
+    )
+    return urlunsplit(
+        (parts.scheme.lower(), host, parts.path or "/", urlencode(query), "")
+    )
+
+
+def stream_checksum(stream: IO) -> str:
+    """
+    SHA-256 of an uploaded file, read in chunks. The stream is rewound afterwards.
+
+    Args:
+        stream (IO): Binary stream (e.g. request.files["file"].stream).
+    Returns:
+        str: The hex digest.
+    """
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(CHECKSUM_READ_SIZE), b""):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def get_dedup_key(job_type: str, source: str, settings: dict = None) -> str:
+    """
+    Key of a submission: submissions with the same key produce the same result.
+
+    Args:
+        job_type (str): Type of the job (e.g. "analyze").
+        source (str): normalize_url of the URL, or "sha256:<checksum>" of the file.
+        settings (dict, optional): Settings that change the result (e.g. the model).
+    Returns:
+        str: The key.
+    """
+    payload = json.dumps(
+        {"type": job_type, "source": source, "settings": settings or {}},
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def find_submission(connection, dedup_key: str) -> str:
+    """
+    Get the job of an earlier identical submission, if it can still be reused.
+
+    Args:
+        connection (Redis): Redis connection, or a pipeline in WATCH mode.
+        dedup_key (str): Key of the submission (see get_dedup_key).
+    Returns:
+        str: ID of the queued, running or finished job of the submission, or None.
+    """
+    key = DEDUP_KEY_PREFIX + dedup_key
+    try:
+        job_id = connection.get(key)
+        if job_id is None:
+            return None
+        job_id = job_id.decode()
+        status = connection.hget(RQJob.key_for(job_id), "status")
+        if status is None:
+            # No job yet: still being enqueued if claimed moments ago, else deleted
+            claimed_for = config.DEDUP_TTL - connection.ttl(key)
+            return job_id if claimed_for <= ENQUEUE_GRACE_SECONDS else None
+        if status in DEAD_STATUSES:
+            return None
+        return job_id
+    except Exception as e:
+        logging.warning(f"Could not look up submission {dedup_key}: {str(e)}")
+        return None
+
+
+def claim_submission(connection, dedup_key: str, job_id: str) -> str:
+    """
+    Register a job for a submission, unless an equivalent job was submitted already.
+
+    Args:
+        connection (Redis): Redis connection.
+        dedup_key (str): Key of the submission (see get_dedup_key).
+        job_id (str): ID of the job that would be enqueued.
+    Returns:
+        str: ID of the queued, running or finished job of the same submission, or
+            None if this job was registered and must be enqueued.
+    """
+    key = DEDUP_KEY_PREFIX + dedup_key
+    try:
+        for _ in range(CLAIM_ATTEMPTS):
+            if connection.set(key, job_id, nx=True, ex=config.DEDUP_TTL):
+                return None
+
+            with connection.pipeline() as pipeline:
+                # The earlier job failed or expired, this one replaces it, unless
+                # another submission replaced it first (then the SET fails)
+                pipeline.watch(key)
+                existing = find_submission(pipeline, dedup_key)
+                if existing is not None:
+                    return existing
+                if pipeline.get(key) is None:
+                    continue  # Expired meanwhile, claim it with SET NX
+                pipeline.multi()
+                pipeline.set(key, job_id, ex=config.DEDUP_TTL)
+                try:
+                    pipeline.execute()
+                    return None
+                except WatchError:
+                    continue
+        logging.warning(f"Could not deduplicate job {job_id}: key kept changing")
+    except Exception as e:
+        logging.warning(f"Could not deduplicate job {job_id}: {str(e)}")
+    return None
+
+
+def claim_submissions(connection, claims: dict) -> dict:
+    """
+    claim_submission for many submissions, with one round-trip unless some of them
+    were submitted before.
+
+    Args:
+        connection (Redis): Redis connection.
+        claims (dict): {dedup_key: job_id}
+    Returns:
+        dict: {dedup_key: ID of the existing job} for the submissions that must not
+            be enqueued.
+    """
+    try:
+        with connection.pipeline(transaction=False) as pipeline:
+            for dedup_key, job_id in claims.items():
+                pipeline.set(
+                    DEDUP_KEY_PREFIX + dedup_key, job_id, nx=True, ex=config.DEDUP_TTL
+                )
+            claimed = pipeline.execute()
+    except Exception as e:
+        logging.warning(f"Could not deduplicate {len(claims)} jobs: {str(e)}")
+        return {}
+
+    existing = {}
+    for (dedup_key, job_id), was_claimed in zip(claims.items(), claimed):
+        if not was_claimed:
+            existing_id = claim_submission(connection, dedup_key, job_id)
+            if existing_id is not None:
+                existing[dedup_key] = existing_id
+    return existing
+
+
+def release_submission(connection, dedup_key: str, job_id: str) -> None:
+    """Unregister a job that could not be enqueued after claim_submission."""
+    key = DEDUP_KEY_PREFIX + dedup_key
+    try:
+        if connection.get(key) == job_id.encode():
+            connection.delete(key)
+    except Exception as e:
+        logging.warning(f"Could not release the submission of job {job_id}: {str(e)}")
@@ -0,0 +1,232 @@
+from collections import defaultdict
+from rq.job import Job as RQJob
+import threading
+import logging
+import queue
+import json
+import time
+import os
+
+
+# Every job publishes its progress events on its own channel, so a client
+# following one lecture only receives that lecture's updates.
+CHANNEL_PREFIX = "classifai:jobs:"
+CHANNEL_SUFFIX = ":events"
+
+# RQ statuses after which no more progress events will be published
+TERMINAL_STATUSES = {"finished", "failed", "stopped", "canceled"}
+
+# Seconds between keep-alive comments on an idle event stream
+HEARTBEAT_INTERVAL = 15
+
+# Times the stored status is checked (every 0.25 seconds) after a final event
+FINAL_STATUS_CHECKS = 20
+
+
+def get_job_channel(job_id: str) -> str:
+    """
+    Get the Redis pub/sub channel that progress events of a job are published on.
+
+    Args:
+        job_id (str): ID of the job.
+    Returns:
+        str: Name of the channel.
+    """
+    return f"{CHANNEL_PREFIX}{job_id}{CHANNEL_SUFFIX}"
+
+
+def publish_job_event(connection, job_id: str, event: dict) -> None:
+    """
+    Publish a progress event for a job. Publishing is best effort: a Redis error is
+    logged and never interrupts the job itself.
+
+    Args:
+        connection (Redis): Redis connection to publish on.
+        job_id (str): ID of the job.
+        event (dict): Event fields, e.g. {"progress": "transcribing", "message": "..."}.
+    Returns:
+        None
+    """
+    payload = {"job_id": job_id, "time": round(time.time(), 2)}
+    payload.update(event)
+    try:
+        connection.publish(get_job_channel(job_id), json.dumps(payload, default=str))
+    except Exception as e:
+        logging.warning(f"Could not publish event for job {job_id}: {str(e)}")
+
+
+def publish_job_finished(job, connection, result, *args, **kwargs) -> None:
+    """RQ on_success callback. Tell the listeners that the job has finished."""
+    publish_job_event(
+        connection,
+        job.id,
+        {"status": "finished", "progress": "completed", "message": "Job finished"},
+    )
+
+
+def publish_job_failed(job, connection, exc_type, exc_value, traceback) -> None:
+    """RQ on_failure callback. Tell the listeners that the job has failed."""
+    publish_job_event(
+        connection,
+        job.id,
+        {"status": "failed", "progress": "error", "message": str(exc_value)},
+    )
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Format a Server-Sent Event message."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class JobEventBroker:
+    """
+    Relays job events from Redis to the event streams open in this process.
+
+    A single pattern subscription is shared by every stream in the process, so the
+    number of open dashboards does not change the number of Redis connections.
+    The listener thread is started lazily, which keeps it working after gunicorn forks.
+
+    Args:
+        connection (Redis): Redis connection used for the subscription.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def subscribe(self, job_id: str) -> queue.Queue:
+        """Start receiving the events of a job. Returns the queue they are put on."""
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers[job_id].add(events)
+        self._ensure_listener()
+        return events
+
+    def unsubscribe(self, job_id: str, events: queue.Queue) -> None:
+        """Stop receiving the events of a job."""
+        with self._lock:
+            self._subscribers[job_id].discard(events)
+            if not self._subscribers[job_id]:
+                del self._subscribers[job_id]
+
+    def _ensure_listener(self) -> None:
+        with self._lock:
+            if (
+                self._thread is not None
+                and self._thread.is_alive()
+                and self._pid == os.getpid()
+            ):
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._listen, name="job-event-broker", daemon=True
+            )
+            self._thread.start()
+
+    def _listen(self) -> None:
+        while True:
+            try:
+                pubsub = self.connection.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(f"{CHANNEL_PREFIX}*{CHANNEL_SUFFIX}")
+                for message in pubsub.listen():
+                    self._dispatch(message)
+            except Exception as e:
+                logging.error(f"Job event subscription lost, reconnecting: {str(e)}")
+                time.sleep(1)
+
+    def _dispatch(self, message: dict) -> None:
+        try:
+            event = json.loads(message["data"])
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            listeners = list(self._subscribers.get(event.get("job_id"), ()))
+        for events in listeners:
+            events.put(event)
+
+
+def read_job_snapshot(connection, job_id: str):
+    """
+    Read the current status and meta of a job without loading its result.
+
+    Args:
+        connection (Redis): Redis connection.
+        job_id (str): ID of the job.
+    Returns:
+        dict: {"job_id", "status", "meta"}, or None if the job does not exist.
+    """
+    try:
+        rqjob = RQJob.fetch(job_id, connection=connection)
+    except Exception:
+        return None
+    return {"job_id": job_id, "status": rqjob.get_status(), "meta": rqjob.get_meta()}
+
+
+def read_job_status(connection, job_id: str) -> str:
+    """Read only the stored RQ status of a job."""
+    status = connection.hget(RQJob.key_for(job_id), "status")
+    return status.decode() if status else None
+
+
+def stream_job_events(broker: JobEventBroker, job_id: str, result_url: str):
+    """
+    Generate the Server-Sent Events for a job until it reaches a final status.
+
+    The stream starts with a snapshot of the job, relays every progress event, and
+    ends with a "result" event that points to where the result can be fetched.
+    Events are only hints: the stored status is checked before the stream ends, and
+    also on every heartbeat, so a worker that died without publishing still ends it.
+
+    Args:
+        broker (JobEventBroker): Broker the stream subscribes through.
+        job_id (str): ID of the job.
+        result_url (str): URL the client can fetch the result from.
+    Yields:
+        str: Server-Sent Event messages.
+    """
+    connection = broker.connection
+    # Subscribe before reading the snapshot so no event can fall in between
+    events = broker.subscribe(job_id)
+    try:
+        snapshot = read_job_snapshot(connection, job_id)
+        if snapshot is None:
+            yield format_sse("error", {"error": "Invalid job ID: " + str(job_id)})
+            return
+
+        yield format_sse("progress", snapshot)
+        status = snapshot["status"]
+        status_checks = 0  # Quick status checks left after a final event
+
+        while status not in TERMINAL_STATUSES:
+            # RQ runs callbacks before it stores the final status, so poll briefly
+            # once a final event has been seen. A failed job that is retried never
+            # reaches a final status, so give up polling after a few seconds.
+            timeout = 0.25 if status_checks else HEARTBEAT_INTERVAL
+            try:
+                event = events.get(timeout=timeout)
+            except queue.Empty:
+                event = None
+                if not status_checks:
+                    yield ": keep-alive\n\n"
+
+            if event is not None:
+                yield format_sse("progress", event)
+                if event.get("status") not in TERMINAL_STATUSES:
+                    continue
+                status_checks = FINAL_STATUS_CHECKS
+            elif status_checks:
+                status_checks -= 1
+
+            status = read_job_status(connection, job_id)
+            if status is None:  # The job expired or was deleted
+                yield format_sse("error", {"error": "Job no longer exists: " + job_id})
+                return
+
+        yield format_sse(
+            "result", {"job_id": job_id, "status": status, "result_url": result_url}
+        )
+    finally:
+        broker.unsubscribe(job_id, events)
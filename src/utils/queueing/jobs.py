@@ -12,7 +12,8 @@ class Job:
 
     Args:
         job_id (str): ID of the job.
-        type (str): Type of the job. 'transcription', 'summarization', or 'categorization'.
+        type (str): Type of the job. 'transcription', 'summarization', 'categorization',
+            'analyze' or 'export'.
         user_id (str, optional): ID of the user who uploaded the audio file (default=None).
         status (str, optional): Status of the job 'queued', 'in progress', 'completed', or 'failed'.
         subtask (str, optional): List of subtasks that are part of the job. (loading_model, transcribing, diarizing, etc.)
@@ -150,7 +151,7 @@ class Job:
             model_type (str): Name of the model used for transcription (default: "large-v3").
             title (str, optional): Title of Youtube or other video (default: None).
         Returns:
-            None
+            Job: The job (self).
         """
         self.job_info = {
             "audio_path": audio_path,  # Path to the audio file, downloaded before processing
@@ -160,19 +161,43 @@ class Job:
             "url": None,
         }
 
-    def initialize_categorization_job(self, transcript: str):
+        return self
+
+    def initialize_categorization_job(
+        self, transcript: list = None, questions: list = None
+    ):
         """
-        Initialize a categorization job with the transcript.
+        Initialize a categorization job with the transcript, or with the questions
+        already extracted from it.
 
         Args:
-            transcript (str): Transcript of the audio file.
+            transcript (list): Transcript segments of the audio file ({"text", "speaker", ...}).
+            questions (list): Questions to categorize (Question.to_dict() of each).
         Returns:
-            None
+            Job: The job (self).
         """
         self.job_info = {
             "transcript": transcript,  # Transcript of the audio file to be categorized
+            "questions": questions,  # Or its questions, with their context
+        }
+
+        return self
+
+    def initialize_export_job(self, job_ids: list = None):
+        """
+        Initialize a Parquet export job (see utils/export/parquet_export.py).
+
+        Args:
+            job_ids (list, optional): IDs of the jobs to export (default: every finished job).
+        Returns:
+            Job: The job (self).
+        """
+        self.job_info = {
+            "job_ids": job_ids,  # Jobs to export, None for every finished job
         }
 
+        return self
+
     def initialize_summarization_job(self, transcript: str):
         """
         Initialize a summarization job with the transcript.
@@ -180,12 +205,14 @@ class Job:
         Args:
             transcript (str): Transcript of the audio file.
         Returns:
-            None
+            Job: The job (self).
         """
         self.job_info = {
             "transcript": transcript,  # Transcript of the audio file to be summarized
         }
 
+        return self
+
     def initialize_analysis_job(
         self,
         audio_path: str,
@@ -203,7 +230,7 @@ class Job:
             title (str, optional): Title of Youtube or other video (default: None).
             publish_date (str, optional): Publish date of the video (default: None).
         Returns:
-            None
+            Job: The job (self).
         """
 
         print("Initializing analysis job")
@@ -0,0 +1,90 @@
+from contextlib import contextmanager
+from rq.worker import SimpleWorker
+import tempfile
+import logging
+import shutil
+import gc
+import os
+
+from config import config, worker_config
+
+
+@contextmanager
+def isolated_job_state(job_id: str):
+    """
+    Give a job run in the worker process its own temporary state, and undo any
+    changes it made to the process once it is done.
+
+    - tempfile and TMPDIR point to a temporary folder of the job, deleted afterwards
+    - the working directory and environment variables are restored
+    - unreferenced objects and cached GPU memory are released
+
+    Args:
+        job_id (str): ID of the job.
+    """
+    cwd = os.getcwd()
+    environ = dict(os.environ)
+    tempdir = tempfile.tempdir
+    job_tempdir = tempfile.mkdtemp(prefix=f"job-{job_id}-")
+
+    tempfile.tempdir = job_tempdir
+    os.environ["TMPDIR"] = job_tempdir
+    try:
+        yield job_tempdir
+    finally:
+        tempfile.tempdir = tempdir
+        os.environ.clear()
+        os.environ.update(environ)
+        os.chdir(cwd)
+        shutil.rmtree(job_tempdir, ignore_errors=True)
+
+        gc.collect()
+        try:
+            import torch
+
+            torch.cuda.empty_cache()
+        except ImportError:
+            pass
+
+
+class PrewarmedWorker(SimpleWorker):
+    """
+    RQ worker that loads the pipeline's models once at boot and runs jobs in its own
+    process, so the first job costs the same as the hundredth.
+
+    The default RQ worker forks a work horse for every job, so models loaded by a job
+    are thrown away when it ends. This worker instead:
+
+    - loads and warms up the transcription, alignment, diarization and punctuation
+      models before registering with Redis, so it only shows up once it is ready
+    - keeps them loaded, and runs each job in-process with isolated temporary state
+      (see isolated_job_state)
+
+    Start it with:
+        rq worker -c config.worker_config -w utils.queueing.prewarmed_worker.PrewarmedWorker
+    """
+
+    def work(self, *args, **kwargs):
+        self.warm_up()
+        return super().work(*args, **kwargs)
+
+    def warm_up(self) -> None:
+        """Load and warm up the configured models."""
+        # Imported here, so the module can be imported without loading torch
+        from utils.transcription import model_cache
+
+        model_cache.keep_models_loaded()
+        logging.info(f"Worker {self.name} is warming up...")
+        duration = model_cache.warm_up(
+            config.TRANSCRIPTION_MODEL, worker_config.WARM_ALIGN_LANGUAGES
+        )
+
+        # Import the pipeline too, so the first job does not pay for it
+        import utils.queueing.worker_manager  # noqa: F401
+
+        logging.info(f"Worker {self.name} is ready after {duration:.2f}s warm-up")
+
+    def execute_job(self, job, queue):
+        """Run the job in this process, with its own temporary state."""
+        with isolated_job_state(job.id):
+            return super().execute_job(job, queue)
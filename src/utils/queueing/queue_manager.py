@@ -1,15 +1,45 @@
 from utils.queueing.jobs import Job
 import redis
-from rq import Queue
-from flask import Flask, jsonify, Blueprint
+from rq import Queue, Callback, Retry
+from flask import Flask, jsonify, Blueprint, Response, stream_with_context
+from rq.serializers import resolve_serializer
 from dotenv import load_dotenv
 import os
 import logging
 import uuid
 import json
-from utils.queueing.worker_manager import process_job
-from utils.transcription.download_utils import get_video_title
+import time
+import hashlib
+from utils.queueing.worker_manager import process_job, handle_job_success
+from utils.queueing.job_events import (
+    JobEventBroker,
+    publish_job_failed,
+    stream_job_events,
+)
+from config import config
 from rq.job import Job as RQJob
+from utils.queueing.deduplication import (
+    claim_submission,
+    claim_submissions,
+    find_submission,
+    get_dedup_key,
+    normalize_url,
+    release_submission,
+)
+from utils.queueing.transcript_index import (
+    build_transcript_index,
+    get_index_info,
+    get_result_transcript,
+    get_sentence_page,
+    get_sentences_in_range,
+)
+from utils.response_encoding import (
+    compress,
+    dumps,
+    encoded_response,
+    json_response,
+    negotiate_encoding,
+)
 
 load_dotenv()
 
@@ -21,6 +51,26 @@ queue_management = Blueprint("queue_management", __name__)
 r = redis.Redis(host="localhost", port=os.getenv("REDIS_PORT"), db=0)
 q = Queue("jobs", connection=r)
 
+# Maximum number of job IDs accepted by one bulk status request
+MAX_BULK_JOB_IDS = 500
+
+# Maximum number of sentences returned by one transcript slice request
+MAX_SLICE_SENTENCES = 1000
+
+# Maximum number of jobs in one batch, so its jobs fit in one bulk status request
+MAX_BATCH_JOBS = MAX_BULK_JOB_IDS
+
+# Jobs of a batch submission (see enqueue_batch)
+BATCH_KEY = "classifai:batch:{batch_id}"
+
+JOB_TIMEOUT = "5m"
+
+# Encoded status responses of finished jobs, per job and content encoding
+RESULT_CACHE_KEY = "classifai:result:{job_id}:{encoding}"
+
+# Relays job progress events to the event streams open in this process
+event_broker = JobEventBroker(r)
+
 
 def enqueue_yt_transcription(job_id, url, model_name):
     """
@@ -35,15 +85,58 @@ def enqueue_yt_transcription(job_id, url, model_name):
     # audio_path, title, date = download_and_convert_to_mp3(url)
     # if audio_path is None:
     #     return jsonify({"error": "Error downloading audio"}), 500
+    dedup_key = get_submission_key("transcription", normalize_url(url), model_name)
     job_info = {
         "url": url,  # URL of the YouTube video to transcribe
-        "title": get_video_title(url),
+        "title": None,  # Fetched by the worker
         "model_id": model_name,
     }
-    return enqueue("transcription", job_id, job_info)
+    return enqueue("transcription", job_id, job_info, dedup_key=dedup_key)
 
 
-def enqueue(job_type: str, job_id: str, job_info: dict = None):
+def find_duplicate_job(dedup_key: str):
+    """
+    Get the job of an identical earlier submission, so endpoints can skip saving or
+    converting an upload that would not be used.
+
+    Args:
+        dedup_key (str): Key of the submission (see deduplication.get_dedup_key).
+    Returns:
+        str: ID of the job to reuse, or None (also if deduplication is disabled).
+    """
+    if not config.DEDUPLICATE_JOBS:
+        return None
+    return find_submission(r, dedup_key)
+
+
+def deduplicated_response(job_id: str):
+    """Response to a submission attached to the existing job job_id."""
+    return (
+        jsonify(
+            {"message": "Job already enqueued", "job_id": job_id, "deduplicated": True}
+        ),
+        200,
+    )
+
+
+def get_enqueue_options(job: Job) -> dict:
+    """RQ options of a job, shared by enqueue and enqueue_batch."""
+    description = {
+        "job_type": job.type,
+        "job_status": "queued",
+    }
+    return {
+        "description": json.dumps(description),
+        "result_ttl": -1,  # Keep the result in Redis indefinitely
+        "meta": {"job_type": job.type, "job_id": job.job_id, "progress": "queued"},
+        "on_success": Callback(handle_job_success),
+        "on_failure": Callback(publish_job_failed),
+        # Retries resume from the transcription checkpoints of the failed attempt
+        "retry": Retry(max=config.JOB_MAX_RETRIES) if config.JOB_MAX_RETRIES else None,
+    }
+
+
+def enqueue(job_type: str, job_id: str, job_info: dict = None, dedup_key: str = None):
     """
     Enqueue a job in the job queue (redis) according to the job type.
 
@@ -57,6 +150,9 @@ def enqueue(job_type: str, job_id: str, job_info: dict = None):
                 for summarization: {"text": "text to summarize"}
                 for categorization: {"text": "text to categorize"}
                 for other jobs: {"key": "value"}
+        dedup_key (str): Key of the submission (see deduplication.get_dedup_key).
+            If a live job has the same key, no job is enqueued and the response
+            carries the ID of that job, with "deduplicated": true. (default: None)
 
     Returns:
         str: A message confirming the job has been enqueued.
@@ -69,10 +165,16 @@ def enqueue(job_type: str, job_id: str, job_info: dict = None):
     if job_type is None:
         return jsonify({"error": "job_type is required"}), 400
 
-    if job_type not in ["transcription", "summarization", "categorization", "analyze"]:
+    if job_type not in [
+        "transcription",
+        "summarization",
+        "categorization",
+        "analyze",
+        "export",
+    ]:
         return jsonify(
             {
-                "error": "Invalid job_type. Must be one of: transcription, summarization, categorization, analyze"
+                "error": "Invalid job_type. Must be one of: transcription, summarization, categorization, analyze, export"
             }
         ), 400
 
@@ -90,34 +192,229 @@ def enqueue(job_type: str, job_id: str, job_info: dict = None):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     job_pickle = job.pickle()
-    description = {
-        "job_type": job.type,
-        "job_status": "queued",
-    }
-    description = json.dumps(description)
+
+    if dedup_key is not None and config.DEDUPLICATE_JOBS:
+        existing = claim_submission(r, dedup_key, job.job_id)
+        if existing is not None:
+            logging.info(f"Job {job.job_id} is a duplicate of job {existing}")
+            return deduplicated_response(existing)
 
     # Enqueue the job via RQ
-    q.enqueue(
-        process_job,
-        job_pickle,
-        job_id=job.job_id,
-        job_timeout="5m",
-        description=description,
-        result_ttl=-1,  # Keep the result in Redis indefinitely
-        meta={"job_type": job.type, "job_id": job.job_id, "progress": "queued"},
-    )
+    try:
+        q.enqueue(
+            process_job,
+            job_pickle,
+            job_id=job.job_id,
+            job_timeout=get_job_timeout(job.type),
+            **get_enqueue_options(job),
+        )
+    except Exception:
+        if dedup_key is not None:
+            release_submission(r, dedup_key, job.job_id)
+        raise
 
     logging.info(f"Job enqueued: {job.job_id}")
 
-    return jsonify({"message": "Job enqueued", "job_id": str(job.job_id)}), 200
+    response = {"message": "Job enqueued", "job_id": str(job.job_id)}
+    if dedup_key is not None:
+        response["deduplicated"] = False
+    return jsonify(response), 200
+
+
+def get_job_timeout(job_type: str):
+    """Time a job of this type may run before RQ stops it."""
+    if job_type == "export":
+        # An export reads every finished job, far more than one job's work
+        return config.EXPORT_JOB_TIMEOUT
+    return JOB_TIMEOUT
+
+
+def get_submission_key(job_type: str, source: str, model_name: str = None) -> str:
+    """
+    Deduplication key of a transcription or analysis submission, the same as the
+    single submission endpoints use.
+
+    Args:
+        job_type (str): "transcription" or "analyze".
+        source (str): normalize_url of the URL, or "sha256:<checksum>" of the file.
+        model_name (str, optional): Model of a transcription job.
+    """
+    if job_type == "analyze":
+        settings = {"model_type": config.TRANSCRIPTION_MODEL}
+        return get_dedup_key("analyze", source, settings)
+    return get_dedup_key(job_type, source, {"model_id": model_name})
+
+
+def enqueue_batch(job_type: str, submissions: list, model_name: str = None):
+    """
+    Enqueue many transcription or analysis jobs, e.g. every lecture of a playlist,
+    with a single pipelined Redis write, and record them as a batch.
+
+    Titles are not fetched here: the worker fetches the title of each video when it
+    starts its job. Identical submissions are attached to the existing job, as with
+    single submissions.
+
+    Args:
+        job_type (str): "transcription" or "analyze".
+        submissions (list): One dict per job, with "source" (the URL or file name)
+            and either "url", or "audio_path" and "dedup_key" of an uploaded file,
+            or "job_id" of an existing job the file was already attached to.
+        model_name (str, optional): Model of transcription jobs.
+    Returns:
+        Response: {"message", "batch_id", "jobs": [{"job_id", "source",
+            "deduplicated"}]}
+    """
+    if job_type not in ("transcription", "analyze"):
+        return jsonify({"error": "job_type must be transcription or analyze"}), 400
+    if not submissions:
+        return jsonify({"error": "No URLs or files to enqueue"}), 400
+    if len(submissions) > MAX_BATCH_JOBS:
+        return jsonify({"error": f"At most {MAX_BATCH_JOBS} jobs per batch"}), 400
+
+    batch_id = str(uuid.uuid4())
+    entries = []
+    jobs = {}  # dedup_key (or job ID, without deduplication): Job to enqueue
+    for submission in submissions:
+        entry = {"job_id": submission.get("job_id"), "source": submission["source"]}
+        entries.append(entry)
+        if entry["job_id"] is not None:
+            entry["deduplicated"] = True
+            continue
+
+        url = submission.get("url")
+        dedup_key = submission.get("dedup_key") or get_submission_key(
+            job_type, normalize_url(url), model_name
+        )
+        if config.DEDUPLICATE_JOBS and dedup_key in jobs:  # Listed twice in the batch
+            entry.update(
+                job_id=jobs[dedup_key].job_id, deduplicated=True, dedup_key=dedup_key
+            )
+            continue
+
+        job = Job(job_id=str(uuid.uuid4()), type=job_type)
+        if job_type == "analyze":
+            job.initialize_analysis_job(
+                audio_path=submission.get("audio_path"),
+                model_type=config.TRANSCRIPTION_MODEL,
+                title=None if url else submission["source"],
+                url=url,
+            )
+        else:
+            job.job_info = {
+                "url": url,
+                "audio_path": submission.get("audio_path"),
+                "title": None if url else submission["source"],
+                "model_id": model_name,
+            }
+        if not config.DEDUPLICATE_JOBS:
+            dedup_key = job.job_id
+        entry.update(job_id=job.job_id, deduplicated=False, dedup_key=dedup_key)
+        jobs[dedup_key] = job
+
+    existing = {}
+    if config.DEDUPLICATE_JOBS:
+        existing = claim_submissions(
+            r, {dedup_key: job.job_id for dedup_key, job in jobs.items()}
+        )
+    for entry in entries:
+        dedup_key = entry.pop("dedup_key", None)
+        if dedup_key in existing:
+            entry.update(job_id=existing[dedup_key], deduplicated=True)
+            jobs.pop(dedup_key, None)
+
+    job_datas = [
+        Queue.prepare_data(
+            process_job,
+            args=(job.pickle(),),
+            job_id=job.job_id,
+            timeout=JOB_TIMEOUT,
+            **get_enqueue_options(job),
+        )
+        for job in jobs.values()
+    ]
+    batch = {
+        "batch_id": batch_id,
+        "job_type": job_type,
+        "created": time.time(),
+        "jobs": entries,
+    }
+
+    # The jobs and the batch are written in one MULTI/EXEC round-trip
+    try:
+        with r.pipeline() as pipeline:
+            q.enqueue_many(job_datas, pipeline=pipeline)
+            pipeline.set(
+                BATCH_KEY.format(batch_id=batch_id),
+                json.dumps(batch),
+                ex=config.BATCH_TTL,
+            )
+            pipeline.execute()
+    except Exception:
+        if config.DEDUPLICATE_JOBS:
+            for dedup_key, job in jobs.items():
+                release_submission(r, dedup_key, job.job_id)
+        raise
+
+    logging.info(f"Batch {batch_id} enqueued: {len(jobs)} of {len(entries)} jobs")
+
+    return (
+        jsonify({"message": "Batch enqueued", "batch_id": batch_id, "jobs": entries}),
+        200,
+    )
 
 
-def get_job_status(job_id: str):
+def get_batch_status(batch_id: str, accept_encodings=None):
+    """
+    Get the progress of a batch enqueued with enqueue_batch, with a single Redis
+    round-trip for all of its jobs. Results are not included: fetch them with
+    get_bulk_job_status or get_job_status.
+
+    Args:
+        batch_id (str): ID of the batch.
+        accept_encodings (Accept, optional): request.accept_encodings.
+    Returns:
+        Response: {"batch_id", "job_type", "created", "total", "counts": {status:
+            count}, "jobs": [{"job_id", "source", "deduplicated", "status",
+            "title", "progress"}]}
+    """
+    if not batch_id:
+        return jsonify({"error": "No batch ID provided"}), 400
+
+    batch = r.get(BATCH_KEY.format(batch_id=batch_id))
+    if batch is None:
+        return jsonify({"error": "Invalid batch ID: " + str(batch_id)}), 400
+    batch = json.loads(batch)
+
+    with r.pipeline(transaction=False) as pipeline:
+        for entry in batch["jobs"]:
+            pipeline.hmget(RQJob.key_for(entry["job_id"]), "status", "meta")
+        rows = pipeline.execute()
+
+    serializer = resolve_serializer()
+    counts = {}
+    for entry, (status, meta) in zip(batch["jobs"], rows):
+        meta = serializer.loads(meta) if meta else {}
+        entry["status"] = status.decode() if status is not None else "missing"
+        entry["title"] = meta.get("title")
+        entry["progress"] = meta.get("progress")
+        counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+
+    batch["total"] = len(batch["jobs"])
+    batch["counts"] = counts
+    return json_response(batch, accept_encodings), 200
+
+
+def get_job_status(job_id: str, accept_encodings=None):
     """
     Get the status of a job by job_id.
 
+    The response is compressed as the client accepts. Finished results never change,
+    so their encoded responses are cached in Redis and served without fetching or
+    serializing the result again.
+
     Args:
         job_id (str): ID of the job to check.
+        accept_encodings (Accept, optional): request.accept_encodings.
     Returns:
         dict: A dictionary containing the status and result/error message.
     """
@@ -125,6 +422,18 @@ def get_job_status(job_id: str):
     if job_id is None:
         return jsonify({"error": "No job ID provided"}), 400
 
+    encoding = negotiate_encoding(accept_encodings)
+    cache_key = RESULT_CACHE_KEY.format(job_id=job_id, encoding=encoding)
+    try:
+        cached = r.get(cache_key)
+    except redis.RedisError as e:
+        logging.warning(f"Could not read the cached result of job {job_id}: {str(e)}")
+        cached = None
+    if cached is not None:
+        # Prefixed with the encoding the body ended up with (see compress)
+        cached_encoding, body = cached.split(b"|", 1)
+        return encoded_response(body, cached_encoding.decode())
+
     try:
         rqjob = RQJob.fetch(job_id, connection=r)
     except Exception:
@@ -136,20 +445,205 @@ def get_job_status(job_id: str):
     print(rqjob.get_status())
 
     if rqjob.is_finished and rqjob.result is not None:
-        return (
-            jsonify(
+        body, body_encoding = compress(
+            dumps(
                 {
                     "status": rqjob.get_status(),
                     "result": rqjob.result,
                     "meta": rqjob.get_meta(),
                 }
             ),
-            200,
+            encoding,
         )
+        try:
+            r.set(
+                cache_key,
+                body_encoding.encode() + b"|" + body,
+                ex=config.RESULT_CACHE_TTL,
+            )
+        except redis.RedisError as e:
+            logging.warning(f"Could not cache the result of job {job_id}: {str(e)}")
+        return encoded_response(body, body_encoding)
 
     return jsonify({"status": rqjob.get_status(), "meta": rqjob.get_meta()}), 200
 
 
+def get_bulk_job_status(
+    job_ids: list,
+    include_result: bool = False,
+    known_etags: dict = None,
+    if_none_match=None,
+    accept_encodings=None,
+):
+    """
+    Get the status of many jobs with a single Redis round-trip.
+
+    Only the status and meta fields of each job are read. Results are left out
+    unless include_result is set, since they can be several megabytes each.
+    Every job gets its own ETag, and the response gets an ETag over all of them.
+
+    Args:
+        job_ids (list): IDs of the jobs to check.
+        include_result (bool): Also return the result of finished jobs (default: False).
+        known_etags (dict, optional): {job_id: etag} the client already has. Jobs whose
+            ETag still matches are returned as {"etag", "not_modified": True} only.
+        if_none_match (ETags, optional): The request's If-None-Match header. If it
+            matches the response ETag, an empty 304 response is returned.
+        accept_encodings (Accept, optional): request.accept_encodings, to compress
+            the response.
+    Returns:
+        Response: {"jobs": {job_id: {"status", "meta", "etag", ["result"]}}}
+    """
+    if not job_ids or not isinstance(job_ids, list):
+        return jsonify({"error": "job_ids must be a non-empty list"}), 400
+    if len(job_ids) > MAX_BULK_JOB_IDS:
+        return jsonify(
+            {"error": f"At most {MAX_BULK_JOB_IDS} job IDs per request"}
+        ), 400
+
+    job_ids = [str(job_id) for job_id in job_ids]
+    if not isinstance(known_etags, dict):
+        known_etags = {}
+
+    with r.pipeline(transaction=False) as pipeline:
+        for job_id in job_ids:
+            pipeline.hmget(RQJob.key_for(job_id), "status", "meta")
+        rows = pipeline.execute()
+
+    # ETags are computed from the raw bytes, so unchanged jobs are never deserialized
+    etags = {}
+    for job_id, (status, meta) in zip(job_ids, rows):
+        if status is None:
+            continue
+        digest = hashlib.sha1(status + b"|" + (meta or b""))
+        digest.update(b"|result" if include_result else b"")
+        etags[job_id] = digest.hexdigest()
+
+    batch_etag = hashlib.sha1(
+        json.dumps([etags.get(job_id) for job_id in job_ids]).encode()
+    ).hexdigest()
+
+    if if_none_match is not None and if_none_match.contains(batch_etag):
+        response = Response(status=304)
+        response.set_etag(batch_etag)
+        return response
+
+    serializer = resolve_serializer()
+    jobs = {}
+    finished_ids = []
+    for job_id, (status, meta) in zip(job_ids, rows):
+        if status is None:
+            jobs[job_id] = {"error": "Invalid job ID: " + job_id}
+            continue
+        if known_etags.get(job_id) == etags[job_id]:
+            jobs[job_id] = {"etag": etags[job_id], "not_modified": True}
+            continue
+
+        status = status.decode()
+        jobs[job_id] = {
+            "status": status,
+            "meta": serializer.loads(meta) if meta else {},
+            "etag": etags[job_id],
+        }
+        if include_result and status == "finished":
+            finished_ids.append(job_id)
+
+    if finished_ids:
+        for rqjob in RQJob.fetch_many(finished_ids, connection=r):
+            if rqjob is not None and rqjob.result is not None:
+                jobs[rqjob.id]["result"] = rqjob.result
+
+    response = json_response({"jobs": jobs}, accept_encodings)
+    response.set_etag(batch_etag)
+    return response, 200
+
+
+def get_transcript_slice(
+    job_id: str,
+    start_ms: int = None,
+    end_ms: int = None,
+    offset: int = None,
+    limit: int = 100,
+    accept_encodings=None,
+):
+    """
+    Get part of the transcript of a finished transcription or analysis job: the
+    sentences overlapping [start_ms, end_ms), or limit sentences from offset.
+
+    Sentences are read from the time index built when the job finished (built here
+    for jobs finished before the index existed), so the response time does not
+    depend on the length of the lecture.
+
+    Args:
+        job_id (str): ID of the job.
+        start_ms (int, optional): Start of the time window, in milliseconds.
+        end_ms (int, optional): End of the time window (excluded), in milliseconds.
+        offset (int, optional): Position of the first sentence of the page.
+        limit (int): Max number of sentences returned (at most MAX_SLICE_SENTENCES).
+        accept_encodings (Accept, optional): request.accept_encodings.
+    Returns:
+        Response: {"job_id", "total", "sentences": [{"position", ...sentence}]}
+    """
+    if job_id is None:
+        return jsonify({"error": "No job ID provided"}), 400
+    if not 0 < limit <= MAX_SLICE_SENTENCES:
+        return (
+            jsonify({"error": f"limit must be between 1 and {MAX_SLICE_SENTENCES}"}),
+            400,
+        )
+
+    info = get_index_info(r, job_id)
+    if info is None:
+        try:
+            rqjob = RQJob.fetch(job_id, connection=r)
+        except Exception:
+            return jsonify({"error": "Invalid job ID: " + str(job_id)}), 400
+        if not rqjob.is_finished:
+            return jsonify({"error": "Job has not finished: " + str(job_id)}), 400
+
+        transcript = get_result_transcript(rqjob.meta.get("job_type"), rqjob.result)
+        if transcript is None:
+            return jsonify({"error": "Job has no transcript: " + str(job_id)}), 400
+        info = build_transcript_index(r, job_id, transcript)
+
+    if start_ms is not None and end_ms is not None:
+        sentences = get_sentences_in_range(r, job_id, info, start_ms, end_ms, limit)
+    else:
+        sentences = get_sentence_page(r, job_id, offset or 0, limit)
+
+    return json_response(
+        {
+            "job_id": job_id,
+            "total": info["count"],
+            "sentences": [
+                {"position": position, **sentence} for position, sentence in sentences
+            ],
+        },
+        accept_encodings,
+    )
+
+
+def get_job_events(job_id: str, result_url: str):
+    """
+    Stream the progress of a job as Server-Sent Events, instead of polling get_job_status.
+
+    Args:
+        job_id (str): ID of the job to follow.
+        result_url (str): URL where the client can fetch the result once the job ends.
+    Returns:
+        Response: A text/event-stream response that ends when the job finishes or fails.
+    """
+    if job_id is None:
+        return jsonify({"error": "No job ID provided"}), 400
+
+    events = stream_job_events(event_broker, job_id, result_url)
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 if __name__ == "__main__":
     app = Flask(__name__)
     app.register_blueprint(queue_management)
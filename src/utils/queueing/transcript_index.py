@@ -0,0 +1,170 @@
+from typing import List, Tuple
+import logging
+import json
+import uuid
+
+from config import config
+
+# Sorted set of the sentences of a finished job, scored by their start time (ms)
+INDEX_KEY = "classifai:transcript:{job_id}"
+# Sentence count and longest sentence duration of the index
+INFO_KEY = "classifai:transcript:{job_id}:info"
+
+# Members are prefixed with the sentence position, so they are unique and sentences
+# starting at the same time keep their order
+POSITION_DIGITS = 10
+
+# Sentences added per pipeline round-trip while building an index
+BUILD_BATCH_SIZE = 5000
+# Seconds an index being built is kept, if its builder dies before renaming it
+BUILD_KEY_TTL = 60 * 60
+
+
+def get_result_transcript(job_type: str, result):
+    """
+    Get the transcript sentences out of a job result.
+
+    Args:
+        job_type (str): Type of the job.
+        result: Result of the job.
+    Returns:
+        list: The sentences ({"text", "speaker", "start_time", "end_time"}), or None
+            if the job has no transcript (e.g. a summarization job).
+    """
+    if job_type == "transcription" and isinstance(result, list):
+        return result
+    if job_type == "analyze" and isinstance(result, dict):
+        return result.get("transcript")
+    return None
+
+
+def build_transcript_index(connection, job_id: str, transcript: list) -> dict:
+    """
+    Index the sentences of a finished job by start time, for get_sentences_in_range
+    and get_sentence_page. Building it again gives the same index.
+
+    Args:
+        connection (Redis): Redis connection.
+        job_id (str): ID of the job.
+        transcript (list): Sentences of the job, in order.
+    Returns:
+        dict: {"count", "max_duration"} of the index.
+    """
+    key = INDEX_KEY.format(job_id=job_id)
+    info_key = INFO_KEY.format(job_id=job_id)
+    # Built aside and renamed at the end, so readers never see half an index. Each
+    # build has its own key, so concurrent builds of the same job do not mix.
+    building_key = f"{key}:building:{uuid.uuid4()}"
+    max_duration = 0
+    with connection.pipeline(transaction=False) as pipeline:
+        for position, sentence in enumerate(transcript):
+            start = sentence.get("start_time") or 0
+            end = sentence.get("end_time") or start
+            max_duration = max(max_duration, end - start)
+
+            member = f"{position:0{POSITION_DIGITS}d}" + json.dumps(sentence)
+            pipeline.zadd(building_key, {member: start})
+            if position % BUILD_BATCH_SIZE == BUILD_BATCH_SIZE - 1:
+                pipeline.expire(building_key, BUILD_KEY_TTL)
+                pipeline.execute()
+
+        info = {"count": len(transcript), "max_duration": max_duration}
+        if transcript:
+            pipeline.rename(building_key, key)
+        else:
+            pipeline.delete(key)
+        pipeline.set(info_key, json.dumps(info), ex=config.TRANSCRIPT_INDEX_TTL)
+        if config.TRANSCRIPT_INDEX_TTL and transcript:
+            pipeline.expire(key, config.TRANSCRIPT_INDEX_TTL)
+        pipeline.execute()
+
+    logging.info(f"Indexed {len(transcript)} sentences of job {job_id}")
+    return info
+
+
+def index_job_transcript(connection, job, result) -> None:
+    """
+    Index the transcript of a finished job, if it has one. Errors are logged, the
+    index is then built on first use instead.
+
+    Args:
+        connection (Redis): Redis connection.
+        job (rq.job.Job): The finished RQ job.
+        result: Return value of the job.
+    """
+    try:
+        transcript = get_result_transcript(job.meta.get("job_type"), result)
+        if transcript is not None:
+            build_transcript_index(connection, job.id, transcript)
+    except Exception as e:
+        logging.warning(f"Could not index the transcript of job {job.id}: {str(e)}")
+
+
+def get_index_info(connection, job_id: str) -> dict:
+    """
+    Get the {"count", "max_duration"} of the index of a job, or None if it has none.
+    """
+    info = connection.get(INFO_KEY.format(job_id=job_id))
+    return json.loads(info) if info is not None else None
+
+
+def _decode(members) -> List[Tuple[int, dict]]:
+    return [
+        (int(member[:POSITION_DIGITS]), json.loads(member[POSITION_DIGITS:]))
+        for member in members
+    ]
+
+
+def get_sentences_in_range(
+    connection, job_id: str, info: dict, start_ms: int, end_ms: int, limit: int
+) -> List[Tuple[int, dict]]:
+    """
+    Get the sentences of a job that overlap the [start_ms, end_ms) window.
+
+    Only sentences starting up to max_duration before the window can overlap it, so
+    the lookup costs the same however long the lecture is.
+
+    Args:
+        connection (Redis): Redis connection.
+        job_id (str): ID of the job.
+        info (dict): Index info (see get_index_info).
+        start_ms (int): Start of the window, in milliseconds.
+        end_ms (int): End of the window (excluded), in milliseconds.
+        limit (int): Max number of sentences returned.
+    Returns:
+        List[Tuple[int, dict]]: (position, sentence) of each sentence, in order.
+    """
+    key = INDEX_KEY.format(job_id=job_id)
+    # Sentences starting before the window, that may still run into it
+    earlier = connection.zrangebyscore(
+        key, start_ms - info["max_duration"], f"({start_ms}"
+    )
+    sentences = [
+        (position, sentence)
+        for position, sentence in _decode(earlier)
+        if (sentence.get("end_time") or 0) > start_ms
+    ]
+    members = connection.zrangebyscore(
+        key, start_ms, f"({end_ms}", start=0, num=max(limit - len(sentences), 0)
+    )
+    return (sentences + _decode(members))[:limit]
+
+
+def get_sentence_page(
+    connection, job_id: str, offset: int, limit: int
+) -> List[Tuple[int, dict]]:
+    """
+    Get limit sentences of a job, starting at position offset.
+
+    Args:
+        connection (Redis): Redis connection.
+        job_id (str): ID of the job.
+        offset (int): Position of the first sentence.
+        limit (int): Number of sentences.
+    Returns:
+        List[Tuple[int, dict]]: (position, sentence) of each sentence, in order.
+    """
+    members = connection.zrange(
+        INDEX_KEY.format(job_id=job_id), offset, offset + limit - 1
+    )
+    return _decode(members)
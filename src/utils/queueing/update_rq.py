@@ -1,9 +1,39 @@
+from contextlib import contextmanager
 from rq import get_current_job
+from utils.queueing.job_events import publish_job_event
+import threading
+
+# RQ only knows the current job in the thread that runs it. Threads started by the
+# job can bind it (see job_context), so they can update its status and meta too.
+_bound = threading.local()
+_meta_lock = threading.Lock()
+
+
+def get_job():
+    """Get the RQ job run by this thread, or bound to it. None outside of a job."""
+    return get_current_job() or getattr(_bound, "job", None)
+
+
+@contextmanager
+def job_context(rq_job):
+    """
+    Bind a job to the current thread, so update_job_status and update_job_meta
+    can be used by helper threads of the job.
+
+    Args:
+        rq_job (rq.job.Job): The job (None binds nothing).
+    """
+    previous = getattr(_bound, "job", None)
+    _bound.job = rq_job
+    try:
+        yield rq_job
+    finally:
+        _bound.job = previous
 
 
 def update_job_status(progress: str, message: str) -> None:
     """
-    Update the status of the current job.
+    Update the status of the current job and publish it to the job's event channel.
     If the job is not found, do nothing.
 
     Args:
@@ -13,9 +43,32 @@ def update_job_status(progress: str, message: str) -> None:
     Returns:
         None
     """
-    rq_job = get_current_job()
+    rq_job = get_job()
+    if not rq_job:
+        return
+    with _meta_lock:
+        rq_job.meta["progress"] = progress
+        rq_job.meta["message"] = message
+        rq_job.save_meta()
+    publish_job_event(
+        rq_job.connection, rq_job.id, {"progress": progress, "message": message}
+    )
+
+
+def update_job_meta(**fields) -> None:
+    """
+    Save extra fields (e.g. statistics) in the meta of the current job.
+    If the job is not found, do nothing.
+
+    Args:
+        **fields: The fields to save.
+
+    Returns:
+        None
+    """
+    rq_job = get_job()
     if not rq_job:
         return
-    rq_job.meta["progress"] = progress
-    rq_job.meta["message"] = message
-    rq_job.save_meta()
+    with _meta_lock:
+        rq_job.meta.update(fields)
+        rq_job.save_meta()
@@ -1,8 +1,22 @@
 from rq import get_current_job
 from utils.queueing.jobs import Job
-from utils.transcription.transcribe_full import transcribe_and_diarize
+from utils.transcription.transcribe_full import (
+    transcribe_and_diarize,
+    clear_checkpoints,
+)
 from utils.transcription.download_utils import download_and_convert_to_mp3
 from utils.analyze.analyze_audio import analyze_audio
+from utils.export.parquet_export import export_jobs
+from utils.summarize.summarize_transcript import request_transcript_summary
+from utils.categorize.categorize_transcript import (
+    categorize_transcript,
+    categorize_list_of_questions,
+)
+from utils.categorize.extract_questions import Question
+from utils.queueing.update_rq import update_job_meta, update_job_status
+from utils.queueing.job_events import publish_job_finished
+from utils.queueing.transcript_index import index_job_transcript
+from utils.search_index import index_finished_job
 import traceback
 import logging
 
@@ -27,8 +41,6 @@ def process_job(job_pickle: str):
 
     job_queue.meta["job_type"] = job.type
     job_queue.meta["job_id"] = job.job_id
-    job_queue.meta["progress"] = "assigning_worker"
-    job_queue.meta["message"] = "Job assigned to worker"
     # try to get job info
     try:
         job_info = job.job_info
@@ -46,16 +58,16 @@ def process_job(job_pickle: str):
     if "data" in job_info:
         job_queue.meta["data"] = job_info["data"]
 
-    job_queue.save_meta()
+    # Saves the meta above and notifies the job's event stream
+    update_job_status("assigning_worker", "Job assigned to worker")
 
     try:
         if job.type == "transcription":
             # Perform the transcription
             if job_info.get("url"):
-                rq_job = get_current_job()
-                rq_job.meta["progress"] = "downloading"
-                rq_job.meta["message"] = "Downloading YouTube and converting to mp3"
-                rq_job.save_meta()
+                update_job_status(
+                    "downloading", "Downloading YouTube and converting to mp3"
+                )
 
                 audio_path, title, date = download_and_convert_to_mp3(
                     job_info["url"], "raw_audio", job.job_id
@@ -63,28 +75,42 @@ def process_job(job_pickle: str):
                 job_info["audio_path"] = audio_path
                 job_info["title"] = title
                 job_info["date"] = date
+                # Enqueued without a title, shown by the job and batch statuses
+                update_job_meta(title=title)
 
-                rq_job.meta["progress"] = "transcribing"
-                rq_job.meta["message"] = "Transcribing audio"
-                rq_job.save_meta()
+                update_job_status("transcribing", "Transcribing audio")
 
                 job.job_info = job_info
             result = transcribe_and_diarize(job)
             return result
 
         if job.type == "summarization":
-            # result = summarize_transcript(job)
-            # return result
-            pass
+            update_job_status("summarizing", "Summarizing transcript")
+            result = request_transcript_summary(job_info["transcript"])
+            update_job_status("completed", "Summarization completed")
+            return result
 
         if job.type == "categorization":
-            # result = categorize_transcript(job)
-            # return result
-            pass
+            update_job_status("categorizing_questions", "Categorizing questions")
+            if job_info.get("questions") is not None:
+                questions = categorize_list_of_questions(
+                    [Question(**question) for question in job_info["questions"]]
+                )
+            else:
+                questions = categorize_transcript(job_info["transcript"])
+            update_job_status("completed", "Categorization completed")
+            return [question.to_dict() for question in questions]
+
         if job.type == "analyze":
             result = analyze_audio(job)
             return result
 
+        if job.type == "export":
+            update_job_status("exporting", "Exporting jobs to Parquet")
+            result = export_jobs(job_queue.connection, job_info.get("job_ids"))
+            update_job_status("completed", "Export completed")
+            return result
+
     except Exception:
         job.status = "error"
         job.result = f"Error: {traceback.format_exc()}"
@@ -92,3 +118,23 @@ def process_job(job_pickle: str):
         job_queue.meta["message"] = job.result
         job_queue.save_meta()
         raise Exception(f"Error: {traceback.format_exc()}")
+
+
+def handle_job_success(job, connection, result, *args, **kwargs):
+    """
+    RQ on_success callback. Clean up after a job, index its transcript for
+    /jobs/transcript and /search, and tell its listeners it has finished.
+
+    Args:
+        job (rq.job.Job): The finished RQ job.
+        connection (Redis): Redis connection of the worker.
+        result: Return value of process_job.
+    """
+    try:
+        clear_checkpoints(job.id)
+    except Exception as e:
+        logging.warning(f"Could not clear checkpoints of job {job.id}: {str(e)}")
+
+    index_job_transcript(connection, job, result)
+    index_finished_job(job, result)
+    publish_job_finished(job, connection, result)
@@ -0,0 +1,416 @@
+# Supervises a pool of RQ workers on this machine.
+#
+# To start the supervisor from the src directory:
+#    python -m utils.queueing.worker_supervisor
+# To try it against a throwaway Redis:
+#    redis-server --port 6390 --save "" &
+#    python -m utils.queueing.worker_supervisor --redis-url redis://localhost:6390/0
+# To print the metrics of the running supervisors:
+#    python -m utils.queueing.worker_supervisor --status
+
+from dataclasses import dataclass, field
+from redis import Redis
+from rq import Queue, Worker
+from typing import List, Optional
+import argparse
+import glob
+import json
+import logging
+import math
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+import uuid
+
+import psutil
+
+from config import worker_config
+
+# Workers get unique names (see spawn): RQ refuses to start two active workers with
+# the same name, so it is not set in worker_config
+WORKER_NAME_PREFIX = "service-worker"
+
+# Metrics of every supervisor are stored under this prefix, one key per host
+METRICS_KEY_PREFIX = "classifai:supervisor:"
+
+# The src directory, which RQ workers are started from
+SRC_DIRECTORY = os.path.dirname(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+)
+
+
+def get_numa_nodes() -> dict:
+    """
+    Get the CPUs of each NUMA node of this machine.
+
+    Returns:
+        dict: {node: [cpu, ...]}. Empty if the machine has a single node.
+    """
+    nodes = {}
+    for node_path in glob.glob("/sys/devices/system/node/node[0-9]*"):
+        node = int(os.path.basename(node_path)[len("node") :])
+        try:
+            with open(os.path.join(node_path, "cpulist")) as f:
+                nodes[node] = parse_cpu_list(f.read())
+        except OSError:
+            continue
+    return nodes if len(nodes) > 1 else {}
+
+
+def parse_cpu_list(cpu_list: str) -> List[int]:
+    """Parse a Linux CPU list like '0-3,8-11'."""
+    cpus = []
+    for part in cpu_list.strip().split(","):
+        if "-" in part:
+            first, last = part.split("-")
+            cpus.extend(range(int(first), int(last) + 1))
+        elif part:
+            cpus.append(int(part))
+    return cpus
+
+
+@dataclass
+class ManagedWorker:
+    """
+    A worker process started by the supervisor.
+
+    Attributes:
+        name (str): RQ name of the worker.
+        slot (int): Slot of the worker, which decides its CPUs and NUMA node.
+        cpus (list): CPUs the worker is pinned to.
+        numa_node (int): NUMA node the worker's memory is bound to, if any.
+        process (subprocess.Popen): The worker process.
+        started_at (float): Time the worker was started.
+        draining (bool): Whether the worker was asked to stop after its current job.
+        restarts (int): Times a worker in this slot has crashed and been restarted.
+    """
+
+    name: str
+    slot: int
+    cpus: List[int]
+    numa_node: Optional[int]
+    process: subprocess.Popen
+    started_at: float = field(default_factory=time.time)
+    draining: bool = False
+    restarts: int = 0
+
+
+class WorkerSupervisor:
+    """
+    Keeps the right number of RQ workers running for the current queue depth.
+
+    - Scales between MIN_WORKERS and MAX_WORKERS: one worker per running job, plus
+      one per JOBS_PER_WORKER queued jobs, as long as there is WORKER_MEMORY_MB of
+      free memory for each new worker.
+    - Scales down by draining idle workers (warm shutdown), so no job is killed mid-run.
+    - Restarts workers that crashed.
+    - Pins each worker to its own CPUs, and to a NUMA node when the machine has several.
+    - Publishes worker state and utilization as JSON to Redis (and optionally a file).
+
+    Args:
+        redis_url (str): URL of the Redis server the workers listen on.
+        queues (list): Names of the queues to work on.
+        metrics_file (str, optional): Also write the metrics to this file.
+    """
+
+    def __init__(self, redis_url: str, queues: list, metrics_file: str = None):
+        self.redis_url = redis_url
+        self.connection = Redis.from_url(redis_url)
+        self.queues = [Queue(name, connection=self.connection) for name in queues]
+        self.metrics_file = metrics_file
+        self.hostname = socket.gethostname()
+
+        self.min_workers = worker_config.MIN_WORKERS
+        self.max_workers = worker_config.MAX_WORKERS
+        self.jobs_per_worker = worker_config.JOBS_PER_WORKER
+        self.worker_memory_mb = worker_config.WORKER_MEMORY_MB
+        self.scale_down_delay = worker_config.SCALE_DOWN_DELAY
+        self.poll_interval = worker_config.SUPERVISOR_POLL_INTERVAL
+
+        self.workers: List[ManagedWorker] = []
+        self.numa_nodes = get_numa_nodes()
+        self.use_numactl = bool(self.numa_nodes) and shutil.which("numactl")
+        self.last_busy_time = time.time()
+        self.stopping = False
+
+    def run(self) -> None:
+        """Supervise the workers until SIGINT or SIGTERM, then drain them all."""
+        signal.signal(signal.SIGINT, self._request_stop)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        logging.info(f"Supervising workers for queues {self.queue_names()}")
+
+        while not self.stopping:
+            self.supervise()
+            time.sleep(self.poll_interval)
+
+        logging.info("Draining all workers...")
+        for worker in self.workers:
+            self.drain(worker)
+        for worker in self.workers:
+            worker.process.wait()
+        self.connection.delete(METRICS_KEY_PREFIX + self.hostname)
+
+    def supervise(self) -> None:
+        """Run one supervision round: reap, restart, scale and publish metrics."""
+        self.reap()
+        rq_workers = self.get_rq_workers()
+        desired = self.desired_workers(rq_workers)
+        active = [worker for worker in self.workers if not worker.draining]
+
+        if len(active) < desired:
+            for _ in range(desired - len(active)):
+                self.spawn()
+        elif len(active) > desired and self._can_scale_down():
+            idle = [
+                worker
+                for worker in active
+                if rq_workers.get(worker.name) is not None
+                and rq_workers[worker.name].get_state() == "idle"
+            ]
+            for worker in idle[: len(active) - desired]:
+                self.drain(worker)
+
+        self.publish_metrics(rq_workers, desired)
+
+    def queue_names(self) -> list:
+        return [queue.name for queue in self.queues]
+
+    def queue_depth(self) -> int:
+        """Number of jobs waiting in the queues."""
+        return sum(queue.count for queue in self.queues)
+
+    def get_rq_workers(self) -> dict:
+        """RQ's view of the workers started by this supervisor, by name."""
+        names = {worker.name for worker in self.workers}
+        return {
+            worker.name: worker
+            for worker in Worker.all(connection=self.connection)
+            if worker.name in names
+        }
+
+    def desired_workers(self, rq_workers: dict) -> int:
+        """
+        Number of workers needed for the current load.
+
+        Args:
+            rq_workers (dict): RQ workers started by this supervisor, by name.
+        Returns:
+            int: Desired number of (non-draining) workers.
+        """
+        busy = sum(1 for worker in rq_workers.values() if worker.get_state() == "busy")
+        depth = self.queue_depth()
+        if busy or depth:
+            self.last_busy_time = time.time()
+
+        desired = busy + math.ceil(depth / self.jobs_per_worker)
+        desired = max(self.min_workers, min(self.max_workers, desired))
+
+        # Only start new workers if there is memory left for them
+        active = sum(1 for worker in self.workers if not worker.draining)
+        if desired > active:
+            free_mb = psutil.virtual_memory().available / (1024 * 1024)
+            affordable = int(free_mb // self.worker_memory_mb)
+            if active + affordable < desired:
+                logging.warning(f"Not enough free memory for {desired} workers")
+                desired = max(active + affordable, self.min_workers)
+        return desired
+
+    def _can_scale_down(self) -> bool:
+        # Wait for the queues to stay empty for a while, so the pool does not flap
+        return time.time() - self.last_busy_time >= self.scale_down_delay
+
+    def spawn(self, slot: int = None, restarts: int = 0) -> ManagedWorker:
+        """
+        Start a worker process.
+
+        Args:
+            slot (int, optional): Slot to start the worker in (default: lowest free slot).
+            restarts (int, optional): Restart count carried over from a crashed worker.
+        Returns:
+            ManagedWorker: The started worker.
+        """
+        if slot is None:
+            used = {worker.slot for worker in self.workers}
+            slot = min(set(range(len(used) + 1)) - used)
+
+        numa_node, cpus = self.plan_affinity(slot)
+        name = f"{WORKER_NAME_PREFIX}-{self.hostname}-{slot}-{uuid.uuid4().hex[:6]}"
+
+        command = [sys.executable, "-m", "rq.cli", "worker"]
+        command += ["-c", "config.worker_config", "--url", self.redis_url]
+        command += ["--name", name, "--worker-class", worker_config.WORKER_CLASS]
+        command += self.queue_names()
+        if self.use_numactl and numa_node is not None:
+            # Keep the worker's memory on the same NUMA node as its CPUs
+            numactl = [
+                "numactl",
+                f"--cpunodebind={numa_node}",
+                f"--membind={numa_node}",
+            ]
+            command = numactl + command
+
+        process = subprocess.Popen(
+            command,
+            cwd=SRC_DIRECTORY,
+            preexec_fn=lambda: os.sched_setaffinity(0, cpus),
+        )
+        worker = ManagedWorker(name, slot, cpus, numa_node, process, restarts=restarts)
+        self.workers.append(worker)
+        logging.info(f"Started worker {name} (PID {process.pid}) on CPUs {cpus}")
+        return worker
+
+    def plan_affinity(self, slot: int) -> tuple:
+        """
+        Choose the NUMA node and CPUs of a worker slot. Slots are spread over the NUMA
+        nodes, and the CPUs of a node are split evenly between its slots.
+
+        Args:
+            slot (int): Slot of the worker.
+        Returns:
+            tuple: (numa_node or None, list of CPUs)
+        """
+        if self.numa_nodes:
+            nodes = sorted(self.numa_nodes)
+            numa_node = nodes[slot % len(nodes)]
+            cpus = self.numa_nodes[numa_node]
+            index = slot // len(nodes)
+            slots_per_node = math.ceil(self.max_workers / len(nodes))
+        else:
+            numa_node = None
+            cpus = sorted(os.sched_getaffinity(0))
+            index = slot
+            slots_per_node = self.max_workers
+
+        per_worker = max(1, len(cpus) // slots_per_node)
+        return numa_node, cpus[index * per_worker : (index + 1) * per_worker] or cpus
+
+    def drain(self, worker: ManagedWorker) -> None:
+        """Ask a worker to stop once its current job is done (RQ warm shutdown)."""
+        if worker.draining or worker.process.poll() is not None:
+            return
+        worker.draining = True
+        # A single SIGTERM is a warm shutdown
+        worker.process.send_signal(signal.SIGTERM)
+        logging.info(f"Draining worker {worker.name}")
+
+    def reap(self) -> None:
+        """Remove workers that exited, and restart the ones that crashed."""
+        for worker in list(self.workers):
+            return_code = worker.process.poll()
+            if return_code is None:
+                continue
+            self.workers.remove(worker)
+            if worker.draining or self.stopping:
+                logging.info(f"Worker {worker.name} stopped")
+                continue
+
+            logging.warning(
+                f"Worker {worker.name} exited with code {return_code}, restarting it"
+            )
+            self.spawn(slot=worker.slot, restarts=worker.restarts + 1)
+
+    def metrics(self, rq_workers: dict, desired: int) -> dict:
+        """
+        Machine-readable state of the pool.
+
+        Args:
+            rq_workers (dict): RQ workers started by this supervisor, by name.
+            desired (int): Desired number of workers.
+        Returns:
+            dict: Pool and per-worker metrics.
+        """
+        workers = []
+        for worker in self.workers:
+            rq_worker = rq_workers.get(worker.name)
+            workers.append(
+                {
+                    "name": worker.name,
+                    "pid": worker.process.pid,
+                    "slot": worker.slot,
+                    "cpus": worker.cpus,
+                    "numa_node": worker.numa_node,
+                    "state": rq_worker.get_state() if rq_worker else "starting",
+                    "draining": worker.draining,
+                    "current_job": rq_worker.get_current_job_id()
+                    if rq_worker
+                    else None,
+                    "successful_jobs": rq_worker.successful_job_count
+                    if rq_worker
+                    else 0,
+                    "failed_jobs": rq_worker.failed_job_count if rq_worker else 0,
+                    "working_time": rq_worker.total_working_time if rq_worker else 0,
+                    "uptime": round(time.time() - worker.started_at, 2),
+                    "restarts": worker.restarts,
+                }
+            )
+
+        busy = sum(1 for worker in workers if worker["state"] == "busy")
+        return {
+            "hostname": self.hostname,
+            "supervisor_pid": os.getpid(),
+            "time": round(time.time(), 2),
+            "queues": self.queue_names(),
+            "queue_depth": self.queue_depth(),
+            "desired_workers": desired,
+            "workers_running": len(workers),
+            "workers_busy": busy,
+            "utilization": round(busy / len(workers), 3) if workers else 0,
+            "available_memory_mb": round(psutil.virtual_memory().available / 2**20),
+            "workers": workers,
+        }
+
+    def publish_metrics(self, rq_workers: dict, desired: int) -> None:
+        """Store the metrics in Redis, and in the metrics file if one was given."""
+        metrics = json.dumps(self.metrics(rq_workers, desired))
+        self.connection.set(
+            METRICS_KEY_PREFIX + self.hostname, metrics, ex=self.poll_interval * 3
+        )
+        if self.metrics_file:
+            temp_path = self.metrics_file + ".tmp"
+            with open(temp_path, "w") as f:
+                f.write(metrics)
+            os.replace(temp_path, self.metrics_file)
+
+    def _request_stop(self, signum, frame) -> None:
+        self.stopping = True
+
+
+def get_supervisor_metrics(connection: Redis) -> list:
+    """
+    Get the latest metrics of every running supervisor.
+
+    Args:
+        connection (Redis): Redis connection.
+    Returns:
+        list: Metrics dictionaries, one per supervisor.
+    """
+    keys = list(connection.scan_iter(match=METRICS_KEY_PREFIX + "*"))
+    return (
+        [json.loads(value) for value in connection.mget(keys) if value] if keys else []
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s"
+    )
+    parser = argparse.ArgumentParser(description="Supervise a pool of RQ workers")
+    parser.add_argument(
+        "--redis-url", default=worker_config.REDIS_URL, help="Redis server to use"
+    )
+    parser.add_argument("--metrics-file", help="Also write the metrics to this file")
+    parser.add_argument(
+        "--status", action="store_true", help="Print the supervisors' metrics and exit"
+    )
+    args = parser.parse_args()
+
+    if args.status:
+        print(
+            json.dumps(get_supervisor_metrics(Redis.from_url(args.redis_url)), indent=2)
+        )
+    else:
+        WorkerSupervisor(args.redis_url, worker_config.QUEUES, args.metrics_file).run()
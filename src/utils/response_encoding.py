@@ -0,0 +1,110 @@
+from typing import Tuple
+import gzip
+import json
+
+from flask import Response
+
+from config import config
+
+try:
+    import orjson
+except ImportError:  # Optional, the standard json module is used instead
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Content encodings we can produce, in order of preference
+SUPPORTED_ENCODINGS = (["zstd"] if zstandard else []) + ["gzip"]
+
+
+def dumps(value) -> bytes:
+    """
+    Serialize a value to compact JSON, with orjson if it is installed.
+
+    Args:
+        value: JSON serializable value.
+    Returns:
+        bytes: The UTF-8 encoded JSON.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(
+                value, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+            )
+        except TypeError:
+            pass  # e.g. a type orjson does not know, let json try (and report it)
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def negotiate_encoding(accept_encodings) -> str:
+    """
+    Pick the content encoding of a response from the request's Accept-Encoding.
+
+    Args:
+        accept_encodings (Accept): request.accept_encodings (None: no compression).
+    Returns:
+        str: "zstd", "gzip" or "identity".
+    """
+    if not accept_encodings:
+        return "identity"
+    encoding = accept_encodings.best_match(SUPPORTED_ENCODINGS)
+    if encoding is None or accept_encodings[encoding] <= 0:  # e.g. "gzip;q=0"
+        return "identity"
+    return encoding
+
+
+def compress(body: bytes, encoding: str) -> Tuple[bytes, str]:
+    """
+    Compress a response body. Bodies smaller than RESPONSE_COMPRESSION_MIN_BYTES are
+    not worth it and are left as they are.
+
+    Args:
+        body (bytes): The body.
+        encoding (str): "zstd", "gzip" or "identity".
+    Returns:
+        Tuple[bytes, str]: The body and the encoding it ended up with.
+    """
+    if len(body) < config.RESPONSE_COMPRESSION_MIN_BYTES:
+        return body, "identity"
+    if encoding == "zstd" and zstandard is not None:
+        compressor = zstandard.ZstdCompressor(level=config.RESPONSE_ZSTD_LEVEL)
+        return compressor.compress(body), "zstd"
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=config.RESPONSE_GZIP_LEVEL), "gzip"
+    return body, "identity"
+
+
+def encoded_response(body: bytes, encoding: str, status: int = 200) -> Response:
+    """
+    Make a JSON response from an already serialized (and compressed) body.
+
+    Args:
+        body (bytes): The body, as returned by compress.
+        encoding (str): The encoding of the body.
+        status (int): HTTP status code.
+    Returns:
+        Response: The response.
+    """
+    response = Response(body, status=status, mimetype="application/json")
+    if encoding != "identity":
+        response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+def json_response(value, accept_encodings, status: int = 200) -> Response:
+    """
+    Serialize a value and compress it as the client accepts, instead of jsonify.
+
+    Args:
+        value: JSON serializable value.
+        accept_encodings (Accept): request.accept_encodings (None: no compression).
+        status (int): HTTP status code.
+    Returns:
+        Response: The response.
+    """
+    body, encoding = compress(dumps(value), negotiate_encoding(accept_encodings))
+    return encoded_response(body, encoding, status)
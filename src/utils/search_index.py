@@ -0,0 +1,285 @@
+from typing import List
+import argparse
+import threading
+import logging
+import sqlite3
+import time
+import re
+import os
+
+from config import config
+from utils.cache_store import PROJECT_ROOT
+from utils.queueing.transcript_index import get_result_transcript
+
+# Terms and "quoted phrases" of a search query
+QUERY_TERM = re.compile(r'"([^"]+)"|(\w+)')
+
+# Max hits returned by one search
+MAX_SEARCH_RESULTS = 100
+
+
+def build_match_query(query: str) -> str:
+    """
+    Turn a user query into an FTS5 MATCH expression. Every term and "quoted phrase"
+    must appear; FTS5 operators and punctuation are ignored, so any input is valid.
+
+    Args:
+        query (str): The query, e.g. 'cell "cell wall"'.
+    Returns:
+        str: The MATCH expression, or "" if the query has no terms.
+    """
+    parts = []
+    for phrase, term in QUERY_TERM.findall(query):
+        words = re.findall(r"\w+", phrase or term)
+        if words:
+            parts.append('"' + " ".join(words) + '"')
+    return " ".join(parts)
+
+
+class SearchIndex:
+    """
+    Full-text index of the sentences of every finished transcription and analysis
+    job, in a local SQLite FTS5 database.
+
+    Each sentence is stored with its job, position, speaker and timestamps, and the
+    level of the question it asks, if any. Hits are ranked with bm25.
+
+    Args:
+        path (str): Path of the SQLite file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Connections cannot be shared across threads or forked processes
+        if getattr(self._local, "pid", None) != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS sentences USING fts5("
+                "text, job_id UNINDEXED, position UNINDEXED, speaker UNINDEXED, "
+                "start_time UNINDEXED, end_time UNINDEXED, level UNINDEXED, "
+                "tokenize = 'porter unicode61')"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS indexed_jobs ("
+                "job_id TEXT PRIMARY KEY, job_type TEXT, sentences INTEGER, "
+                "indexed REAL)"
+            )
+            connection.commit()
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return self._local.connection
+
+    def index_job(self, job_id: str, job_type: str, result) -> int:
+        """
+        Add (or replace) the sentences of a finished job.
+
+        Args:
+            job_id (str): ID of the job.
+            job_type (str): "transcription" or "analyze".
+            result: Result of the job.
+        Returns:
+            int: Number of sentences indexed (0 if the job has no transcript).
+        """
+        transcript = get_result_transcript(job_type, result)
+        if not transcript:
+            return 0
+
+        # Questions of analysis jobs carry the level of their sentence
+        levels = {}
+        if job_type == "analyze":
+            for question in result.get("questions") or []:
+                if question.get("level") is not None:
+                    key = (question.get("start_time"), question.get("question"))
+                    levels[key] = question["level"]
+
+        rows = [
+            (
+                sentence.get("text", ""),
+                job_id,
+                position,
+                sentence.get("speaker"),
+                sentence.get("start_time"),
+                sentence.get("end_time"),
+                levels.get((sentence.get("start_time"), sentence.get("text"))),
+            )
+            for position, sentence in enumerate(transcript)
+        ]
+
+        connection = self._connection()
+        with connection:
+            connection.execute("DELETE FROM sentences WHERE job_id = ?", (job_id,))
+            connection.executemany(
+                "INSERT INTO sentences VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO indexed_jobs VALUES (?, ?, ?, ?)",
+                (job_id, job_type, len(rows), time.time()),
+            )
+        return len(rows)
+
+    def is_indexed(self, job_id: str) -> bool:
+        """Whether the sentences of a job are in the index."""
+        row = (
+            self._connection()
+            .execute("SELECT 1 FROM indexed_jobs WHERE job_id = ?", (job_id,))
+            .fetchone()
+        )
+        return row is not None
+
+    def search(
+        self,
+        query: str,
+        speaker: str = None,
+        level: int = None,
+        job_id: str = None,
+        limit: int = 20,
+        offset: int = 0,
+    ) -> dict:
+        """
+        Search the sentences of every indexed job.
+
+        Args:
+            query (str): Terms and "quoted phrases" that must all appear.
+            speaker (str, optional): Only sentences of this speaker.
+            level (int, optional): Only questions of this level.
+            job_id (str, optional): Only sentences of this job.
+            limit (int): Max number of hits (at most MAX_SEARCH_RESULTS).
+            offset (int): Number of hits to skip, for paging.
+        Returns:
+            dict: {"total", "hits": [{"job_id", "position", "speaker", "start_time",
+                "end_time", "level", "text", "snippet", "score"}], "facets":
+                {"speaker": {speaker: count}, "level": {level: count}}}.
+                Facets count every hit of the query, ignoring the speaker and level
+                filters, so clients can show what the filters would return.
+        """
+        match = build_match_query(query)
+        if not match:
+            return {"total": 0, "hits": [], "facets": {"speaker": {}, "level": {}}}
+
+        where = "sentences MATCH ?"
+        params = [match]
+        if job_id is not None:
+            where += " AND job_id = ?"
+            params.append(job_id)
+
+        filtered = where
+        filter_params = list(params)
+        if speaker is not None:
+            filtered += " AND speaker = ?"
+            filter_params.append(speaker)
+        if level is not None:
+            filtered += " AND level = ?"
+            filter_params.append(level)
+
+        connection = self._connection()
+        rows = connection.execute(
+            "SELECT job_id, position, speaker, start_time, end_time, level, text, "
+            "snippet(sentences, 0, '<b>', '</b>', '...', 16) AS snippet, "
+            "bm25(sentences) AS rank "
+            f"FROM sentences WHERE {filtered} ORDER BY rank LIMIT ? OFFSET ?",
+            filter_params + [min(limit, MAX_SEARCH_RESULTS), offset],
+        ).fetchall()
+        total = connection.execute(
+            f"SELECT COUNT(*) FROM sentences WHERE {filtered}", filter_params
+        ).fetchone()[0]
+
+        facets = {}
+        for facet in ("speaker", "level"):
+            counts = connection.execute(
+                f"SELECT {facet}, COUNT(*) FROM sentences WHERE {where} "
+                f"AND {facet} IS NOT NULL GROUP BY {facet}",
+                params,
+            ).fetchall()
+            facets[facet] = {value: count for value, count in counts}
+
+        hits = []
+        for row in rows:
+            hit = dict(row)
+            # bm25 is lower for better matches, flip it so higher is better
+            hit["score"] = round(-hit.pop("rank"), 4)
+            hits.append(hit)
+        return {"total": total, "hits": hits, "facets": facets}
+
+
+_search_index = None
+
+
+def get_search_index() -> SearchIndex:
+    """Get the search index at config.SEARCH_INDEX_PATH."""
+    global _search_index
+    if _search_index is None:
+        _search_index = SearchIndex(
+            os.path.join(PROJECT_ROOT, config.SEARCH_INDEX_PATH)
+        )
+    return _search_index
+
+
+def index_finished_job(job, result) -> None:
+    """
+    Add the transcript of a finished job to the search index (RQ on_success callback
+    helper). Errors are logged, never raised.
+
+    Args:
+        job (rq.job.Job): The finished RQ job.
+        result: Return value of the job.
+    """
+    if not config.SEARCH_INDEX:
+        return
+    try:
+        count = get_search_index().index_job(job.id, job.meta.get("job_type"), result)
+        if count:
+            logging.info(f"Added {count} sentences of job {job.id} to the search index")
+    except Exception as e:
+        logging.warning(f"Could not add job {job.id} to the search index: {str(e)}")
+
+
+def index_finished_jobs(connection, reindex: bool = False) -> List[str]:
+    """
+    Add every finished job still in Redis to the search index, e.g. the jobs that
+    finished before the index existed.
+
+    Args:
+        connection (Redis): Redis connection.
+        reindex (bool): Also index again the jobs already in the index.
+    Returns:
+        List[str]: IDs of the jobs that were indexed.
+    """
+    from rq import Queue
+    from rq.job import Job as RQJob
+
+    search_index = get_search_index()
+    job_ids = Queue("jobs", connection=connection).finished_job_registry.get_job_ids()
+    indexed = []
+    for job_id in job_ids:
+        if not reindex and search_index.is_indexed(job_id):
+            continue
+        try:
+            rqjob = RQJob.fetch(job_id, connection=connection)
+            if search_index.index_job(job_id, rqjob.meta.get("job_type"), rqjob.result):
+                indexed.append(job_id)
+        except Exception as e:
+            logging.warning(f"Could not add job {job_id} to the search index: {str(e)}")
+    return indexed
+
+
+if __name__ == "__main__":
+    import redis
+
+    parser = argparse.ArgumentParser(
+        description="Add the finished jobs in Redis to the search index"
+    )
+    parser.add_argument(
+        "--reindex", action="store_true", help="Also reindex the indexed jobs"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    connection = redis.Redis(host="localhost", port=os.getenv("REDIS_PORT"), db=0)
+    indexed = index_finished_jobs(connection, reindex=args.reindex)
+    print(f"Indexed {len(indexed)} jobs into {get_search_index().path}")
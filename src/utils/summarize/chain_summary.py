@@ -1,71 +1,226 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Union
+import hashlib
+import logging
 import re
 
-MAX_TOKENS = 8000
+from utils.tokenization import count_tokens
+from utils.cache_store import get_cache_store
+from config.config import (
+    SUMMARIZATION_MODEL,
+    SUMMARY_CHUNK_TOKENS,
+    SUMMARY_CONCURRENCY,
+    SUMMARY_PROMPT_VERSION,
+    SUMMARY_CACHE,
+    SUMMARY_CACHE_TTL,
+    SUMMARY_CACHE_MAX_ENTRIES,
+)
+
+# Sentence ends, ignoring abbreviations like "e.g." and "Dr."
+SENTENCE_BOUNDARY = re.compile(r"(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|!)\s+")
+
+# Memoized summaries, so an edited transcript only re-summarizes the changed chunks
+summary_cache = (
+    get_cache_store("summaries", SUMMARY_CACHE_TTL, SUMMARY_CACHE_MAX_ENTRIES)
+    if SUMMARY_CACHE
+    else None
+)
+
+
+def split_into_sentences(text: str) -> List[str]:
+    """Split a text into sentences."""
+    return [sentence for sentence in SENTENCE_BOUNDARY.split(text.strip()) if sentence]
+
+
+def split_text_into_chunks(
+    text: Union[str, Iterable[str]], max_tokens: int = SUMMARY_CHUNK_TOKENS
+) -> List[str]:
+    """
+    Split a text into chunks of whole sentences of at most max_tokens tokens.
 
+    Chunk boundaries depend on the content, not only on the position: once a chunk
+    holds half the budget, it ends after the first sentence whose hash ends with three
+    zero bits. An edit therefore only moves the boundaries around it, and the other
+    chunks (and their cached summaries) stay the same.
+    A sentence longer than max_tokens is split on words.
 
-def split_text_into_chunks(text, max_tokens):
-    # Split text into chunks with a maximum number of tokens
-    sentences = re.split(r"(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?)\s", text)
+    Args:
+        text (str or Iterable[str]): The text, or its sentences.
+        max_tokens (int, optional): Max tokens in a chunk (default: config.SUMMARY_CHUNK_TOKENS).
+    Returns:
+        List[str]: The chunks.
+    """
+    sentences = split_into_sentences(text) if isinstance(text, str) else text
     chunks = []
-    current_chunk = ""
+    chunk, chunk_tokens = [], 0
 
     for sentence in sentences:
-        if len(current_chunk) + len(sentence) < max_tokens:
-            current_chunk += sentence + " "
-        else:
-            chunks.append(current_chunk.strip())
-            current_chunk = sentence + " "
-
-    if current_chunk:
-        chunks.append(current_chunk.strip())
-
+        for part, tokens in split_long_sentence(sentence, max_tokens):
+            if chunk and chunk_tokens + tokens > max_tokens:
+                chunks.append(" ".join(chunk))
+                chunk, chunk_tokens = [], 0
+            chunk.append(part)
+            chunk_tokens += tokens
+
+            if chunk_tokens >= max_tokens // 2 and is_content_boundary(part):
+                chunks.append(" ".join(chunk))
+                chunk, chunk_tokens = [], 0
+
+    if chunk:
+        chunks.append(" ".join(chunk))
     return chunks
 
 
-def summarize_content(content, max_tokens):
-    # Implement your summarization function here
-    # This could be your GPT-4 summarization model or any other summarization approach
-    # For simplicity, let's just return the first sentence of each chunk here
-    return [chunk.split(".")[0] for chunk in content]
+def split_long_sentence(sentence: str, max_tokens: int):
+    """Yield (part, tokens) pairs, splitting a sentence over max_tokens on words."""
+    tokens = count_tokens(sentence)
+    if tokens <= max_tokens:
+        yield sentence, tokens
+        return
 
+    part, part_tokens = [], 0
+    for word in sentence.split():
+        word_tokens = count_tokens(" " + word)
+        if part and part_tokens + word_tokens > max_tokens:
+            yield " ".join(part), part_tokens
+            part, part_tokens = [], 0
+        part.append(word)
+        part_tokens += word_tokens
+    if part:
+        yield " ".join(part), part_tokens
 
-def summarize_content_long(
-    transcript: str, OPENAI_API_KEY: str, max_tokens: int = 8000, **kwargs
-) -> str:
-    """Summarize the transcript into a short summary. Uses Chunking and GPT-4 for long transcripts.
 
-    Args:
-        transcript (str): The transcript to summarize.
-        OPENAI_API_KEY (str): The OpenAI API key.
-        max_tokens (int, optional): The maximum number of tokens to use for the summary. Defaults to 8000.
-        **kwargs: Additional keyword arguments.
-            - text_model (str): The text model to use for summarization. Defaults to "gpt-4-1106-preview",
-            - temperature (float): The temperature to use for summarization. Defaults to 0.7.
+def is_content_boundary(sentence: str) -> bool:
+    return hashlib.sha1(sentence.encode()).digest()[-1] & 0b111 == 0
 
-    Returns:
-        str: The summary of the transcript.
 
-    Raises:
-        ValueError: If the transcript is empty.
+class ChainSummarizer:
+    """
+    Map-reduce summarizer for texts longer than what the model can take at once.
 
+    The text is split into chunks of whole sentences (see split_text_into_chunks),
+    the chunks are summarized concurrently, and their summaries are combined the same
+    way, level by level, until they fit in one final request. Every summary is
+    memoized by the text it summarizes.
+
+    Args:
+        summarize (Callable): Summarizes one text. Must raise on failure, so errors
+            are never memoized.
+        max_tokens (int, optional): Max tokens sent in one request (default: config.SUMMARY_CHUNK_TOKENS).
+        concurrency (int, optional): Requests sent at the same time (default: config.SUMMARY_CONCURRENCY).
     """
 
-    chunks = split_text_into_chunks(transcript, max_tokens=MAX_TOKENS)
-
-    if len(chunks) == 1:
-        # If there is only one chunk, use its summary directly
-        return summarize_content(
-            chunks[0], OPENAI_API_KEY, max_tokens=MAX_TOKENS, **kwargs
-        )
-    else:
-        # Summarize each chunk
-        chunk_summaries = [summarize_content(chunk, MAX_TOKENS) for chunk in chunks]
-
-        # Combine chunk summaries and summarize the combined content
-        combined_summary = summarize_content(
-            " ".join([" ".join(chunk_summary) for chunk_summary in chunk_summaries]),
-            MAX_TOKENS,
-        )
-
-    # Print the final summary
-    print(" ".join(combined_summary))
+    def __init__(
+        self,
+        summarize: Callable[[str], str],
+        max_tokens: int = SUMMARY_CHUNK_TOKENS,
+        concurrency: int = SUMMARY_CONCURRENCY,
+    ):
+        self.summarize_text = summarize
+        self.max_tokens = max_tokens
+        self.concurrency = concurrency
+
+    def summarize(self, text: Union[str, Iterable[str]]) -> str:
+        """
+        Summarize a text of any length.
+
+        Args:
+            text (str or Iterable[str]): The text, or its sentences (e.g. streamed
+                from a transcript).
+        Returns:
+            str: The summary.
+        """
+        final_text = self.reduce(text)
+        return self.summarize_chunk(final_text) if final_text else ""
+
+    def stream(self, text: Union[str, Iterable[str]], stream_summary: Callable):
+        """
+        Summarize a text of any length, streaming the final summary.
+        The chunks are summarized as usual; only the final request is streamed.
+
+        Args:
+            text (str or Iterable[str]): The text, or its sentences.
+            stream_summary (Callable): Yields the summary of one text as it is generated.
+        Yields:
+            str: The next piece of the summary.
+        """
+        final_text = self.reduce(text)
+        if not final_text:
+            return
+
+        key = get_summary_key(final_text)
+        cached = summary_cache.get(key) if summary_cache is not None else None
+        if cached is not None:
+            yield cached
+            return
+
+        pieces = []
+        for piece in stream_summary(final_text):
+            pieces.append(piece)
+            yield piece
+        if summary_cache is not None:
+            summary_cache.set(key, "".join(pieces))
+
+    def reduce(self, text: Union[str, Iterable[str]]) -> str:
+        """
+        Summarize the chunks of a text, level by level, until what is left fits in
+        one request.
+
+        Args:
+            text (str or Iterable[str]): The text, or its sentences.
+        Returns:
+            str: The text of the final request ("" for an empty text).
+        """
+        chunks = split_text_into_chunks(text, self.max_tokens)
+        level = 0
+        while len(chunks) > 1:
+            logging.info(f"Summarizing {len(chunks)} chunks (level {level})")
+            summaries = self.summarize_chunks(chunks)
+            # Group the summaries into requests of at most max_tokens for the next level
+            chunks = self.group(summaries)
+            level += 1
+        return chunks[0] if chunks else ""
+
+    def summarize_chunks(self, chunks: List[str]) -> List[str]:
+        """Summarize chunks concurrently, in order."""
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            return list(executor.map(self.summarize_chunk, chunks))
+
+    def summarize_chunk(self, chunk: str) -> str:
+        """Summarize a chunk, or return its memoized summary."""
+        key = get_summary_key(chunk)
+        if summary_cache is not None:
+            cached = summary_cache.get(key)
+            if cached is not None:
+                return cached
+
+        summary = self.summarize_text(chunk)
+        if summary_cache is not None:
+            summary_cache.set(key, summary)
+        return summary
+
+    def group(self, summaries: List[str]) -> List[str]:
+        groups = []
+        group, group_tokens = [], 0
+        for summary in summaries:
+            tokens = count_tokens(summary)
+            if group and group_tokens + tokens > self.max_tokens:
+                groups.append("\n\n".join(group))
+                group, group_tokens = [], 0
+            group.append(summary)
+            group_tokens += tokens
+        if group:
+            groups.append("\n\n".join(group))
+
+        if len(groups) >= len(summaries) > 1:
+            # Every summary fills a request on its own: pair them up, or this never ends
+            groups = [
+                "\n\n".join(summaries[i : i + 2]) for i in range(0, len(summaries), 2)
+            ]
+        return groups
+
+
+def get_summary_key(text: str) -> str:
+    """Memoization key of the summary of a text (model and prompt version included)."""
+    key = f"{SUMMARIZATION_MODEL}|{SUMMARY_PROMPT_VERSION}|{text}"
+    return hashlib.sha256(key.encode()).hexdigest()
@@ -0,0 +1,100 @@
+from typing import List
+import logging
+
+import numpy as np
+
+from utils.tokenization import count_tokens
+from utils.queueing.update_rq import update_job_meta
+from config.config import EXTRACTIVE_TOKEN_BUDGET
+
+# TextRank settings
+DAMPING = 0.85
+ITERATIONS = 50
+
+
+def rank_sentences(sentences: List[str]) -> np.ndarray:
+    """
+    Score the sentences with TextRank: PageRank over a graph whose edges are the
+    TF-IDF cosine similarities of the sentences. Sentences that share content with
+    many others score high; filler and one-off remarks score low.
+
+    Args:
+        sentences (List[str]): The sentences.
+    Returns:
+        np.ndarray: One score per sentence.
+    """
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    vectorizer = TfidfVectorizer(stop_words="english", sublinear_tf=True)
+    try:
+        vectors = vectorizer.fit_transform(sentences)
+    except ValueError:  # Only stop words
+        return np.ones(len(sentences))
+
+    # Rows are L2-normalized, so the dot product is the cosine similarity
+    similarity = (vectors @ vectors.T).toarray()
+    np.fill_diagonal(similarity, 0)
+    weights = similarity.sum(axis=1, keepdims=True)
+    transition = np.divide(
+        similarity, weights, out=np.zeros_like(similarity), where=weights > 0
+    )
+
+    scores = np.full(len(sentences), 1 / len(sentences))
+    for _ in range(ITERATIONS):
+        scores = (1 - DAMPING) / len(sentences) + DAMPING * transition.T @ scores
+    return scores
+
+
+def condense_sentences(
+    sentences: List[str], token_budget: int = EXTRACTIVE_TOKEN_BUDGET
+) -> List[str]:
+    """
+    Keep the highest ranked sentences that fit in the token budget, in their
+    original order.
+
+    Args:
+        sentences (List[str]): The sentences.
+        token_budget (int, optional): Max tokens to keep (default: config.EXTRACTIVE_TOKEN_BUDGET).
+    Returns:
+        List[str]: The kept sentences.
+    """
+    tokens = [count_tokens(sentence) for sentence in sentences]
+    if sum(tokens) <= token_budget:
+        return list(sentences)
+
+    kept, kept_tokens = [], 0
+    for index in np.argsort(-rank_sentences(sentences), kind="stable"):
+        if kept_tokens + tokens[index] <= token_budget:
+            kept.append(index)
+            kept_tokens += tokens[index]
+    return [sentences[index] for index in sorted(kept)]
+
+
+def condense_transcript(
+    transcript: list, token_budget: int = EXTRACTIVE_TOKEN_BUDGET
+) -> str:
+    """
+    Condense a transcript to its most informative sentences before it is summarized.
+    The compression is saved in the job meta under "condensation".
+
+    Args:
+        transcript (list): Sentences from get_sentences_speaker_mapping ({"text", ...}).
+        token_budget (int, optional): Max tokens to keep (default: config.EXTRACTIVE_TOKEN_BUDGET).
+    Returns:
+        str: The kept sentences, joined like get_raw_transcript.
+    """
+    sentences = [line["text"].strip() for line in transcript if line["text"].strip()]
+    kept = condense_sentences(sentences, token_budget)
+
+    tokens_in = sum(count_tokens(sentence) for sentence in sentences)
+    tokens_out = sum(count_tokens(sentence) for sentence in kept)
+    stats = {
+        "sentences_in": len(sentences),
+        "sentences_out": len(kept),
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "compression_ratio": round(tokens_out / tokens_in, 3) if tokens_in else 1.0,
+    }
+    logging.info(f"Condensed transcript for summarization: {stats}")
+    update_job_meta(condensation=stats)
+    return " ".join(kept)
@@ -1,12 +1,47 @@
-import requests
+from typing import Iterator
 from dotenv import load_dotenv
-import os
+import requests
+import json
+
+from utils.llm_client import get_llm_client, LLMError
+from config.config import LLM_SUMMARIZE_READ_TIMEOUT
 
 
 # Load environment variables from .env file
 load_dotenv()
 
-API_URL = os.getenv("LLAMA_API_URL")
+# Shared with the categorization, so both see the same circuit breaker
+client = get_llm_client("llama")
+
+# Answers of LLAMA servers which do not implement POST /summarize/stream
+STREAM_UNSUPPORTED_STATUSES = (404, 405)
+
+
+def request_summary(text: str) -> str:
+    """
+    Summarize a text using the LLAMA API.
+
+    Args:
+        text (str): The text to summarize.
+
+    Returns:
+        str: The summary.
+
+    Raises:
+        LLMError: If LLAMA could not be reached or did not return a summary.
+    """
+    # Not hedged: summaries take tens of seconds, so hedging would generate most of
+    # them twice
+    response = client.post(
+        "/summarize",
+        {"text": text},
+        read_timeout=LLM_SUMMARIZE_READ_TIMEOUT,
+        hedge=False,
+    )
+    summary = response.json().get("response") if response.status_code == 200 else None
+    if not isinstance(summary, str):
+        raise LLMError(f"No summary returned (status {response.status_code})")
+    return summary
 
 
 def summarize_llama(text):
@@ -20,15 +55,68 @@ def summarize_llama(text):
         str: The summarized transcript.
     """
     try:
-        response = requests.post(f"{API_URL}/summarize", json={"text": text})
-
-        response_body = (
-            response.json().get("response")
-            if response.status_code == 200
-            else "Error Occured while accessing Summarization API"
-        )
-
-        return response_body
+        return request_summary(text)
 
     except Exception as e:
         return f"Error Occured while accessing Summarization API: {str(e)}"
+
+
+def stream_summary(text: str) -> Iterator[str]:
+    """
+    Summarize a text using the LLAMA API, yielding the summary as it is generated.
+
+    The streaming route answers with one piece of the summary per line, either as
+    plain text, as JSON ({"token": ...} or {"response": ...}), or as SSE "data:" lines.
+    LLAMA servers without the route get a POST /summarize instead, and the whole
+    summary is yielded at once.
+
+    Args:
+        text (str): The text to summarize.
+
+    Yields:
+        str: The next piece of the summary.
+
+    Raises:
+        LLMError: If LLAMA could not be reached or the stream broke off.
+    """
+    response = client.post(
+        "/summarize/stream",
+        {"text": text},
+        read_timeout=LLM_SUMMARIZE_READ_TIMEOUT,
+        stream=True,
+    )
+    if response.status_code in STREAM_UNSUPPORTED_STATUSES:
+        response.close()
+        yield request_summary(text)
+        return
+    with response:
+        if response.status_code != 200:
+            raise LLMError(
+                f"No summary stream returned (status {response.status_code})"
+            )
+        # Without a charset in the Content-Type, iter_lines would yield bytes
+        response.encoding = response.encoding or "utf-8"
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                token = parse_stream_line(line)
+                if token:
+                    yield token
+        except requests.RequestException as e:
+            raise LLMError(f"Summary stream broke off: {str(e)}") from e
+
+
+def parse_stream_line(line: str) -> str:
+    """Get the piece of the summary from a line of the streamed answer."""
+    if not line or line.startswith(":") or line.startswith("event:"):
+        return None
+    if line.startswith("data:"):
+        line = line[len("data:") :].strip()
+        if line == "[DONE]":
+            return None
+    try:
+        data = json.loads(line)
+    except ValueError:
+        return line
+    if isinstance(data, dict):
+        return data.get("token") or data.get("response") or data.get("text")
+    return str(data)
@@ -1,7 +1,17 @@
+from typing import Iterator
 import logging
-from config.config import SUMMARIZATION_MODEL
+from config.config import SUMMARIZATION_MODEL, SUMMARY_CHUNK_TOKENS
 
-from utils.summarize.summarize_llama import summarize_llama
+from utils.summarize.summarize_llama import (
+    summarize_llama,
+    request_summary,
+    stream_summary,
+)
+from utils.summarize.chain_summary import ChainSummarizer
+from utils.tokenization import count_tokens
+
+# Summarizes transcripts too long for a single request
+chain_summarizer = ChainSummarizer(request_summary)
 
 
 def summarize_transcript(text: str) -> str:
@@ -25,9 +35,50 @@ def summarize_transcript(text: str) -> str:
             # return summarize_huggingface(text)
             return "Huggingface summarization model is not supported yet."
         elif SUMMARIZATION_MODEL == "llama":
+            if count_tokens(text) > SUMMARY_CHUNK_TOKENS:
+                return chain_summarizer.summarize(text)
             return summarize_llama(text)
         else:
             return "Invalid summarization model selected, please check config.py"
     except Exception as e:
         logging.error(f"Error Occured while accessing Summarization API: {str(e)}")
         return f"Error Occured while accessing Summarization API: {str(e)}"
+
+
+def request_transcript_summary(text: str) -> str:
+    """
+    Summarize the transcript, raising instead of returning an error message, so
+    queued jobs fail rather than finish with the error as their summary.
+
+    Args:
+        text: the transcript to summarize.
+
+    Returns:
+        str: The summarized transcript.
+
+    Raises:
+        Exception: If the summarization failed.
+    """
+    if SUMMARIZATION_MODEL == "llama":
+        return chain_summarizer.summarize(text)
+    return summarize_transcript(text)
+
+
+def stream_transcript_summary(text: str) -> Iterator[str]:
+    """
+    Summarize the transcript, yielding the summary as the model generates it.
+    Models without streaming yield the whole summary at once.
+
+    Args:
+        text: the transcript to summarize.
+
+    Yields:
+        str: The next piece of the summary.
+
+    Raises:
+        Exception: If the summarization failed.
+    """
+    if SUMMARIZATION_MODEL == "llama":
+        yield from chain_summarizer.stream(text, stream_summary)
+    else:
+        yield summarize_transcript(text)
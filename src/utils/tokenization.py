@@ -0,0 +1,40 @@
+import logging
+
+# Encoding used to estimate prompt sizes. It is not the LLAMA tokenizer, but it is
+# close enough to keep requests within a budget.
+ENCODING_NAME = "cl100k_base"
+
+_encoding = None
+
+
+def get_encoding():
+    """Get the tiktoken encoding, loading it on first use. None if it is unavailable."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding(ENCODING_NAME)
+        except Exception as e:
+            logging.warning(
+                f"Could not load tiktoken, estimating token counts: {str(e)}"
+            )
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Count the tokens of a text.
+
+    Args:
+        text (str): The text to count.
+    Returns:
+        int: Number of tokens (about one per four characters if tiktoken is unavailable).
+    """
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // 4 + 1
+    return len(encoding.encode(text, disallowed_special=()))
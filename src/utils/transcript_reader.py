@@ -0,0 +1,251 @@
+from typing import IO, Iterable, Iterator
+import codecs
+import json
+import re
+
+from utils.categorize.extract_questions import Question
+from utils.categorize.incremental import IncrementalQuestionExtractor
+
+# Bytes read from the stream at a time
+READ_SIZE = 64 * 1024
+# Max characters buffered for one segment, so a malformed upload cannot fill the memory
+MAX_SEGMENT_CHARS = 1024 * 1024
+# Keys of the segment array when the transcript is wrapped in an object
+TRANSCRIPT_KEYS = ("transcript", "result", "segments")
+# Characters per text chunk yielded by iter_text_chunks
+TEXT_CHUNK_CHARS = 64 * 1024
+
+WHITESPACE = re.compile(r"\s*")
+NUMBER_CHARS = "0123456789.eE+-"
+NEXT_SEGMENT = re.compile(r"\s*,\s*(?=\{)")
+UNCLOSED_ARRAY = "Transcript ended before the segment array was closed"
+
+
+class SegmentReader:
+    """
+    Reads the segments of a transcript JSON document from a stream, one at a time.
+
+    The document is either an array of segments ([{"text", "speaker", ...}, ...]) or
+    an object holding that array under one of TRANSCRIPT_KEYS (e.g. the result of an
+    analysis job). Only the segment being parsed and the unparsed rest of the last
+    read are held in memory, whatever the size of the document.
+
+    Args:
+        stream (IO): Binary or text stream (e.g. the stream of an uploaded file).
+        read_size (int): Bytes read from the stream at a time.
+        max_segment_chars (int): Max size of one segment (or of another value of a
+            wrapping object, which is skipped).
+    """
+
+    def __init__(
+        self,
+        stream: IO,
+        read_size: int = READ_SIZE,
+        max_segment_chars: int = MAX_SEGMENT_CHARS,
+    ):
+        self.stream = stream
+        self.read_size = read_size
+        self.max_segment_chars = max_segment_chars
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+        self.wrapped = False
+
+    def _read(self) -> bool:
+        """Append the next read to the buffer. Returns False at the end of the stream."""
+        if self.eof:
+            return False
+        data = ""
+        while not data:
+            raw = self.stream.read(self.read_size)
+            if not raw:
+                data = self.utf8.decode(b"", final=True)
+                break
+            # A read can end inside a multi-byte character, which gives no text yet
+            data = self.utf8.decode(raw) if isinstance(raw, bytes) else raw
+        if not data:
+            self.eof = True
+            return False
+
+        # Drop what was parsed already, so the buffer only holds the current segment
+        self.buffer = self.buffer[self.position :] + data
+        self.position = 0
+        if len(self.buffer) > self.max_segment_chars + self.read_size:
+            raise ValueError("Transcript segment is too large")
+        return True
+
+    def _peek(self) -> str:
+        """Skip whitespace and get the next character ("" at the end of the stream)."""
+        self.position = WHITESPACE.match(self.buffer, self.position).end()
+        while self.position == len(self.buffer) and self._read():
+            self.position = WHITESPACE.match(self.buffer, self.position).end()
+        return self.buffer[self.position : self.position + 1]
+
+    def _expect(self, chars: str, message: str = "Transcript is not valid JSON") -> str:
+        """Move past the next character, which must be one of chars."""
+        char = self._peek()
+        if not char:
+            raise ValueError(message)
+        if char not in chars:
+            raise ValueError("Transcript is not valid JSON")
+        self.position += 1
+        return char
+
+    def _decode(self):
+        """Parse the JSON value at the position (see _peek), reading more as needed."""
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                # The value continues in the next read (or the JSON is invalid)
+                if not self._read():
+                    raise ValueError("Transcript is not valid JSON")
+                continue
+            # A number may continue in the next read (e.g. the "12" of "12.5"). The
+            # empty string, at the end of the buffer, is in NUMBER_CHARS too.
+            next_char = self.buffer[end : end + 1]
+            if isinstance(value, (int, float)) and next_char in NUMBER_CHARS:
+                if self._read():
+                    continue
+            self.position = end
+            return value
+
+    def _read_key(self) -> str:
+        """Parse the next key of the wrapping object, and move past its ":"."""
+        if self._peek() != '"':
+            raise ValueError("Transcript is not valid JSON")
+        key = self._decode()
+        self._expect(":")
+        return key
+
+    def _open_array(self) -> None:
+        """Move past the "[" that starts the segment array."""
+        char = self._peek()
+        if char == "[":
+            self.position += 1
+            return
+        if char != "{":
+            raise ValueError("Transcript must be a JSON array of segments")
+
+        # Wrapped transcript: only the keys of the object itself are looked at, the
+        # values of the other keys are skipped (nested objects may use the same keys)
+        self.position += 1
+        self.wrapped = True
+        separator = "}" if self._peek() == "}" else ","
+        while separator == ",":
+            key = self._read_key()
+            if key in TRANSCRIPT_KEYS:
+                if self._peek() != "[":
+                    raise ValueError(f'"{key}" must be a JSON array of segments')
+                self.position += 1
+                return
+            self._peek()
+            self._decode()
+            separator = self._expect(",}")
+
+        keys = ", ".join(TRANSCRIPT_KEYS)
+        raise ValueError(f"Transcript object has none of the keys {keys}")
+
+    def _close(self) -> None:
+        """Check the rest of the document, after the segment array."""
+        if self.wrapped:
+            while self._expect(",}") == ",":
+                self._read_key()
+                self._peek()
+                self._decode()
+        if self._peek():
+            raise ValueError("Transcript is followed by unexpected data")
+
+    def __iter__(self) -> Iterator[dict]:
+        self._open_array()
+        char = self._peek()
+        if char == "]":
+            self.position += 1
+            self._close()
+            return
+
+        while True:
+            if not char:
+                raise ValueError(UNCLOSED_ARRAY)
+            if char != "{":
+                raise ValueError("Transcript segments must be JSON objects")
+            yield self._decode()
+
+            # Usually the comma and the next segment are in the buffer already
+            match = NEXT_SEGMENT.match(self.buffer, self.position)
+            if match:
+                self.position = match.end()  # char is still "{"
+                continue
+            if self._expect(",]", UNCLOSED_ARRAY) == "]":
+                break
+            char = self._peek()
+        self._close()
+
+
+def iter_segments(stream: IO, read_size: int = READ_SIZE) -> Iterator[dict]:
+    """
+    Parse the segments of a transcript JSON document as they are read from a stream.
+
+    Args:
+        stream (IO): Binary or text stream of the document (see SegmentReader).
+        read_size (int): Bytes read from the stream at a time.
+    Returns:
+        Iterator[dict]: The segments, in order.
+    Raises:
+        ValueError: If the document is not a transcript.
+    """
+    return iter(SegmentReader(stream, read_size))
+
+
+def iter_questions(segments: Iterable[dict]) -> Iterator[Question]:
+    """
+    Extract the questions of a transcript while its segments are read, with the same
+    two-sentence context as extract_questions.
+
+    Args:
+        segments (Iterable[dict]): Transcript segments ({"text", "speaker", ...}).
+    Returns:
+        Iterator[Question]: The questions, in order.
+    Raises:
+        ValueError: If a segment has no text.
+    """
+    extractor = IncrementalQuestionExtractor()
+    for segment in segments:
+        if not isinstance(segment.get("text"), str):
+            raise ValueError("Segment does not contain text")
+        question = extractor.add_sentence(segment)
+        if question is not None:
+            yield question
+
+
+def iter_text_chunks(
+    segments: Iterable[dict], chunk_chars: int = TEXT_CHUNK_CHARS
+) -> Iterator[str]:
+    """
+    Join the text of the segments, yielding it in pieces of about chunk_chars
+    characters (segments are never split). " ".join of the pieces is the whole text.
+
+    Args:
+        segments (Iterable[dict]): Transcript segments ({"text", ...}).
+        chunk_chars (int): Characters after which a piece is yielded.
+    Returns:
+        Iterator[str]: The pieces of text, in order.
+    Raises:
+        ValueError: If a segment has no text.
+    """
+    texts = []
+    size = 0
+    for segment in segments:
+        text = segment.get("text")
+        if not isinstance(text, str):
+            raise ValueError("Segment does not contain text")
+        texts.append(text)
+        size += len(text) + 1
+        if size >= chunk_chars:
+            yield " ".join(texts)
+            texts = []
+            size = 0
+    if texts:
+        yield " ".join(texts)
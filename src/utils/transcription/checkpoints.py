@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import shutil
+
+from config import config
+
+
+class StageCheckpoints:
+    """
+    Per-job checkpoint area for the stages of transcribe_and_diarize.
+
+    Every stage stores its output as <stage>.json in the job's checkpoint folder,
+    optionally together with files it produced (e.g. the separated vocals).
+    When a job is retried, stages with a valid checkpoint are skipped.
+
+    A checkpoint is valid if its JSON can be read, every file it refers to still
+    exists with the recorded size, and it was written with the same fingerprint
+    (source audio and transcription settings) as the current run.
+
+    Args:
+        job_id (str): ID of the job. Each job gets its own folder.
+        fingerprint (dict): Settings that decide the output of the stages.
+        root (str, optional): Folder that holds all checkpoint areas (default: config.CHECKPOINT_FOLDER).
+    """
+
+    MANIFEST = "manifest.json"
+
+    def __init__(self, job_id: str, fingerprint: dict, root: str = None):
+        self.path = os.path.join(root or config.CHECKPOINT_FOLDER, job_id)
+        self.fingerprint = fingerprint
+        os.makedirs(self.path, exist_ok=True)
+
+        self.manifest = self._read_json(self.MANIFEST)
+        if not self.manifest or self.manifest.get("fingerprint") != fingerprint:
+            if self.manifest:
+                logging.info(f"Settings changed, discarding checkpoints in {self.path}")
+            self.clear()
+            os.makedirs(self.path, exist_ok=True)
+            self.manifest = {"fingerprint": fingerprint, "stages": {}}
+            self._write_json(self.MANIFEST, self.manifest)
+
+    def file_path(self, filename: str) -> str:
+        """Path of a file inside the checkpoint area."""
+        return os.path.join(self.path, filename)
+
+    def load(self, stage: str):
+        """
+        Load the output of a stage.
+
+        Args:
+            stage (str): Name of the stage.
+        Returns:
+            The data saved for the stage, or None if there is no valid checkpoint.
+        """
+        entry = self.manifest["stages"].get(stage)
+        if entry is None:
+            return None
+
+        for path, size in entry["files"].items():
+            if not os.path.exists(path) or os.path.getsize(path) != size:
+                logging.warning(f"Checkpoint file {path} of stage {stage} is invalid")
+                return None
+
+        data = self._read_json(f"{stage}.json")
+        if data is None:
+            return None
+
+        logging.info(f"Resuming from checkpoint: {stage}")
+        return data
+
+    def save(self, stage: str, data, files: list = ()) -> None:
+        """
+        Save the output of a stage.
+
+        Args:
+            stage (str): Name of the stage.
+            data: JSON serializable output of the stage.
+            files (list, optional): Files the stage produced, which must still exist on resume.
+        Returns:
+            None
+        """
+        try:
+            self._write_json(f"{stage}.json", data)
+            self.manifest["stages"][stage] = {
+                "files": {path: os.path.getsize(path) for path in files}
+            }
+            self._write_json(self.MANIFEST, self.manifest)
+        except (OSError, TypeError, ValueError) as e:
+            # A missing checkpoint only costs time on retry, never fail the job for it
+            logging.warning(f"Could not save checkpoint {stage}: {str(e)}")
+
+    def clear(self) -> None:
+        """Delete the checkpoint area of the job."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def _read_json(self, filename: str):
+        try:
+            with open(self.file_path(filename), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_json(self, filename: str, data) -> None:
+        # Write to a temporary file first, so a job killed mid-write leaves no partial checkpoint
+        path = self.file_path(filename)
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
@@ -1,10 +1,10 @@
 import logging
 import os
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 
 from moviepy.editor import AudioFileClip
-from pytube import YouTube
+from pytube import Playlist, YouTube
 from pytube.exceptions import AgeRestrictedError, VideoRegionBlocked, VideoUnavailable
 import uuid
 
@@ -30,6 +30,21 @@ def get_video_title(url: str) -> Optional[str]:
         return None
 
 
+def get_playlist_video_urls(url: str) -> List[str]:
+    """Get the URLs of the videos of a YouTube playlist, in playlist order.
+
+    Args:
+        url (str): The YouTube playlist URL
+
+    Returns:
+        List[str]: The video URLs
+
+    Raises:
+        Exception: The playlist could not be read
+    """
+    return list(Playlist(url).video_urls)
+
+
 def download_and_convert_to_mp3(
     url: str, output_path: str = "output", filename: str = str(uuid.uuid4())
 ) -> Optional[tuple[str, str, str]]:
@@ -0,0 +1,129 @@
+import gc
+import logging
+import time
+
+import numpy as np
+import torch
+
+# Models kept in memory between jobs, by key. Only used by long-lived worker
+# processes (see PrewarmedWorker); everywhere else models are loaded for every
+# job and released as soon as the caller drops them, to free GPU memory.
+_models = {}
+_keep_loaded = False
+
+
+def keep_models_loaded(enabled: bool = True) -> None:
+    """
+    Keep loaded models in memory between jobs, instead of loading them for every job.
+
+    Args:
+        enabled (bool): Whether to keep the models loaded (default: True).
+    Returns:
+        None
+    """
+    global _keep_loaded
+    _keep_loaded = enabled
+    if not enabled:
+        _models.clear()
+        gc.collect()
+        torch.cuda.empty_cache()
+
+
+def get_model(key: tuple, loader):
+    """
+    Get a model, loading it only if it is not kept in memory already.
+
+    Args:
+        key (tuple): Identifies the model and the settings it was loaded with.
+        loader (callable): Loads the model if needed.
+    Returns:
+        The model.
+    """
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    start = time.time()
+    model = loader()
+    logging.info(f"Loaded model {key} in {time.time() - start:.2f}s")
+    if _keep_loaded:
+        _models[key] = model
+    return model
+
+
+def load_whisper_model(model_name, device, compute_dtype, suppress_numerals=False):
+    """Get the batched (whisperx) Whisper model."""
+    import whisperx
+
+    return get_model(
+        ("whisperx", model_name, device, compute_dtype, suppress_numerals),
+        lambda: whisperx.load_model(
+            model_name,
+            device,
+            compute_type=compute_dtype,
+            asr_options={"suppress_numerals": suppress_numerals},
+        ),
+    )
+
+
+def load_faster_whisper_model(model_name, device, compute_dtype):
+    """Get the non-batched (faster-whisper) Whisper model."""
+    from faster_whisper import WhisperModel
+
+    return get_model(
+        ("faster_whisper", model_name, device, compute_dtype),
+        lambda: WhisperModel(model_name, device=device, compute_type=compute_dtype),
+    )
+
+
+def load_align_model(language, device):
+    """Get the wav2vec2 alignment model and its metadata for a language."""
+    import whisperx
+
+    return get_model(
+        ("align", language, device),
+        lambda: whisperx.load_align_model(language_code=language, device=device),
+    )
+
+
+def load_punctuation_model():
+    """Get the punctuation restoration model."""
+    from deepmultilingualpunctuation import PunctuationModel
+
+    return get_model(
+        ("punctuation", "kredor/punctuate-all"),
+        lambda: PunctuationModel(model="kredor/punctuate-all"),
+    )
+
+
+def warm_up(model_name: str, align_languages: list = ()) -> float:
+    """
+    Load the transcription, alignment, diarization and punctuation models and run each
+    once on a short silent input, so CUDA kernels are initialized before the first job.
+
+    Args:
+        model_name (str): Whisper model to load (e.g. "large-v3").
+        align_languages (list, optional): Languages to load alignment models for.
+    Returns:
+        float: Seconds the warm-up took.
+    """
+    start = time.time()
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    compute_dtype = {"cpu": "int8", "cuda": "float16"}[device]
+    silence = np.zeros(16000 * 2, dtype=np.float32)  # 2 seconds at 16 kHz
+
+    whisper_model = load_whisper_model(model_name, device, compute_dtype)
+    whisper_model.transcribe(silence, language="en", batch_size=1)
+
+    for language in align_languages:
+        load_align_model(language, device)
+
+    # The diarization pipeline is loaded when its module is imported
+    from utils.transcription.hf_diarize import pipeline
+
+    pipeline({"waveform": torch.from_numpy(silence).unsqueeze(0), "sample_rate": 16000})
+
+    load_punctuation_model().predict(["warming", "up", "the", "model"])
+
+    torch.cuda.empty_cache()
+    return time.time() - start
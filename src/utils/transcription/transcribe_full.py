@@ -1,6 +1,7 @@
 import argparse
 import os
 import gc
+import shutil
 
 from utils.transcription.alignment_helpers import (
     wav2vec2_langs,
@@ -14,34 +15,168 @@ from utils.transcription.alignment_helpers import (
 
 import whisperx
 import torch
-from deepmultilingualpunctuation import PunctuationModel
 import re
 import logging
-from rq import get_current_job
 from utils.queueing.jobs import Job
+from utils.queueing.update_rq import update_job_status
 from utils.transcription.transcription_helpers import (
     transcribe,
     transcribe_batched,
     get_root_directory,
 )
 from utils.transcription.hf_diarize import diarize_audio
+from utils.transcription.checkpoints import StageCheckpoints
+from utils.transcription.model_cache import load_align_model, load_punctuation_model
 from concurrent.futures import ThreadPoolExecutor
+from config import config
+import subprocess
 
 
 def update_progress(progress, message):
-    """Update the progress of the current job"""
-    job = get_current_job()
-    job.meta["progress"] = progress
-    job.meta["message"] = message
-    job.save_meta()
+    """Update the progress of the current job and publish it to its event channel"""
+    update_job_status(progress, message)
 
 
-def transcribe_and_diarize(job: Job) -> list:
+def get_source_fingerprint(job: Job, args: argparse.Namespace) -> dict:
+    """
+    Describe the input and settings of a transcription, so checkpoints written by an
+    earlier attempt of the job are only reused if they were made from the same audio.
+
+    Args:
+        job (Job): Job object containing the audio file and job information.
+        args (argparse.Namespace): Transcription settings.
+
+    Returns:
+        dict: The fingerprint.
+    """
+    url = job.job_info.get("url")
+    if url:
+        # Retries download the video again, so identify it by its URL
+        source = {"url": url}
+    else:
+        source = {"audio": args.audio, "size": os.path.getsize(args.audio)}
+
+    source.update(
+        {
+            "language": args.language,
+            "model_name": args.model_name,
+            "stemming": args.stemming,
+            "batch_size": args.batch_size,
+            "suppress_numerals": args.suppress_numerals,
+        }
+    )
+    return source
+
+
+def normalize_audio(audio_path: str, output_path: str) -> str:
+    """
+    Convert the audio to a WAV file that demucs, whisper and pyannote can all read directly.
+    The sample rate and channels are kept, so vocal separation quality is unchanged.
+
+    Args:
+        audio_path (str): Path to the source audio or video file.
+        output_path (str): Path of the WAV file to write.
+
+    Returns:
+        str: Path to the normalized audio, or the source path if the conversion failed.
+    """
+    result = subprocess.run(
+        ["ffmpeg", "-nostdin", "-y", "-i", audio_path]
+        + ["-vn", "-c:a", "pcm_s16le", output_path],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    if result.returncode != 0:
+        logging.warning("Audio normalization failed, using original audio file.")
+        return audio_path
+    return output_path
+
+
+def read_speaker_turns(rttm_path: str) -> list:
+    """
+    Read the speaker turns from an RTTM file.
+
+    Args:
+        rttm_path (str): Path to the RTTM file written by diarize_audio.
+
+    Returns:
+        list: [start_ms, end_ms, speaker] for every turn.
+    """
+    speaker_ts = []
+    with open(rttm_path, "r") as f:
+        # Example RTTM line:
+        # SPEAKER waveform 1 13.998 1.647 <NA> <NA> SPEAKER_07 <NA> <NA>
+        lines = f.readlines()
+        for line in lines:
+            line_list = line.split(" ")
+
+            s = int(float(line_list[3]) * 1000)
+            e = s + int(float(line_list[4]) * 1000)
+            speaker_ts.append([s, e, int(line_list[7].split("_")[-1])])
+    return speaker_ts
+
+
+def restore_punctuation(wsm: list) -> list:
+    """
+    Restore the punctuation of the words, to help realign the sentences.
+
+    Args:
+        wsm (list): Word-speaker mapping.
+
+    Returns:
+        list: The word-speaker mapping, with ending punctuation added to the words.
+    """
+    punct_model = load_punctuation_model()
+
+    words_list = list(map(lambda x: x["word"], wsm))
+
+    labled_words = punct_model.predict(words_list)
+
+    del punct_model
+
+    ending_puncts = ".?!"
+    model_puncts = ".,;:!?"
+
+    # Check if the word is an acronym
+
+    def is_acronym(x: str) -> bool:
+        """
+        Check if the word is an acronym.
+
+        Args:
+            x (str): Word to check.
+
+        Returns:
+            bool: True if the word is an acronym, False otherwise.
+        """
+        return re.fullmatch(r"\b(?:[a-zA-Z]\.){2,}", x)
+
+    for word_dict, labeled_tuple in zip(wsm, labled_words):
+        word = word_dict["word"]
+        if (
+            word
+            and labeled_tuple[1] in ending_puncts
+            and (word[-1] not in model_puncts or is_acronym(word))
+        ):
+            word += labeled_tuple[1]
+            if word.endswith(".."):
+                word = word.rstrip(".")
+            word_dict["word"] = word
+
+    return wsm
+
+
+def transcribe_and_diarize(job: Job, on_segment=None) -> list:
     """
     Transcribe and diarize an audio file.
 
+    The output of every stage is checkpointed per job (see StageCheckpoints), so a retried
+    or timed-out job resumes after the last finished stage instead of starting over.
+
     Args:
         job (Job): Job object containing the audio file and job information.
+        on_segment (callable, optional): Called with every Whisper segment ({"start", "end", "text"})
+            as soon as it is transcribed, before alignment, diarization and punctuation.
 
     Returns:
         result (list): Result of the transcription and diarization job. Speaker labels and timestamps.
@@ -71,39 +206,67 @@ def transcribe_and_diarize(job: Job) -> list:
         args.batch_size = job.job_info.get("batch_size", 6)
         args.suppress_numerals = job.job_info.get("suppress_numerals", False)
 
-        update_progress(
-            "splitting",
-            "Splitting audio into vocals and accompaniment for faster processing",
+        ROOT = get_root_directory()
+
+        checkpoints = StageCheckpoints(
+            job.job_id,
+            get_source_fingerprint(job, args),
+            root=os.path.join(ROOT, config.CHECKPOINT_FOLDER),
         )
 
-        # TODO: Move into separate file
+        # A finished earlier attempt (e.g. the job timed out while saving the result)
+        ssm = checkpoints.load("sentences")
+        if ssm is not None:
+            update_progress(
+                "transcription_finished", "Transcription and diarization finished"
+            )
+            return ssm
+
+        # 1. Normalize the audio
+        normalized = checkpoints.load("normalized_audio")
+        if normalized is None:
+            update_progress("normalizing", "Converting audio for processing")
+            audio_path = normalize_audio(
+                args.audio, checkpoints.file_path("normalized.wav")
+            )
+            checkpoints.save("normalized_audio", {"path": audio_path}, [audio_path])
+        else:
+            audio_path = normalized["path"]
+
+        # 2. Isolate vocals from the rest of the audio
+        vocals = checkpoints.load("vocals")
+        if vocals is not None:
+            vocal_target = vocals["path"]
+        elif args.stemming:
+            update_progress(
+                "splitting",
+                "Splitting audio into vocals and accompaniment for faster processing",
+            )
 
-        if args.stemming:
-            # Isolate vocals from the rest of the audio
+            # TODO: Move into separate file
 
             return_code = os.system(
-                f'python3 -m demucs.separate -n htdemucs --two-stems=vocals "{args.audio}" -o "temp_outputs"'
+                f'python3 -m demucs.separate -n htdemucs --two-stems=vocals "{audio_path}" -o "{checkpoints.path}"'
             )
 
             if return_code != 0:
                 logging.warning(
                     "Source splitting failed, using original audio file. Use --no-stem argument to disable it."
                 )
-                vocal_target = args.audio
+                vocal_target = audio_path
             else:
                 vocal_target = os.path.join(
-                    "temp_outputs",
+                    checkpoints.path,
                     "htdemucs",
-                    os.path.splitext(os.path.basename(args.audio))[0],
+                    os.path.splitext(os.path.basename(audio_path))[0],
                     "vocals.wav",
                 )
+                checkpoints.save("vocals", {"path": vocal_target}, [vocal_target])
         else:
-            vocal_target = args.audio
+            vocal_target = audio_path
 
-        # Async: Start Diarization
-        # TODO: Start diarization in a separate thread
-
-        ROOT = get_root_directory()
+        # 3. Diarization, unless an earlier attempt already got the speaker turns
+        speaker_ts = checkpoints.load("speaker_turns")
 
         temp_path = os.path.join(ROOT, "temp_outputs")
 
@@ -111,182 +274,148 @@ def transcribe_and_diarize(job: Job) -> list:
             temp_path, "pred_rttms", job.job_id + "_diarized.rttm"
         )
 
-        logging.info(
-            f"Diarization file will be saved to: {audio_diarization_rttm_path}"
-        )
-
-        # start diarization in a separate thread
-        with ThreadPoolExecutor() as executor:
-            diarize_future = executor.submit(
-                diarize_audio, vocal_target, audio_diarization_rttm_path
-            )
-
-        # clear gpu vram
-        torch.cuda.empty_cache()
-        gc.collect()
-
-        update_progress("transcribing", "Transcribing audio")
-
-        if args.batch_size != 0:
-            print("Batch size: ", args.batch_size)
-            whisper_results, language = transcribe_batched(
-                vocal_target,
-                args.language,
-                args.batch_size,
-                args.model_name,
-                mtypes[args.device],
-                args.suppress_numerals,
-                args.device,
-            )
-        else:
-            whisper_results, language = transcribe(
-                vocal_target,
-                args.language,
-                args.model_name,
-                mtypes[args.device],
-                args.suppress_numerals,
-                args.device,
+        if speaker_ts is None:
+            logging.info(
+                f"Diarization file will be saved to: {audio_diarization_rttm_path}"
             )
 
-        print("Aligning audio file: ", vocal_target)
+            # start diarization in a separate thread
+            with ThreadPoolExecutor() as executor:
+                diarize_future = executor.submit(
+                    diarize_audio, vocal_target, audio_diarization_rttm_path
+                )
 
-        if language in wav2vec2_langs:
-            update_progress("loading_align_model", "Loading alignment model")
-            alignment_model, metadata = whisperx.load_align_model(
-                language_code=language, device=args.device
-            )
-            update_progress("aligning", "Aligning audio")
-            result_aligned = whisperx.align(
-                whisper_results, alignment_model, metadata, vocal_target, args.device
-            )
-            word_timestamps = filter_missing_timestamps(
-                result_aligned["word_segments"],
-                initial_timestamp=whisper_results[0].get("start"),
-                final_timestamp=whisper_results[-1].get("end"),
-            )
             # clear gpu vram
-            del alignment_model
             torch.cuda.empty_cache()
             gc.collect()
+
+        # 4. Transcription
+        transcribed = checkpoints.load("whisper_segments")
+        if transcribed is not None:
+            whisper_results = transcribed["segments"]
+            language = transcribed["language"]
+            if on_segment is not None:
+                for segment in whisper_results:
+                    on_segment(segment)
         else:
-            torch.cuda.empty_cache()
-            gc.collect()
-            assert (
-                args.batch_size
-                == 0  # TODO: add a better check for word timestamps existence
-            ), (
-                f"Unsupported language: {language}, use --batch_size to 0"
-                " to generate word timestamps using whisper directly and fix this error."
+            update_progress("transcribing", "Transcribing audio")
+
+            if args.batch_size != 0:
+                print("Batch size: ", args.batch_size)
+                whisper_results, language = transcribe_batched(
+                    vocal_target,
+                    args.language,
+                    args.batch_size,
+                    args.model_name,
+                    mtypes[args.device],
+                    args.suppress_numerals,
+                    args.device,
+                    on_segment,
+                )
+            else:
+                whisper_results, language = transcribe(
+                    vocal_target,
+                    args.language,
+                    args.model_name,
+                    mtypes[args.device],
+                    args.suppress_numerals,
+                    args.device,
+                    on_segment,
+                )
+            checkpoints.save(
+                "whisper_segments",
+                {"segments": whisper_results, "language": language},
             )
-            word_timestamps = []
-            # A SingleSegment consists of start, end, text (str), avg_logprob (float)
-            for segment in whisper_results:
-                for word in segment["words"]:
-                    word_timestamps.append(
-                        {"word": word[2], "start": word[0], "end": word[1]}
-                    )
+
+        # 5. Alignment
+        aligned = checkpoints.load("aligned_words")
+        if aligned is not None:
+            word_timestamps = aligned["words"]
+        else:
+            print("Aligning audio file: ", vocal_target)
+
+            if language in wav2vec2_langs:
+                update_progress("loading_align_model", "Loading alignment model")
+                alignment_model, metadata = load_align_model(language, args.device)
+                update_progress("aligning", "Aligning audio")
+                result_aligned = whisperx.align(
+                    whisper_results,
+                    alignment_model,
+                    metadata,
+                    vocal_target,
+                    args.device,
+                )
+                word_timestamps = filter_missing_timestamps(
+                    result_aligned["word_segments"],
+                    initial_timestamp=whisper_results[0].get("start"),
+                    final_timestamp=whisper_results[-1].get("end"),
+                )
+                # clear gpu vram
+                del alignment_model
+                torch.cuda.empty_cache()
+                gc.collect()
+            else:
+                torch.cuda.empty_cache()
+                gc.collect()
+                assert (
+                    args.batch_size
+                    == 0  # TODO: add a better check for word timestamps existence
+                ), (
+                    f"Unsupported language: {language}, use --batch_size to 0"
+                    " to generate word timestamps using whisper directly and fix this error."
+                )
+                word_timestamps = []
+                # A SingleSegment consists of start, end, text (str), avg_logprob (float)
+                for segment in whisper_results:
+                    for word in segment["words"]:
+                        word_timestamps.append(
+                            {"word": word[2], "start": word[0], "end": word[1]}
+                        )
+            checkpoints.save("aligned_words", {"words": word_timestamps})
 
         torch.cuda.empty_cache()
         gc.collect()
 
-        update_progress("diarizing", "Diarizing audio")
-
-        # # TODO: Make the getcwd() and chdir() calls more robust/less clunky
-
-        # # Reading timestamps <> Speaker Labels mapping
-        # # nemo_process.communicate()
-        # ROOT = os.getcwd()
-
-        # # if we're in src/ directory, move to the root directory
-        # # We see errors with finding the temp_outputs directory when running from src/
-        # if os.path.basename(ROOT) == "src":
-        #     os.chdir("..")
-        #     ROOT = os.getcwd()
-
-        # temp_path = os.path.join(ROOT, "temp_outputs")
-
-        # audio_diarization_rttm_path = os.path.join(
-        #     temp_path, "pred_rttms", job.job_id + "_diarized.rttm"
-        # )
-
-        # diarize_audio(vocal_target, audio_diarization_rttm_path)
-
-        # Wait for diarization to finish
-        diarize_future.result()
-
-        speaker_ts = []
-
-        try:
-            with open(audio_diarization_rttm_path, "r") as f:
-                # Example RTTM line:
-                # SPEAKER waveform 1 13.998 1.647 <NA> <NA> SPEAKER_07 <NA> <NA>
-                lines = f.readlines()
-                for line in lines:
-                    line_list = line.split(" ")
-
-                    s = int(float(line_list[3]) * 1000)
-                    e = s + int(float(line_list[4]) * 1000)
-                    speaker_ts.append([s, e, int(line_list[7].split("_")[-1])])
-
-        except FileNotFoundError as e:
-            print(f"Speaker diarization failed, using single speaker: {str(e)}")
-            logging.warning("Speaker diarization failed, using single speaker")
-            speaker_ts = [[0, int(whisper_results[-1]["end"] * 1000), 0]]
+        # 6. Speaker turns
+        if speaker_ts is None:
+            update_progress("diarizing", "Diarizing audio")
+
+            try:
+                # Wait for diarization to finish
+                diarize_future.result()
+                speaker_ts = read_speaker_turns(audio_diarization_rttm_path)
+                checkpoints.save("speaker_turns", speaker_ts)
+            except FileNotFoundError as e:
+                # Not checkpointed, so a retry gets another chance at diarization
+                print(f"Speaker diarization failed, using single speaker: {str(e)}")
+                logging.warning("Speaker diarization failed, using single speaker")
+                speaker_ts = [[0, int(whisper_results[-1]["end"] * 1000), 0]]
         del whisper_results  # empty whisper results
         torch.cuda.empty_cache()
         gc.collect()
 
         print("Speaker timestamps: ", speaker_ts)
 
-        wsm = get_words_speaker_mapping(word_timestamps, speaker_ts, "start")
-
-        if language in punct_model_langs:
-            # restoring punctuation in the transcript to help realign the
-            # sentences
-            punct_model = PunctuationModel(model="kredor/punctuate-all")
-
-            words_list = list(map(lambda x: x["word"], wsm))
-
-            labled_words = punct_model.predict(words_list)
-
-            del punct_model
-
-            ending_puncts = ".?!"
-            model_puncts = ".,;:!?"
-
-            # Check if the word is an acronym
-
-            def is_acronym(x: str) -> bool:
-                """
-                Check if the word is an acronym.
-
-                Args:
-                    x (str): Word to check.
-
-                Returns:
-                    bool: True if the word is an acronym, False otherwise.
-                """
-                return re.fullmatch(r"\b(?:[a-zA-Z]\.){2,}", x)
-
-            for word_dict, labeled_tuple in zip(wsm, labled_words):
-                word = word_dict["word"]
-                if (
-                    word
-                    and labeled_tuple[1] in ending_puncts
-                    and (word[-1] not in model_puncts or is_acronym(word))
-                ):
-                    word += labeled_tuple[1]
-                    if word.endswith(".."):
-                        word = word.rstrip(".")
-                    word_dict["word"] = word
-
+        # 7. Punctuation
+        punctuated = checkpoints.load("punctuated_words")
+        if punctuated is not None:
+            wsm = punctuated["words"]
         else:
-            logging.warning(
-                f"Punctuation restoration is not available for {language} language. Using the original punctuation."
-            )
+            wsm = get_words_speaker_mapping(word_timestamps, speaker_ts, "start")
 
+            if language in punct_model_langs:
+                update_progress("punctuating", "Restoring punctuation")
+                wsm = restore_punctuation(wsm)
+            else:
+                logging.warning(
+                    f"Punctuation restoration is not available for {language} language. Using the original punctuation."
+                )
+            checkpoints.save("punctuated_words", {"words": wsm})
+
+        # 8. Sentences
         wsm = get_realigned_ws_mapping_with_punctuation(wsm)
         ssm = get_sentences_speaker_mapping(wsm, speaker_ts)
+        checkpoints.save("sentences", ssm)
 
         # with open(f"{os.path.splitext(args.audio)[0]}.txt", "w", encoding="utf-8-sig") as f:
         #     get_speaker_aware_transcript(ssm, f)
@@ -312,3 +441,19 @@ def transcribe_and_diarize(job: Job) -> list:
 
         update_progress("error", f"An error occurred: {str(e)}")
         raise e
+
+
+def clear_checkpoints(job_id: str) -> None:
+    """
+    Delete the transcription checkpoints of a job once the whole job has succeeded.
+
+    Args:
+        job_id (str): ID of the finished job.
+
+    Returns:
+        None
+    """
+    if config.KEEP_CHECKPOINTS:
+        return
+    root = os.path.join(get_root_directory(), config.CHECKPOINT_FOLDER)
+    shutil.rmtree(os.path.join(root, job_id), ignore_errors=True)
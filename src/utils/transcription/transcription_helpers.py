@@ -2,6 +2,10 @@ import torch
 import gc
 import os
 from pathlib import Path
+from utils.transcription.model_cache import (
+    load_faster_whisper_model,
+    load_whisper_model,
+)
 
 
 def get_root_directory():
@@ -20,13 +24,13 @@ def transcribe(
     compute_dtype: str,
     suppress_numerals: bool,
     device: str,
+    on_segment=None,
 ):
-    from faster_whisper import WhisperModel
     from helpers import find_numeral_symbol_tokens, wav2vec2_langs
 
     # Faster Whisper non-batched
     # Run on GPU with FP16
-    whisper_model = WhisperModel(model_name, device=device, compute_type=compute_dtype)
+    whisper_model = load_faster_whisper_model(model_name, device, compute_dtype)
 
     # or run on GPU with INT8
     # model = WhisperModel(model_size, device="cuda", compute_type="int8_float16")
@@ -53,9 +57,11 @@ def transcribe(
         vad_filter=True,
     )
     whisper_results = []
-    for segment in segments:
+    for segment in segments:  # Segments are transcribed as they are iterated
         whisper_results.append(segment._asdict())
-    # clear gpu vram
+        if on_segment is not None:
+            on_segment(whisper_results[-1])
+    # clear gpu vram (unless the worker keeps the model loaded)
     del whisper_model
     torch.cuda.empty_cache()
     gc.collect()
@@ -70,18 +76,20 @@ def transcribe_batched(
     compute_dtype: str,
     suppress_numerals: bool,
     device: str,
+    on_segment=None,
 ):
     import whisperx
 
     # Faster Whisper batched
-    whisper_model = whisperx.load_model(
-        model_name,
-        device,
-        compute_type=compute_dtype,
-        asr_options={"suppress_numerals": suppress_numerals},
+    whisper_model = load_whisper_model(
+        model_name, device, compute_dtype, suppress_numerals
     )
     audio = whisperx.load_audio(audio_file)
     result = whisper_model.transcribe(audio, language=language, batch_size=batch_size)
     del whisper_model
     torch.cuda.empty_cache()
+    # The batched pipeline only returns once every segment is transcribed
+    if on_segment is not None:
+        for segment in result["segments"]:
+            on_segment(segment)
     return result["segments"], result["language"]